@@ -0,0 +1,98 @@
+import numpy as np
+
+try:
+    from lcb_runner.evaluation.pass_k_utils import estimate_pass_at_k_matrix
+except ImportError:
+    ## loaded by path next to `pass_k_utils.py` (see `IOI_scripts/compute_ioi_final_results.py`)
+    from pass_k_utils import estimate_pass_at_k_matrix
+
+## replicates resampled at once, bounds the (replicates, problems, k) arrays in memory
+REPLICATE_CHUNK_SIZE = 1000
+
+
+def _pass_at_k_table(num_samples: np.ndarray, k_list) -> tuple:
+    """
+    pass@k for every possible number of correct samples of every distinct n:
+    returns (table of shape (distinct n, max n + 1, k), index of the n of each problem)
+    """
+    distinct_n, n_index = np.unique(num_samples, return_inverse=True)
+    max_n = int(distinct_n.max())
+    table = np.zeros((len(distinct_n), max_n + 1, len(k_list)))
+    for i, n in enumerate(distinct_n):
+        table[i, : n + 1] = estimate_pass_at_k_matrix(
+            np.full(n + 1, n), np.arange(n + 1), k_list
+        )
+    return table, n_index
+
+
+def bootstrap_pass_at_k(
+    num_samples,
+    num_correct,
+    k_list,
+    num_replicates: int = 10000,
+    within_problems: bool = False,
+    confidence: float = 0.95,
+    seed: int = 0,
+) -> dict:
+    """
+    Bootstrap confidence intervals of the mean pass@k over problems.
+    Problems are resampled with replacement (multinomial weights on the per problem
+    pass@k matrix), and with `within_problems` the samples of each resampled problem
+    are resampled too (the number of correct samples drawn from Binomial(n, c / n)).
+    Returns {"pass@k": {"estimate", "std", "lower", "upper"}} for every k of `k_list`.
+    """
+    num_correct = np.asarray(num_correct, dtype=np.int64).reshape(-1)
+    if np.ndim(num_samples) == 0:
+        num_samples = np.full(len(num_correct), int(num_samples), dtype=np.int64)
+    else:
+        num_samples = np.asarray(num_samples, dtype=np.int64).reshape(-1)
+    num_problems = len(num_correct)
+    if num_problems == 0:
+        return {}
+
+    rng = np.random.default_rng(seed)
+    pass_at_k = estimate_pass_at_k_matrix(num_samples, num_correct, k_list)
+    if within_problems:
+        table, n_index = _pass_at_k_table(num_samples, k_list)
+
+    replicates = []
+    for start in range(0, num_replicates, REPLICATE_CHUNK_SIZE):
+        chunk_size = min(REPLICATE_CHUNK_SIZE, num_replicates - start)
+        if not within_problems:
+            ## how many times each problem is drawn in each replicate
+            weights = rng.multinomial(
+                num_problems, np.full(num_problems, 1 / num_problems), size=chunk_size
+            )
+            replicates.append(weights @ pass_at_k / num_problems)
+            continue
+        problem_indices = rng.integers(0, num_problems, size=(chunk_size, num_problems))
+        n = num_samples[problem_indices]
+        resampled_correct = rng.binomial(n, num_correct[problem_indices] / np.maximum(n, 1))
+        replicates.append(
+            table[n_index[problem_indices], resampled_correct].mean(axis=1)
+        )
+    replicates = np.concatenate(replicates, axis=0)
+
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(replicates, [alpha, 1 - alpha], axis=0)
+    std = replicates.std(axis=0, ddof=1) if num_replicates > 1 else np.zeros(len(k_list))
+    return {
+        f"pass@{k}": {
+            "estimate": float(pass_at_k[:, i].mean()),
+            "std": float(std[i]),
+            "lower": float(lower[i]),
+            "upper": float(upper[i]),
+        }
+        for i, k in enumerate(k_list)
+    }
+
+
+def format_confidence_intervals(intervals: dict, confidence: float = 0.95) -> str:
+    lines = []
+    for name, interval in intervals.items():
+        lines.append(
+            f"{name} = {interval['estimate']:.4f} "
+            f"[{interval['lower']:.4f}, {interval['upper']:.4f}] "
+            f"({confidence:.0%} CI, std {interval['std']:.4f})"
+        )
+    return "\n".join(lines)
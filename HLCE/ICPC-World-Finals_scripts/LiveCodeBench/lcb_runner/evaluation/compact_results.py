@@ -0,0 +1,99 @@
+""" Array backed per test results of code generation runs (the `results` of `codegen_metrics`). """
+from collections.abc import Mapping
+from itertools import chain
+
+import numpy as np
+
+
+class CompactResults(Mapping):
+    """
+    The `run_test` results of every generation of every problem in three flat arrays:
+    `codes` holds the per test verdicts as int8 (1 passed, 0 failed, -1 runtime error
+    or timeout, -2 compilation error), generation `g` owns
+    `codes[generation_offsets[g] : generation_offsets[g + 1]]` and problem `p` owns the
+    generations `problem_offsets[p]` to `problem_offsets[p + 1]`.
+    Reads as the usual {problem index: [[verdict, ...], ...]} mapping, the Python lists
+    are only built on access, `to_dict` converts everything for the JSON output
+    """
+
+    def __init__(self, keys, codes, generation_offsets, problem_offsets):
+        self.keys_list = list(keys)
+        self.codes = np.asarray(codes, dtype=np.int8)
+        self.generation_offsets = np.asarray(generation_offsets, dtype=np.int64)
+        self.problem_offsets = np.asarray(problem_offsets, dtype=np.int64)
+        assert len(self.problem_offsets) == len(self.keys_list) + 1
+        assert self.problem_offsets[-1] == len(self.generation_offsets) - 1
+        assert self.generation_offsets[-1] == len(self.codes)
+        self.positions = {key: position for position, key in enumerate(self.keys_list)}
+
+    @classmethod
+    def from_results(cls, results: dict) -> "CompactResults":
+        """From {problem index: per generation results}, keeping the order of `results`"""
+        if isinstance(results, CompactResults):
+            return results
+        generations = [generation for res in results.values() for generation in res]
+        generation_lengths = np.fromiter(
+            (len(generation) for generation in generations), dtype=np.int64, count=len(generations)
+        )
+        problem_lengths = np.fromiter(
+            (len(res) for res in results.values()), dtype=np.int64, count=len(results)
+        )
+        codes = np.fromiter(
+            chain.from_iterable(generations), dtype=np.int8, count=int(generation_lengths.sum())
+        )
+        return cls(
+            results.keys(),
+            codes,
+            np.concatenate([[0], np.cumsum(generation_lengths)]),
+            np.concatenate([[0], np.cumsum(problem_lengths)]),
+        )
+
+    def __len__(self):
+        return len(self.keys_list)
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __getitem__(self, key):
+        position = self.positions[key]
+        return [
+            self.decode(self.codes[self.generation_offsets[g] : self.generation_offsets[g + 1]])
+            for g in range(self.problem_offsets[position], self.problem_offsets[position + 1])
+        ]
+
+    @staticmethod
+    def decode(codes: np.ndarray) -> list:
+        ## passed / failed tests are the booleans `run_test` returned
+        return [True if code == 1 else False if code == 0 else code for code in codes.tolist()]
+
+    def generation_correct(self) -> np.ndarray:
+        """Whether every test of each generation passed (generations without tests pass, as `np.all`)"""
+        failed = np.concatenate([[0], np.cumsum(self.codes <= 0, dtype=np.int64)])
+        return failed[self.generation_offsets[1:]] == failed[self.generation_offsets[:-1]]
+
+    def counts(self):
+        """(keys, generations, correct generations) of every problem"""
+        correct = np.concatenate([[0], np.cumsum(self.generation_correct(), dtype=np.int64)])
+        return (
+            self.keys_list,
+            np.diff(self.problem_offsets),
+            correct[self.problem_offsets[1:]] - correct[self.problem_offsets[:-1]],
+        )
+
+    def graded(self) -> list:
+        """Per problem correctness of each generation, the problems in key order"""
+        generation_correct = self.generation_correct().tolist()
+        return [
+            generation_correct[self.problem_offsets[position] : self.problem_offsets[position + 1]]
+            for position in sorted(range(len(self.keys_list)), key=lambda p: self.keys_list[p])
+        ]
+
+    def to_dict(self) -> dict:
+        return {key: self[key] for key in self.keys_list}
+
+
+def to_jsonable(obj):
+    """`default` of `json.dump` for the metrics holding compact results"""
+    if isinstance(obj, CompactResults):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -14,8 +14,9 @@ from typing import Union, List, Optional, Dict
 import numpy as np
 from tqdm import tqdm
 
-from lcb_runner.evaluation.testing_util import run_test
+from lcb_runner.evaluation.testing_util import run_test, get_num_tests
 from lcb_runner.evaluation.pass_k_utils import compute_metrics_from_results
+from lcb_runner.evaluation.compact_results import CompactResults
 
 
 def _temp_run(sample, generation, debug, result, metadata_list, timeout):
@@ -38,14 +39,14 @@ def check_correctness(sample, generation, timeout, debug=True):
     )
     p.start()
     p.join(
-        timeout=(timeout + 1) * len(json.loads(sample["input_output"])["inputs"]) + 5
+        timeout=(timeout + 1) * get_num_tests(json.loads(sample["input_output"])) + 5
     )
     if p.is_alive():
         p.kill()
     if not result:
         in_outs = json.loads(sample["input_output"])
         # consider that all tests failed
-        result = [[-1 for i in range(len(in_outs["inputs"]))]]
+        result = [[-1 for i in range(get_num_tests(in_outs))]]
         if debug:
             print(f"global timeout")
     return result[0], metadata_list[0]
@@ -149,20 +150,14 @@ def evaluate_generations(
     return results, metadata
 
 
-def codegen_metrics(
-    samples_list,
-    generations_list,
-    k_list=[1, 5, 10, 20, 40, 50, 75, 100, 125, 150, 200, 500, 1000],
-    num_process_evaluate=16,
-    timeout=6,
-    debug=False,
-):
+DEFAULT_K_LIST = [1, 5, 10, 20, 40, 50, 75, 100, 125, 150, 200, 500, 1000]
 
+
+def linearize_generations(samples_list, generations_list):
+    """One evaluation task per generation, `remap_index` maps the tasks back to their problem"""
     samples_linear = []
     generations_linear = []
     remap_index = []
-    results = defaultdict(list)
-    metadatas = defaultdict(list)
     for idx, (sample, generation_list) in enumerate(
         zip(samples_list, generations_list)
     ):
@@ -172,6 +167,51 @@ def codegen_metrics(
             samples_linear.append(sample)
             generations_linear.append([generation])
             remap_index.append(idx)
+    return samples_linear, generations_linear, remap_index
+
+
+def assemble_codegen_metrics(results, metadatas, num_generations, k_list=DEFAULT_K_LIST):
+    """
+    Builds the [metrics, results, metadata] output of `codegen_metrics` from the
+    per problem results and metadata (lists in generation order), whatever the
+    order in which the problems were evaluated. `num_generations` is a list when
+    the problems have different numbers of generations. The results are returned as
+    `CompactResults`, dump the metrics with `default=to_jsonable`
+    """
+    results = CompactResults.from_results({idx: results[idx] for idx in sorted(results)})
+    metrics = compute_metrics_from_results(results, k_list=k_list)
+
+    final_metadata = []
+    for key in sorted(list(metadatas.keys())):
+        final_metadata.append(metadatas[key])
+    for i in range(len(final_metadata)):
+        if type(final_metadata[i]) is not list:
+            final_metadata[i] = [json.dumps(final_metadata[i])]
+        else:
+            final_metadata[i] = [json.dumps(x) for x in final_metadata[i]]
+
+        expected_generations = (
+            num_generations[i] if isinstance(num_generations, list) else num_generations
+        )
+        assert len(final_metadata[i]) == expected_generations, f"{len(final_metadata[i])=}"
+
+    return [metrics, results, final_metadata]
+
+
+def codegen_metrics(
+    samples_list,
+    generations_list,
+    k_list=DEFAULT_K_LIST,
+    num_process_evaluate=16,
+    timeout=6,
+    debug=False,
+):
+
+    results = defaultdict(list)
+    metadatas = defaultdict(list)
+    samples_linear, generations_linear, remap_index = linearize_generations(
+        samples_list, generations_list
+    )
 
     print(f"Evaluating {len(samples_linear)}...")
 
@@ -189,19 +229,6 @@ def codegen_metrics(
     for idx, sub_metadatas in sorted(metadatas_linear.items(), key=lambda x: x[0]):
         metadatas[remap_index[idx]].append(sub_metadatas[0])
 
-    metrics = compute_metrics_from_results(results, k_list=k_list)
-
-    final_metadata = []
-    for key in sorted(list(metadatas.keys())):
-        final_metadata.append(metadatas[key])
-    for i in range(len(final_metadata)):
-        if type(final_metadata[i]) is not list:
-            final_metadata[i] = [json.dumps(final_metadata[i])]
-        else:
-            final_metadata[i] = [json.dumps(x) for x in final_metadata[i]]
-
-        assert len(final_metadata[i]) == len(
-            generations_list[0]
-        ), f"{len(final_metadata[i])=}"
-
-    return [metrics, results, final_metadata]
+    return assemble_codegen_metrics(
+        results, metadatas, len(generations_list[0]), k_list=k_list
+    )
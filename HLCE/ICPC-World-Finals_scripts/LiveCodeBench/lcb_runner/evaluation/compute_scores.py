@@ -1,12 +1,19 @@
 import json
 import argparse
-import numpy as np
 from datetime import datetime
 
 from lcb_runner.lm_styles import LanguageModelStore
-from lcb_runner.evaluation.pass_k_utils import (
-    estimate_pass_at_k,
-    compute_metrics_from_results,
+from lcb_runner.evaluation.group_scores import (
+    GROUP_KEYS,
+    load_score_table,
+    parse_group_by,
+    get_default_k_list,
+    compute_group_scores,
+    format_group_scores,
+)
+from lcb_runner.evaluation.bootstrap_utils import (
+    bootstrap_pass_at_k,
+    format_confidence_intervals,
 )
 from lcb_runner.utils.scenarios import Scenario
 from lcb_runner.utils.path_utils import get_eval_all_output_path
@@ -60,6 +67,45 @@ def get_parser():
         help="Platform to filter the evaluation file",
     )
 
+    parser.add_argument(
+        "--group_by",
+        type=str,
+        nargs="*",
+        default=["difficulty"],
+        help=f"Groupings to report pass@k for, each a comma separated list of keys among {GROUP_KEYS} (e.g. `--group_by benchmark year platform,difficulty`), problems without the key are grouped as unknown",
+    )
+    parser.add_argument(
+        "--k_list",
+        type=int,
+        nargs="+",
+        default=None,
+        help="k values of pass@k, defaults to the values of 1, 5, 10, 25, 50, 100, 150, 200 not above the number of samples of any problem",
+    )
+    parser.add_argument(
+        "--output_json",
+        type=str,
+        default=None,
+        help="Also write the overall and per group pass@k to this JSON file",
+    )
+
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        help="Number of bootstrap replicates for the confidence intervals of pass@k (0 to disable)",
+    )
+    parser.add_argument(
+        "--bootstrap_within_problems",
+        action="store_true",
+        help="Also resample the samples of each problem in the bootstrap, not only the problems",
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the bootstrap intervals",
+    )
+
     args = parser.parse_args()
 
     if args.eval_all_file is None:
@@ -73,83 +119,51 @@ def compute_scores(args):
     with open(args.eval_all_file, "r") as f:
         results = json.load(f)
 
-    for res in results:
-        res["contest_date"] = datetime.fromisoformat(res["contest_date"])
-
-    if args.start_date is not None:
-        args.start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
-        results = [
-            result for result in results if args.start_date <= result["contest_date"]
-        ]
-
-    if args.end_date is not None:
-        args.end_date = datetime.strptime(args.end_date, "%Y-%m-%d")
-        results = [
-            result for result in results if result["contest_date"] <= args.end_date
-        ]
-
-    if args.platform is not None:
-        results = [result for result in results if result["platform"] == args.platform]
-
-    print(len(results))
-    totals = [len(x["graded_list"]) for x in results]
-    corrects = [sum(x["graded_list"]) for x in results]
-
-    
-    easy_totals = [len(x["graded_list"]) for x in results if x["difficulty"] == "easy"]
-    med_totals = [len(x["graded_list"]) for x in results if x["difficulty"] == "medium"]
-    hard_totals = [len(x["graded_list"]) for x in results if x["difficulty"] == "hard"]
-    easy_corrects = [sum(x["graded_list"]) for x in results if x["difficulty"] == "easy"]
-    med_corrects = [sum(x["graded_list"]) for x in results if x["difficulty"] == "medium"]
-    hard_corrects = [sum(x["graded_list"]) for x in results if x["difficulty"] == "hard"]
-    for k in [1, 5, 10, 25, 50, 100, 150, 200]:
-        print(
-            f"Pass@{k} = ",
-            estimate_pass_at_k(totals, corrects, k).mean(),
-            # np.array(
-            #     [estimate_pass_at_k(t, c, k) for t, c in zip(totals, corrects)]
-            # ).mean(),
-        )
-        print(
-            f"Easy Pass@{k} = ",
-            estimate_pass_at_k(easy_totals, easy_corrects, k).mean(),
-        )
-        print(
-            f"Medium Pass@{k} = ",
-            estimate_pass_at_k(med_totals, med_corrects, k).mean(),
-        )
-        print(
-            f"Hard Pass@{k} = ",
-            estimate_pass_at_k(hard_totals, hard_corrects, k).mean(),
+    table = load_score_table(results)
+    table = table.filter(
+        start_date=(
+            datetime.strptime(args.start_date, "%Y-%m-%d")
+            if args.start_date is not None
+            else None
+        ),
+        end_date=(
+            datetime.strptime(args.end_date, "%Y-%m-%d")
+            if args.end_date is not None
+            else None
+        ),
+        platform=args.platform,
+    )
+
+    print(len(table))
+    group_by_list = [parse_group_by(group_by) for group_by in args.group_by]
+    k_list = args.k_list if args.k_list else get_default_k_list(table)
+    scores = compute_group_scores(table, group_by_list, k_list)
+    print(format_group_scores(scores))
+
+    if args.bootstrap > 0 and len(table) > 0:
+        ## as in the scores, pass@k is only defined when every problem has at least k samples
+        bootstrap_k_list = [k for k in k_list if (table.totals >= k).all()]
+        if len(bootstrap_k_list) < len(k_list):
+            print(
+                f"Skipping the bootstrap of k > {int(table.totals.min())}, some problems have fewer samples"
+            )
+        scores["confidence_intervals"] = bootstrap_pass_at_k(
+            table.totals,
+            table.corrects,
+            bootstrap_k_list,
+            num_replicates=args.bootstrap,
+            within_problems=args.bootstrap_within_problems,
+            confidence=args.confidence,
         )
+        print(f"Bootstrap ({args.bootstrap} replicates)")
+        print(format_confidence_intervals(scores["confidence_intervals"], args.confidence))
 
+    if args.output_json is not None:
+        with open(args.output_json, "w") as f:
+            json.dump(scores, f, indent=4)
+        print(f"Saved scores to {args.output_json}")
 
-    pass_1_list = [result["pass@1"] for result in results]
-    print(f"Pass@1: {sum(pass_1_list) / len(pass_1_list)}")
-
-    easy_pass_1_list = [
-        result["pass@1"]
-        for result in results
-        if "difficulty" in result and result["difficulty"] == "easy"
-    ]
-    if len(easy_pass_1_list) > 0:
-        print(f"Easy Pass@1: {sum(easy_pass_1_list) / len(easy_pass_1_list)}")
-
-    medium_pass_1_list = [
-        result["pass@1"]
-        for result in results
-        if "difficulty" in result and result["difficulty"] == "medium"
-    ]
-    if len(medium_pass_1_list) > 0:
-        print(f"Medium Pass@1: {sum(medium_pass_1_list) / len(medium_pass_1_list)}")
-
-    hard_pass_1_list = [
-        result["pass@1"]
-        for result in results
-        if "difficulty" in result and result["difficulty"] == "hard"
-    ]
-    if len(hard_pass_1_list) > 0:
-        print(f"Hard Pass@1: {sum(hard_pass_1_list) / len(hard_pass_1_list)}")
+    return scores
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+import json
+from functools import reduce
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from lcb_runner.evaluation.pass_k_utils import compute_metrics_from_counts
+
+EVAL_STATE_VERSION = 1
+
+
+@dataclass
+class EvalState:
+    """
+    Canonical evaluation state: the verdict of every generation of every problem,
+    keyed by question id. The headline metrics only depend on the (samples,
+    correct samples) counts derived from it, so states of disjoint or overlapping
+    evaluations merge exactly and the metrics are recomputed from the merge
+    """
+
+    verdicts: dict = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.verdicts)
+
+    @classmethod
+    def from_graded(cls, question_ids: list, graded: list) -> "EvalState":
+        """From the `extract_instance_results` verdicts of a benchmark (same order)"""
+        assert len(question_ids) == len(graded), f"{len(question_ids)=} {len(graded)=}"
+        return cls(
+            {
+                question_id: [bool(verdict) for verdict in verdicts]
+                for question_id, verdicts in zip(question_ids, graded)
+            }
+        )
+
+    @classmethod
+    def from_eval_all(cls, eval_all_results: list) -> "EvalState":
+        return cls.from_graded(
+            [instance["question_id"] for instance in eval_all_results],
+            [instance["graded_list"] for instance in eval_all_results],
+        )
+
+    def merge(self, other: "EvalState") -> "EvalState":
+        """
+        Union of both states, `other` wins for problems evaluated in both
+        (re-evaluating a subset replaces its verdicts), associative
+        """
+        return EvalState({**self.verdicts, **other.verdicts})
+
+    def counts(self, question_ids: list = None) -> tuple:
+        """(question ids, samples, correct samples) of the given (or all) problems"""
+        if question_ids is None:
+            question_ids = list(self.verdicts)
+        total = np.array(
+            [len(self.verdicts[question_id]) for question_id in question_ids],
+            dtype=np.int64,
+        )
+        correct = np.array(
+            [sum(self.verdicts[question_id]) for question_id in question_ids],
+            dtype=np.int64,
+        )
+        return question_ids, total, correct
+
+    def compute_metrics(self, k_list=[1, 5], question_ids: list = None) -> dict:
+        """
+        pass@k means and details over the given (or all) problems, `detail` is keyed
+        by the position of the problem like the metrics of `codegen_metrics`
+        """
+        question_ids, total, correct = self.counts(question_ids)
+        return compute_metrics_from_counts(
+            list(range(len(question_ids))), total, correct, k_list=k_list
+        )
+
+    def save(self, path: str):
+        problems = {
+            question_id: {
+                "n": len(verdicts),
+                "c": sum(verdicts),
+                "verdicts": verdicts,
+            }
+            for question_id, verdicts in self.verdicts.items()
+        }
+        with open(path, "w") as f:
+            json.dump({"version": EVAL_STATE_VERSION, "problems": problems}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "EvalState":
+        with open(path) as f:
+            saved = json.load(f)
+        assert (
+            saved.get("version") == EVAL_STATE_VERSION
+        ), f"Unsupported eval state version {saved.get('version')} in {path}"
+        state = cls()
+        for question_id, problem in saved["problems"].items():
+            verdicts = [bool(verdict) for verdict in problem["verdicts"]]
+            assert len(verdicts) == problem["n"] and sum(verdicts) == problem["c"], (
+                f"Inconsistent counts of {question_id} in {path}"
+            )
+            state.verdicts[question_id] = verdicts
+        return state
+
+
+def merge_eval_states(*states: EvalState) -> EvalState:
+    return reduce(EvalState.merge, states, EvalState())
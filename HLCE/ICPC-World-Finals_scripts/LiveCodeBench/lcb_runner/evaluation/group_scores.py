@@ -0,0 +1,245 @@
+import re
+import itertools
+from datetime import datetime
+from typing import Optional
+from dataclasses import dataclass
+
+import numpy as np
+
+from lcb_runner.evaluation.pass_k_utils import estimate_pass_at_k_matrix
+
+DEFAULT_K_LIST = [1, 5, 10, 25, 50, 100, 150, 200]
+GROUP_KEYS = ["platform", "year", "benchmark", "difficulty", "tags"]
+UNKNOWN = "unknown"
+
+## HLCE platforms carry the contest year, e.g. `ICPC_world_final_2015`
+YEAR_PATTERN = re.compile(r"(?<!\d)(19|20)\d{2}(?!\d)")
+
+
+def parse_contest_date(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _year_of(result: dict, contest_date: Optional[datetime]) -> str:
+    if contest_date is not None:
+        return str(contest_date.year)
+    match = YEAR_PATTERN.search(str(result.get("platform") or ""))
+    return match.group(0) if match else UNKNOWN
+
+
+def _benchmark_of(result: dict) -> str:
+    if result.get("benchmark"):
+        return str(result["benchmark"])
+    platform = str(result.get("platform") or "")
+    for benchmark in ["IOI", "ICPC"]:
+        if benchmark.lower() in platform.lower():
+            return benchmark
+    return platform or UNKNOWN
+
+
+def _tags_of(result: dict) -> tuple:
+    tags = result.get("tags")
+    if isinstance(tags, str):
+        tags = [tags]
+    return tuple(str(tag) for tag in tags) if tags else (UNKNOWN,)
+
+
+@dataclass
+class ScoreTable:
+    """
+    Column view of an eval_all file: samples and correct samples of every problem
+    and, for every grouping key, the values of every problem (several for tags)
+    """
+
+    question_ids: list
+    totals: np.ndarray
+    corrects: np.ndarray
+    contest_dates: list
+    keys: dict
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def select(self, mask: np.ndarray) -> "ScoreTable":
+        indices = np.flatnonzero(mask)
+        return ScoreTable(
+            question_ids=[self.question_ids[i] for i in indices],
+            totals=self.totals[indices],
+            corrects=self.corrects[indices],
+            contest_dates=[self.contest_dates[i] for i in indices],
+            keys={
+                name: [values[i] for i in indices] for name, values in self.keys.items()
+            },
+        )
+
+    def filter(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        platform: Optional[str] = None,
+    ) -> "ScoreTable":
+        """
+        Problems without a contest date are dropped only when a date bound is given
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if start_date is not None or end_date is not None:
+            mask &= np.array(
+                [
+                    date is not None
+                    and (start_date is None or start_date <= date)
+                    and (end_date is None or date <= end_date)
+                    for date in self.contest_dates
+                ],
+                dtype=bool,
+            )
+        if platform is not None:
+            mask &= np.array(
+                [values[0] == platform for values in self.keys["platform"]], dtype=bool
+            )
+        return self.select(mask)
+
+
+def load_score_table(results: list) -> ScoreTable:
+    """
+    Reads every result once, missing fields (HLCE outputs have no contest date
+    nor difficulty) are grouped as "unknown"
+    """
+    question_ids, totals, corrects, contest_dates = [], [], [], []
+    keys = {name: [] for name in GROUP_KEYS}
+    for result in results:
+        graded_list = result["graded_list"]
+        contest_date = parse_contest_date(result.get("contest_date"))
+        question_ids.append(result.get("question_id"))
+        totals.append(len(graded_list))
+        corrects.append(sum(bool(graded) for graded in graded_list))
+        contest_dates.append(contest_date)
+        keys["platform"].append((str(result.get("platform") or UNKNOWN),))
+        keys["year"].append((_year_of(result, contest_date),))
+        keys["benchmark"].append((_benchmark_of(result),))
+        keys["difficulty"].append((str(result.get("difficulty") or UNKNOWN),))
+        keys["tags"].append(_tags_of(result))
+    return ScoreTable(
+        question_ids=question_ids,
+        totals=np.array(totals, dtype=np.int64),
+        corrects=np.array(corrects, dtype=np.int64),
+        contest_dates=contest_dates,
+        keys=keys,
+    )
+
+
+def parse_group_by(group_by: str) -> list:
+    names = [name.strip() for name in group_by.split(",") if name.strip()]
+    for name in names:
+        if name not in GROUP_KEYS:
+            raise ValueError(f"Unknown group key {name}, expected one of {GROUP_KEYS}")
+    return names
+
+
+def get_default_k_list(table: ScoreTable) -> list:
+    ## pass@k is only defined for k <= n
+    if len(table) == 0:
+        return [1]
+    return [k for k in DEFAULT_K_LIST if k <= table.totals.min()]
+
+
+def compute_group_scores(
+    table: ScoreTable, group_by_list: list, k_list: list
+) -> dict:
+    """
+    pass@k of every group of every grouping in one pass over a single pass@k matrix.
+    `group_by_list` holds lists of keys, a problem with several tags is counted in
+    each of its tag groups.
+    Returns {"k_list", "overall", "groups": {"key1,key2": [group, ...]}} where each
+    group is {"group": {key: value}, "num_problems", "min_samples", "pass@k": ...},
+    pass@k of a group with fewer than k samples for some problem is None
+    """
+    pass_at_k = estimate_pass_at_k_matrix(table.totals, table.corrects, k_list)
+
+    def summarize(rows: np.ndarray, group_ids: np.ndarray, num_groups: int) -> list:
+        sums = np.zeros((num_groups, len(k_list)))
+        np.add.at(sums, group_ids, pass_at_k[rows])
+        counts = np.bincount(group_ids, minlength=num_groups)
+        min_samples = np.full(num_groups, np.iinfo(np.int64).max)
+        np.minimum.at(min_samples, group_ids, table.totals[rows])
+        means = sums / np.maximum(counts, 1)[:, None]
+        summaries = []
+        for g in range(num_groups):
+            summary = {
+                "num_problems": int(counts[g]),
+                "min_samples": int(min_samples[g]),
+            }
+            for i, k in enumerate(k_list):
+                summary[f"pass@{k}"] = (
+                    float(means[g, i]) if k <= min_samples[g] else None
+                )
+            summaries.append(summary)
+        return summaries
+
+    all_rows = np.arange(len(table))
+    overall = (
+        summarize(all_rows, np.zeros(len(table), dtype=np.int64), 1)[0]
+        if len(table) > 0
+        else {"num_problems": 0, "min_samples": 0}
+    )
+
+    groups = {}
+    for names in group_by_list:
+        rows, labels = [], []
+        for row in range(len(table)):
+            for label in itertools.product(*(table.keys[name][row] for name in names)):
+                rows.append(row)
+                labels.append(label)
+        group_labels = sorted(set(labels))
+        label_index = {label: g for g, label in enumerate(group_labels)}
+        summaries = (
+            summarize(
+                np.array(rows, dtype=np.int64),
+                np.array([label_index[label] for label in labels], dtype=np.int64),
+                len(group_labels),
+            )
+            if rows
+            else []
+        )
+        groups[",".join(names)] = [
+            {"group": dict(zip(names, label)), **summary}
+            for label, summary in zip(group_labels, summaries)
+        ]
+
+    return {"k_list": list(k_list), "overall": overall, "groups": groups}
+
+
+def format_group_scores(scores: dict) -> str:
+    columns = ["num_problems"] + [f"pass@{k}" for k in scores["k_list"]]
+
+    def cells(summary: dict) -> list:
+        return [str(summary["num_problems"])] + [
+            "-" if summary.get(column) is None else f"{summary[column]:.4f}"
+            for column in columns[1:]
+        ]
+
+    tables = []
+    sections = [("all", [("all", scores["overall"])])]
+    for name, groups in scores["groups"].items():
+        sections.append(
+            (name, [(", ".join(group["group"].values()), group) for group in groups])
+        )
+    for name, rows in sections:
+        table = [[name] + columns] + [[label] + cells(summary) for label, summary in rows]
+        widths = [max(len(row[i]) for row in table) for i in range(len(table[0]))]
+        lines = [
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in table
+        ]
+        lines.insert(1, "-" * len(lines[0]))
+        tables.append("\n".join(lines))
+    return "\n\n".join(tables)
@@ -0,0 +1,177 @@
+""" Hard test analytics over the per test bitmaps of a sweep of eval_all files (`--per_test_results`). """
+import os
+import json
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from lcb_runner.evaluation.per_test_bitmaps import decode_test_bitmaps
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--eval_all_files",
+        type=str,
+        nargs="+",
+        required=True,
+        help="eval_all files evaluated with `--per_test_results`, typically one per model of the sweep",
+    )
+    parser.add_argument(
+        "--top", type=int, default=20, help="Number of killer tests to print"
+    )
+    parser.add_argument(
+        "--output_json",
+        type=str,
+        default=None,
+        help="Write the killer tests and the per problem profiles, discriminating subsets and test orders to this JSON file",
+    )
+    return parser.parse_args()
+
+
+def load_test_outcomes(eval_all_files: list) -> dict:
+    """
+    question_id -> (passed tests of every generation of the sweep stacked as a
+    (generations, tests) boolean array, eval_all file of each generation)
+    """
+    outcomes = defaultdict(list)
+    for eval_all_file in eval_all_files:
+        with open(eval_all_file) as f:
+            results = json.load(f)
+        skipped = 0
+        for instance in results:
+            passed = decode_test_bitmaps(instance)
+            if passed is None:
+                skipped += 1
+                continue
+            outcomes[instance["question_id"]].append((eval_all_file, passed))
+        if skipped:
+            print(f"{eval_all_file}: {skipped} problems without test bitmaps skipped")
+
+    stacked = {}
+    for question_id, entries in outcomes.items():
+        num_tests = {passed.shape[1] for _, passed in entries}
+        if len(num_tests) > 1:
+            print(f"{question_id}: different numbers of tests {sorted(num_tests)} across files, skipped")
+            continue
+        stacked[question_id] = (
+            np.concatenate([passed for _, passed in entries], axis=0),
+            np.concatenate(
+                [np.full(len(passed), eval_all_file) for eval_all_file, passed in entries]
+            ),
+        )
+    return stacked
+
+
+def minimal_discriminating_tests(failed: np.ndarray) -> list:
+    """
+    Greedy set cover: a small subset of tests that every failing generation fails
+    at least once, so the subset gives every generation the same verdict as all tests
+    """
+    uncovered = failed.any(axis=1)
+    subset = []
+    while uncovered.any():
+        kills = failed[uncovered].sum(axis=0)
+        test = int(kills.argmax())
+        subset.append(test)
+        uncovered &= ~failed[:, test]
+    return subset
+
+
+def profile_problem(passed: np.ndarray) -> dict:
+    failed = ~passed
+    fail_counts = failed.sum(axis=0)
+    ## generations failing a single test, only that test tells them apart
+    sole_kills = failed[failed.sum(axis=1) == 1].sum(axis=0)
+    discriminating_tests = minimal_discriminating_tests(failed)
+    ## fail fast order: the cover first, then the remaining tests by decreasing kills
+    covered = set(discriminating_tests)
+    remaining = [
+        int(test)
+        for test in np.argsort(-fail_counts, kind="stable")
+        if test not in covered
+    ]
+    return {
+        "num_generations": int(passed.shape[0]),
+        "num_tests": int(passed.shape[1]),
+        "solve_rate": float(passed.all(axis=1).mean()) if len(passed) else 0.0,
+        "pass_rate_by_test": passed.mean(axis=0).round(4).tolist() if len(passed) else [],
+        "fail_count_by_test": fail_counts.tolist(),
+        "sole_kills_by_test": sole_kills.tolist(),
+        "discriminating_tests": discriminating_tests,
+        "test_order": discriminating_tests + remaining,
+    }
+
+
+def get_killer_tests(outcomes: dict) -> list:
+    killer_tests = []
+    for question_id, (passed, files) in outcomes.items():
+        failed = ~passed
+        sole = failed.sum(axis=1) == 1
+        for test in np.flatnonzero(failed.any(axis=0)):
+            killer_tests.append(
+                {
+                    "question_id": question_id,
+                    "test": int(test),
+                    "kills": int(failed[:, test].sum()),
+                    "kill_rate": float(failed[:, test].mean()),
+                    "sole_kills": int((failed[:, test] & sole).sum()),
+                    "kill_rate_by_file": {
+                        eval_all_file: float(failed[files == eval_all_file, test].mean())
+                        for eval_all_file in np.unique(files).tolist()
+                    },
+                }
+            )
+    killer_tests.sort(key=lambda x: (-x["kills"], -x["sole_kills"]))
+    return killer_tests
+
+
+def main():
+    args = get_parser()
+
+    outcomes = load_test_outcomes(args.eval_all_files)
+    print(f"Loaded the test outcomes of {len(outcomes)} problems")
+    killer_tests = get_killer_tests(outcomes)
+    profiles = {
+        question_id: profile_problem(passed)
+        for question_id, (passed, _) in sorted(outcomes.items())
+    }
+
+    print(f"=== Top {args.top} killer tests ===")
+    print(f"{'Problem':<40} {'Test':>6} {'Kills':>8} {'Kill Rate':>10} {'Sole Kills':>11}")
+    for killer_test in killer_tests[: args.top]:
+        print(
+            f"{str(killer_test['question_id']):<40} {killer_test['test']:>6} {killer_test['kills']:>8} "
+            f"{killer_test['kill_rate']:>10.4f} {killer_test['sole_kills']:>11}"
+        )
+
+    print("=== Minimal discriminating test subsets ===")
+    print(f"{'Problem':<40} {'Solve Rate':>10} {'Tests':>6} {'Subset':>7}  Subset tests")
+    for question_id, profile in profiles.items():
+        print(
+            f"{str(question_id):<40} {profile['solve_rate']:>10.4f} {profile['num_tests']:>6} "
+            f"{len(profile['discriminating_tests']):>7}  {profile['discriminating_tests']}"
+        )
+    total_tests = sum(profile["num_tests"] for profile in profiles.values())
+    subset_tests = sum(len(profile["discriminating_tests"]) for profile in profiles.values())
+    print(f"Discriminating tests: {subset_tests}/{total_tests}")
+
+    if args.output_json is not None:
+        with open(args.output_json, "w") as f:
+            json.dump(
+                {
+                    "eval_all_files": [
+                        os.path.abspath(eval_all_file) for eval_all_file in args.eval_all_files
+                    ],
+                    "killer_tests": killer_tests,
+                    "problems": profiles,
+                },
+                f,
+                indent=4,
+            )
+        print(f"Saved the test analytics to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,374 @@
+""" Leaderboard of many models from a directory of eval_all (ICPC / LiveCodeBench) and IOI score files. """
+import os
+import re
+import sys
+import glob
+import json
+import hashlib
+import argparse
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from tqdm import tqdm
+
+from lcb_runner.evaluation.group_scores import (
+    YEAR_PATTERN,
+    load_score_table,
+    compute_group_scores,
+)
+
+## `IOI_scripts` is not a package, its aggregator is loaded by path in the workers
+IOI_SCRIPTS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "IOI_scripts"
+)
+
+## bump whenever the summaries change, older cache entries are then recomputed
+SUMMARY_VERSION = "1"
+HASH_CHUNK_SIZE = 1 << 24
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--directory",
+        type=str,
+        required=True,
+        help="Directory searched recursively for eval_all and IOI score files",
+    )
+    parser.add_argument(
+        "--eval_all_pattern",
+        type=str,
+        default="*_eval_all.json",
+        help="Glob pattern of the eval_all files (ICPC / LiveCodeBench)",
+    )
+    parser.add_argument(
+        "--ioi_pattern",
+        type=str,
+        default="*_score_merge.jsonl",
+        help="Glob pattern of the merged IOI score files (`merge_ioi_results.py` outputs)",
+    )
+    parser.add_argument(
+        "--ioi_composite_config",
+        type=str,
+        default=os.path.join(IOI_SCRIPTS_DIR, "composite_problems.json"),
+        help="Composite problems of the IOI scoring (see `IOI_scripts/composite_problems.json`)",
+    )
+    parser.add_argument(
+        "--k_list", type=int, nargs="+", default=[1, 5], help="k values of pass@k"
+    )
+    parser.add_argument(
+        "--num_workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of processes loading the files",
+    )
+    parser.add_argument(
+        "--cache_file",
+        type=str,
+        default=None,
+        help="Cache of the per file summaries keyed by file hash (default: leaderboard_cache.json in --directory)",
+    )
+    parser.add_argument(
+        "--output_json",
+        type=str,
+        default=None,
+        help="Also write the leaderboard and the per file summaries to this JSON file",
+    )
+    args = parser.parse_args()
+    if args.cache_file is None:
+        args.cache_file = os.path.join(args.directory, "leaderboard_cache.json")
+    return args
+
+
+def find_score_files(args) -> list:
+    """(path, kind) of every file of the directory, kind is "icpc" or "ioi" """
+    files = []
+    for pattern, kind in [(args.eval_all_pattern, "icpc"), (args.ioi_pattern, "ioi")]:
+        for path in sorted(
+            glob.glob(os.path.join(args.directory, "**", pattern), recursive=True)
+        ):
+            files.append((os.path.abspath(path), kind))
+    return files
+
+
+def get_model_name(path: str, kind: str) -> str:
+    name = os.path.basename(path)
+    if kind == "ioi":
+        name = re.sub(r"_score_merge\.jsonl?$", "", name)
+        return re.sub(r"^ioi_contest_problems_", "", name)
+    name = re.sub(r"_eval_all\.json$", "", name)
+    name = re.sub(r"_codegeneration_output$", "", name)
+    ## `main.py` outputs are output/{model}/{scenario}_{n}_{temperature}_eval_all.json
+    if name.startswith("Scenario.") or name.startswith("codegeneration"):
+        return os.path.basename(os.path.dirname(path))
+    return name
+
+
+def hash_file(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def hash_settings(args) -> str:
+    settings = {"version": SUMMARY_VERSION, "k_list": args.k_list}
+    if os.path.exists(args.ioi_composite_config):
+        settings["ioi_composite_config"] = hash_file(args.ioi_composite_config)
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _load_ioi_aggregator():
+    if "ioi_aggregator" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "ioi_aggregator", os.path.join(IOI_SCRIPTS_DIR, "ioi_aggregator.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["ioi_aggregator"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["ioi_aggregator"]
+
+
+def _mean(values: list):
+    return sum(values) / len(values) if values else None
+
+
+def summarize_icpc_file(path: str, k_list: list) -> dict:
+    with open(path, "r") as f:
+        results = json.load(f)
+    scores = compute_group_scores(load_score_table(results), [["year"]], k_list)
+    by_year = {
+        group["group"]["year"]: {
+            key: value for key, value in group.items() if key != "group"
+        }
+        for group in scores["groups"]["year"]
+    }
+    return {**scores["overall"], "by_year": by_year}
+
+
+def summarize_ioi_file(path: str, k_list: list, composite_config: str) -> dict:
+    ioi_aggregator = _load_ioi_aggregator()
+    aggregator = ioi_aggregator.IOIScoreAggregator(
+        ioi_aggregator.load_composite_config(composite_config), k_list=k_list
+    )
+    final_stats, _ = aggregator.add_all(ioi_aggregator.iter_score_records(path)).finalize()
+
+    ## problem keys end with the contest, e.g. "(IOI 2012 day 1)"
+    problems_by_year = {}
+    for problem_key in final_stats["problem_details"]:
+        match = YEAR_PATTERN.search(problem_key)
+        year = match.group(0) if match else "unknown"
+        problems_by_year.setdefault(year, []).append(problem_key)
+    by_year = {}
+    for year, problem_keys in sorted(problems_by_year.items()):
+        by_year[year] = {"num_problems": len(problem_keys)}
+        for k in k_list:
+            by_year[year][f"pass@{k}"] = _mean(
+                [aggregator.problem_pass_at_k[key][k] for key in problem_keys]
+            )
+        by_year[year]["avg_points"] = _mean(
+            [final_stats["problem_details"][key]["avg_points"] for key in problem_keys]
+        )
+
+    summary = {"num_problems": final_stats["total_problems"]}
+    summary.update({f"pass@{k}": final_stats[f"pass@{k}"] for k in k_list})
+    summary.update(
+        {
+            "avg_points": final_stats["avg_points"],
+            "solved_problems": final_stats["solved_problems"],
+            "by_year": by_year,
+        }
+    )
+    return summary
+
+
+def summarize_file(path: str, kind: str, file_hash: str, args) -> tuple:
+    """Runs in the worker processes, returns (path, file hash, summary)"""
+    if file_hash is None:
+        file_hash = hash_file(path)
+    if kind == "ioi":
+        summary = summarize_ioi_file(path, args.k_list, args.ioi_composite_config)
+    else:
+        summary = summarize_icpc_file(path, args.k_list)
+    return path, file_hash, summary
+
+
+def hash_files(paths: list, num_workers: int) -> dict:
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return dict(zip(paths, executor.map(hash_file, paths)))
+
+
+def load_cache(cache_file: str) -> dict:
+    if os.path.exists(cache_file):
+        with open(cache_file) as f:
+            cache = json.load(f)
+        if cache.get("version") == SUMMARY_VERSION:
+            return cache
+    return {"version": SUMMARY_VERSION, "files": {}, "summaries": {}}
+
+
+def save_cache(cache: dict, cache_file: str):
+    with open(cache_file + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(cache_file + ".tmp", cache_file)
+
+
+def build_leaderboard(args) -> list:
+    """
+    One summary per file. Files whose size and modification time did not change
+    reuse their cached hash, and files whose hash (and scoring settings) did not
+    change reuse their cached summary, the others are hashed and loaded in parallel
+    """
+    files = find_score_files(args)
+    cache = load_cache(args.cache_file)
+    settings_key = hash_settings(args)
+
+    file_hashes = {}
+    for path, _ in files:
+        stat = os.stat(path)
+        cached = cache["files"].get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            file_hashes[path] = cached["hash"]
+    ## changed files are hashed first, a touched but identical file is not reloaded
+    ## (without cached summaries nothing can match, the workers hash while loading)
+    unhashed = [path for path, _ in files if path not in file_hashes]
+    if unhashed and cache["summaries"]:
+        file_hashes.update(hash_files(unhashed, args.num_workers))
+
+    summaries = {}
+    to_load = []
+    for path, kind in files:
+        file_hash = file_hashes.get(path)
+        summary_key = f"{file_hash}:{settings_key}"
+        if file_hash is not None and summary_key in cache["summaries"]:
+            summaries[path] = cache["summaries"][summary_key]
+        else:
+            to_load.append((path, kind, file_hash))
+    print(f"Found {len(files)} files, {len(files) - len(to_load)} summaries cached, loading {len(to_load)}")
+
+    if to_load:
+        with ProcessPoolExecutor(max_workers=args.num_workers) as executor:
+            futures = [
+                executor.submit(summarize_file, path, kind, file_hash, args)
+                for path, kind, file_hash in to_load
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                path, file_hash, summary = future.result()
+                file_hashes[path] = file_hash
+                summaries[path] = summary
+                cache["summaries"][f"{file_hash}:{settings_key}"] = summary
+
+    ## only the current files and the summaries of their hashes are kept
+    cache["files"] = {}
+    for path, _ in files:
+        stat = os.stat(path)
+        cache["files"][path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": file_hashes[path],
+        }
+    current_hashes = set(file_hashes.values())
+    cache["summaries"] = {
+        key: summary
+        for key, summary in cache["summaries"].items()
+        if key.split(":", 1)[0] in current_hashes
+    }
+    save_cache(cache, args.cache_file)
+
+    entries = []
+    for path, kind in files:
+        entries.append(
+            {
+                "model": get_model_name(path, kind),
+                "benchmark": kind,
+                "path": path,
+                **summaries[path],
+            }
+        )
+    return entries
+
+
+def format_table(header: list, rows: list) -> str:
+    table = [header] + rows
+    widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+    lines = [
+        " | ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in table
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+    return "\n".join(lines)
+
+
+def _format_value(value, precision=4) -> str:
+    return "-" if value is None else f"{value:.{precision}f}"
+
+
+def format_leaderboard(entries: list, k_list: list) -> str:
+    """One row per model: pass@k of both benchmarks, IOI average points, then pass@1 per year"""
+    models = {}
+    for entry in entries:
+        model = models.setdefault(entry["model"], {})
+        if entry["benchmark"] in model:
+            ## several files of a model on a benchmark (e.g. different temperatures) get their own row
+            model = models.setdefault(
+                f"{entry['model']} ({os.path.basename(entry['path'])})", {}
+            )
+        model[entry["benchmark"]] = entry
+
+    header = ["model"]
+    header += [f"ICPC pass@{k}" for k in k_list] + [f"IOI pass@{k}" for k in k_list]
+    header += ["IOI avg points"]
+    rows = []
+    for name, model in models.items():
+        icpc, ioi = model.get("icpc", {}), model.get("ioi", {})
+        row = [name]
+        row += [_format_value(icpc.get(f"pass@{k}")) for k in k_list]
+        row += [_format_value(ioi.get(f"pass@{k}")) for k in k_list]
+        row += [_format_value(ioi.get("avg_points"), 2)]
+        rows.append(row)
+    ## best ICPC pass@1 first
+    rows.sort(key=lambda row: -float(row[1]) if row[1] != "-" else float("inf"))
+    tables = [format_table(header, rows)]
+
+    for benchmark, benchmark_name in [("icpc", "ICPC"), ("ioi", "IOI")]:
+        years = sorted(
+            {
+                year
+                for model in models.values()
+                for year in model.get(benchmark, {}).get("by_year", {})
+            }
+        )
+        if not years:
+            continue
+        rows = []
+        for name, model in models.items():
+            if benchmark not in model:
+                continue
+            by_year = model[benchmark]["by_year"]
+            rows.append(
+                [name]
+                + [_format_value(by_year.get(year, {}).get("pass@1")) for year in years]
+            )
+        tables.append(
+            f"{benchmark_name} pass@1 by year\n" + format_table(["model"] + years, rows)
+        )
+    return "\n\n".join(tables)
+
+
+def main():
+    args = get_parser()
+    entries = build_leaderboard(args)
+    print(format_leaderboard(entries, args.k_list))
+
+    if args.output_json is not None:
+        with open(args.output_json, "w") as f:
+            json.dump(entries, f, indent=4)
+        print(f"Saved the leaderboard to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
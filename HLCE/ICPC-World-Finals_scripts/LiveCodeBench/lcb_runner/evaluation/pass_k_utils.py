@@ -1,29 +1,77 @@
 import numpy as np
 
 
-def estimate_pass_at_k(num_samples, num_correct, k):
-    """Estimates pass@k of each problem and returns them in an array."""
+def _log_factorials(max_n: int) -> np.ndarray:
+    """log(i!) for i in [0, max_n], as a cumulative sum of logs"""
+    return np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, max_n + 1)))])
 
-    def estimator(n: int, c: int, k: int) -> float:
-        """Calculates 1 - comb(n - c, k) / comb(n, k)."""
-        if n - c < k:
-            return 1.0
-        return 1.0 - np.prod(1.0 - k / np.arange(n - c + 1, n + 1))
 
-    import itertools
-
-    if isinstance(num_samples, int):
-        num_samples_it = itertools.repeat(num_samples, len(num_correct))
+def estimate_pass_at_k_matrix(num_samples, num_correct, k_list) -> np.ndarray:
+    """
+    Estimates pass@k of every problem for every k in one call and returns a
+    (problems, len(k_list)) array of 1 - comb(n - c, k) / comb(n, k), computed
+    in log space from a single table of log factorials.
+    Problems without correct samples get 0 and those with n - c < k get 1.
+    """
+    num_correct = np.asarray(num_correct, dtype=np.int64).reshape(-1)
+    if np.ndim(num_samples) == 0:
+        num_samples = np.full(len(num_correct), int(num_samples), dtype=np.int64)
     else:
+        num_samples = np.asarray(num_samples, dtype=np.int64).reshape(-1)
         assert len(num_samples) == len(num_correct)
-        num_samples_it = iter(num_samples)
+    ks = np.asarray(k_list, dtype=np.int64).reshape(1, -1)
+    if len(num_correct) == 0:
+        return np.zeros((0, ks.shape[1]))
 
-    return np.array(
-        [estimator(int(n), int(c), k) for n, c in zip(num_samples_it, num_correct)]
+    n = num_samples[:, None]
+    c = num_correct[:, None]
+    log_factorials = _log_factorials(int(num_samples.max()))
+    always_pass = (n - c) < ks
+    ## clipped so that the masked entries index the table safely
+    n_minus_c = n - c
+    n_minus_c_minus_k = np.clip(n_minus_c - ks, 0, None)
+    n_minus_k = np.clip(n - ks, 0, None)
+    ## log(comb(n - c, k) / comb(n, k))
+    log_ratio = (
+        log_factorials[n_minus_c]
+        - log_factorials[n_minus_c_minus_k]
+        - log_factorials[n]
+        + log_factorials[n_minus_k]
     )
+    pass_at_k = -np.expm1(np.minimum(log_ratio, 0.0))
+    ## pass@1 is exactly c / n, kept free of the log space rounding
+    pass_at_k = np.where(ks == 1, c / np.maximum(n, 1), pass_at_k)
+    pass_at_k = np.where(always_pass, 1.0, pass_at_k)
+    return np.where(c == 0, 0.0, pass_at_k)
+
+
+def estimate_pass_at_k(num_samples, num_correct, k):
+    """Estimates pass@k of each problem and returns them in an array."""
+    return estimate_pass_at_k_matrix(num_samples, num_correct, [k])[:, 0]
+
+
+def compute_metrics_from_counts(task_ids, total, correct, k_list=[1, 5]):
+    """pass@k means and per task details from the (samples, correct samples) of every task"""
+    total = np.asarray(total, dtype=np.int64)
+    correct = np.asarray(correct, dtype=np.int64)
+    ks = [k for k in k_list if (total >= k).all()]
+    pass_at_k_matrix = estimate_pass_at_k_matrix(total, correct, ks)
+    detail_pass_at_k = {
+        f"pass@{k}": pass_at_k_matrix[:, i].tolist() for i, k in enumerate(ks)
+    }
+    pass_at_k = {
+        f"pass@{k}": pass_at_k_matrix[:, i].mean() for i, k in enumerate(ks)
+    }
+    detail_metrics = {k: dict(zip(task_ids, v)) for k, v in detail_pass_at_k.items()}
+    pass_at_k["detail"] = detail_metrics
+    return pass_at_k
 
 
 def compute_metrics_from_results(results, k_list=[1, 5]):
+    if hasattr(results, "counts"):
+        ## compact results count the correct generations without building lists
+        task_ids, total, correct = results.counts()
+        return compute_metrics_from_counts(task_ids, total, correct, k_list=k_list)
     total = []
     correct = []
     task_ids = []
@@ -35,25 +83,12 @@ def compute_metrics_from_results(results, k_list=[1, 5]):
         task_ids.append(task_id)
         total.append(len(all_correct))
         correct.append(sum(all_correct))
-    total = np.array(total)
-    correct = np.array(correct)
-    ks = k_list
-    detail_pass_at_k = {
-        f"pass@{k}": estimate_pass_at_k(total, correct, k).tolist()
-        for k in ks
-        if (total >= k).all()
-    }
-    pass_at_k = {
-        f"pass@{k}": estimate_pass_at_k(total, correct, k).mean()
-        for k in ks
-        if (total >= k).all()
-    }
-    detail_metrics = {k: dict(zip(task_ids, v)) for k, v in detail_pass_at_k.items()}
-    pass_at_k["detail"] = detail_metrics
-    return pass_at_k
+    return compute_metrics_from_counts(task_ids, total, correct, k_list=k_list)
 
 
 def extract_instance_results(results):
+    if hasattr(results, "graded"):
+        return results.graded()
     instance_wise_grades = {}
     for task_id, res in results.items():
         instance_wise_grades[task_id] = []
@@ -64,3 +99,50 @@ def extract_instance_results(results):
         v for _, v in sorted(instance_wise_grades.items(), key=lambda item: item[0])
     ]
     return instance_wise_grades
+
+
+def _estimate_pass_at_k_loop(num_samples, num_correct, k):
+    """Reference per-problem implementation, kept for the benchmark below"""
+
+    def estimator(n: int, c: int, k: int) -> float:
+        if c == 0:
+            return 0.0
+        if n - c < k:
+            return 1.0
+        return 1.0 - np.prod(1.0 - k / np.arange(n - c + 1, n + 1))
+
+    return np.array([estimator(int(n), int(c), k) for n, c in zip(num_samples, num_correct)])
+
+
+def benchmark(num_problems: int = 235, repeats: int = 3):
+    """Times the matrix engine against the per problem loop for n up to 1000"""
+    import time
+
+    k_list = [1, 5, 10, 20, 40, 50, 75, 100, 125, 150, 200, 500, 1000]
+    rng = np.random.default_rng(0)
+    print(f"{'n':>6}{'loop (s)':>12}{'matrix (s)':>12}{'speedup':>10}{'max abs diff':>15}")
+    for n in [5, 10, 100, 1000]:
+        ks = [k for k in k_list if k <= n]
+        num_samples = np.full(num_problems, n)
+        num_correct = rng.binomial(n, rng.uniform(0, 1, num_problems))
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            loop = np.stack(
+                [_estimate_pass_at_k_loop(num_samples, num_correct, k) for k in ks], axis=1
+            )
+        loop_time = (time.perf_counter() - start) / repeats
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            matrix = estimate_pass_at_k_matrix(num_samples, num_correct, ks)
+        matrix_time = (time.perf_counter() - start) / repeats
+
+        print(
+            f"{n:>6}{loop_time:>12.5f}{matrix_time:>12.5f}"
+            f"{loop_time / matrix_time:>10.1f}{np.abs(loop - matrix).max():>15.2e}"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,65 @@
+""" Per generation, per test outcomes stored as packed bitsets (one bit per test, set when the test passed). """
+import base64
+
+import numpy as np
+
+
+def pack_test_results(generation_results: list, num_tests: int) -> np.ndarray:
+    """
+    `run_test` results of every generation of a problem (True for a passed test,
+    False / -1 / -2 otherwise) to a (generations, ceil(num_tests / 8)) uint8 array.
+    Results shorter than `num_tests` (compilation errors, fail fast evaluations)
+    count the missing tests as failed
+    """
+    passed = np.zeros((len(generation_results), num_tests), dtype=bool)
+    for i, results in enumerate(generation_results):
+        results = results[:num_tests]
+        passed[i, : len(results)] = [result is True for result in results]
+    return np.packbits(passed, axis=1)
+
+
+def unpack_test_results(bitmaps: np.ndarray, num_tests: int) -> np.ndarray:
+    """(generations, num_tests) boolean array of the passed tests"""
+    bitmaps = np.asarray(bitmaps, dtype=np.uint8).reshape(-1, (num_tests + 7) // 8)
+    return np.unpackbits(bitmaps, axis=1, count=num_tests).astype(bool)
+
+
+def encode_test_bitmaps(generation_results: list, num_tests: int) -> dict:
+    """Fields added to an eval_all instance, one base64 bitmap per generation"""
+    bitmaps = pack_test_results(generation_results, num_tests)
+    return {
+        "num_tests": num_tests,
+        "test_bitmaps": [base64.b64encode(row.tobytes()).decode("ascii") for row in bitmaps],
+    }
+
+
+def decode_test_bitmaps(instance: dict) -> np.ndarray:
+    """(generations, num_tests) boolean array of an eval_all instance, None without bitmaps"""
+    if "test_bitmaps" not in instance:
+        return None
+    num_tests = instance["num_tests"]
+    if len(instance["test_bitmaps"]) == 0:
+        return np.zeros((0, num_tests), dtype=bool)
+    bitmaps = np.frombuffer(
+        b"".join(base64.b64decode(bitmap) for bitmap in instance["test_bitmaps"]),
+        dtype=np.uint8,
+    )
+    return unpack_test_results(bitmaps, num_tests)
+
+
+def add_test_bitmaps(save_eval_results: list, benchmark: list, results: dict):
+    """
+    Adds the bitmaps to the eval_all instances of `benchmark` from the raw `results`
+    of the metrics, the entries of `benchmark` are the last ones of both
+    """
+    if len(benchmark) == 0:
+        return
+    raw_results = [results[key] for key in sorted(results, key=int)]
+    for eval_result, instance, generation_results in zip(
+        save_eval_results[-len(benchmark) :],
+        benchmark,
+        raw_results[-len(benchmark) :],
+    ):
+        eval_result.update(
+            encode_test_bitmaps(generation_results, len(instance.test_cases))
+        )
@@ -0,0 +1,392 @@
+""" Benchmark of the scoring layer (pass@k, grouped scores, IOI aggregation) on synthetic result sets. """
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+
+import numpy as np
+
+from lcb_runner.evaluation.pass_k_utils import (
+    compute_metrics_from_counts,
+    compute_metrics_from_results,
+    extract_instance_results,
+)
+from lcb_runner.evaluation.compact_results import CompactResults
+from lcb_runner.evaluation.group_scores import (
+    DEFAULT_K_LIST,
+    load_score_table,
+    compute_group_scores,
+    format_group_scores,
+)
+
+## `IOI_scripts` is not a package, its aggregator is loaded by path
+IOI_SCRIPTS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "IOI_scripts"
+)
+
+## bump whenever the stages or the synthetic data change, results of other versions are not comparable
+BENCHMARK_VERSION = "1"
+GROUP_BY_LIST = [["difficulty"], ["platform"], ["year"], ["tags"], ["year", "difficulty"]]
+PLATFORMS = [f"ICPC_world_final_{year}" for year in range(2011, 2025)]
+DIFFICULTIES = ["easy", "medium", "hard"]
+TAGS = ["graphs", "dp", "math", "geometry", "strings", "greedy"]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--num_problems", type=int, default=235, help="Number of synthetic problems"
+    )
+    parser.add_argument(
+        "--n_list",
+        type=int,
+        nargs="+",
+        default=[5, 10, 100, 1000],
+        help="Numbers of samples per problem, one benchmark of every stage per n",
+    )
+    parser.add_argument(
+        "--num_tests",
+        type=int,
+        default=20,
+        help="Maximum number of tests per generation of the synthetic raw results",
+    )
+    parser.add_argument(
+        "--composite_every",
+        type=int,
+        default=10,
+        help="One IOI problem in `composite_every` is a composite problem of 5 subtasks",
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="Number of timed runs of every stage"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data")
+    parser.add_argument(
+        "--work_dir",
+        type=str,
+        default=None,
+        help="Directory of the synthetic files (default: a temporary directory removed afterwards)",
+    )
+    parser.add_argument(
+        "--output_json",
+        type=str,
+        default=None,
+        help="Write the timings, settings and environment (numpy version, git commit) to this JSON file",
+    )
+    parser.add_argument(
+        "--baseline_json",
+        type=str,
+        default=None,
+        help="`--output_json` of an earlier run (e.g. another commit), prints the speedup of every stage against it",
+    )
+    return parser.parse_args()
+
+
+def _load_ioi_aggregator():
+    if "ioi_aggregator" not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            "ioi_aggregator", os.path.join(IOI_SCRIPTS_DIR, "ioi_aggregator.py")
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["ioi_aggregator"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["ioi_aggregator"]
+
+
+def _solve_rates(rng: np.random.Generator, num_problems: int) -> np.ndarray:
+    ## most problems are either almost never or almost always solved
+    return rng.beta(0.4, 0.6, num_problems)
+
+
+def synthesize_eval_all(rng: np.random.Generator, num_problems: int, n: int) -> list:
+    """eval_all instances of HLCE runs: platform with the year, difficulty and tags, n graded samples"""
+    solve_rates = _solve_rates(rng, num_problems)
+    results = []
+    for i in range(num_problems):
+        num_tags = int(rng.integers(0, 3))
+        results.append(
+            {
+                "question_id": f"problem_{i}",
+                "platform": PLATFORMS[i % len(PLATFORMS)],
+                "difficulty": DIFFICULTIES[int(rng.integers(len(DIFFICULTIES)))],
+                "tags": rng.choice(TAGS, num_tags, replace=False).tolist(),
+                "graded_list": (rng.random(n) < solve_rates[i]).tolist(),
+            }
+        )
+    return results
+
+
+def synthesize_compact_results(
+    rng: np.random.Generator, num_problems: int, n: int, num_tests: int
+) -> CompactResults:
+    """
+    Raw `codegen_metrics` results: failing generations stop at their first failed test
+    (fail fast) with False, -1 or -2 (compilation errors have a single verdict)
+    """
+    solve_rates = _solve_rates(rng, num_problems)
+    problem_tests = rng.integers(1, num_tests + 1, num_problems)
+    generation_tests = np.repeat(problem_tests, n)
+    solved = rng.random(num_problems * n) < np.repeat(solve_rates, n)
+    verdict = rng.choice(np.array([0, -1, -2], dtype=np.int8), num_problems * n, p=[0.7, 0.2, 0.1])
+    failed_at = rng.integers(0, generation_tests)
+    lengths = np.where(solved, generation_tests, np.where(verdict == -2, 1, failed_at + 1))
+    generation_offsets = np.concatenate([[0], np.cumsum(lengths)])
+    codes = np.ones(int(generation_offsets[-1]), dtype=np.int8)
+    last = generation_offsets[1:] - 1
+    codes[last[~solved]] = verdict[~solved]
+    return CompactResults(
+        range(num_problems),
+        codes,
+        generation_offsets,
+        np.arange(num_problems + 1) * n,
+    )
+
+
+def synthesize_ioi_records(
+    rng: np.random.Generator, num_problems: int, n: int, composite_every: int
+) -> tuple:
+    """
+    Merged IOI score records (n submissions of every problem, or of every subtask of
+    the composite problems) and the composite config matching them
+    """
+    solve_rates = _solve_rates(rng, num_problems)
+    records = []
+    composite_problems = []
+    for i in range(num_problems):
+        date = f"IOI {2002 + i % 23} day {1 + i % 2}"
+        if composite_every > 0 and i % composite_every == 0:
+            prefix = chr(ord("A") + i % 3)
+            subtasks = [f"{prefix}{s}" for s in range(1, 6)]
+            composite_problems.append(
+                {
+                    "name": f"{prefix}. Synthetic composite {i} ({date})",
+                    "date": date,
+                    "problem_index_prefix": prefix,
+                    "subtasks": subtasks,
+                }
+            )
+        else:
+            ## another day letter than the composites of the same date
+            subtasks = [chr(ord("D") + i % 3)]
+        for subtask in subtasks:
+            full = rng.random(n) < solve_rates[i] ** (1 / len(subtasks))
+            partial = np.round(rng.random(n) * 100.0, 1)
+            compilation_error = rng.random(n) < 0.05
+            ## subtasks of an attempt arrive in shuffled order, as in the merged parts
+            record_ids = rng.permutation(n)
+            for j in range(n):
+                records.append(
+                    {
+                        "problem_index": subtask,
+                        "problem_title": f"{subtask}. Synthetic problem {i}",
+                        "date": date,
+                        "verdict": "Compilation error" if compilation_error[j] else "Partial result",
+                        "points": None if compilation_error[j] else (100.0 if full[j] else float(partial[j])),
+                        "original_record_id": int(record_ids[j]),
+                    }
+                )
+    return records, {"composite_problems": composite_problems}
+
+
+def time_stage(function, repeats: int) -> tuple:
+    """(min and mean seconds over `repeats` runs, output of the last run)"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = function()
+        timings.append(time.perf_counter() - start)
+    return {"seconds_min": min(timings), "seconds_mean": sum(timings) / len(timings)}, output
+
+
+def benchmark_icpc(args, rng: np.random.Generator, n: int, work_dir: str) -> dict:
+    eval_all_file = os.path.join(work_dir, f"synthetic_{n}_eval_all.json")
+    with open(eval_all_file, "w") as f:
+        json.dump(synthesize_eval_all(rng, args.num_problems, n), f)
+    compact_results = synthesize_compact_results(rng, args.num_problems, n, args.num_tests)
+    k_list = [k for k in DEFAULT_K_LIST if k <= n]
+    scores_file = os.path.join(work_dir, f"synthetic_{n}_scores.json")
+
+    def load():
+        with open(eval_all_file, "r") as f:
+            return load_score_table(json.load(f))
+
+    def write(scores):
+        format_group_scores(scores)
+        with open(scores_file, "w") as f:
+            json.dump(scores, f, indent=4)
+
+    stages = {}
+    stages["load"], table = time_stage(load, args.repeats)
+    stages["pass_at_k"], _ = time_stage(
+        lambda: compute_metrics_from_counts(table.question_ids, table.totals, table.corrects, k_list),
+        args.repeats,
+    )
+    stages["codegen_results"], _ = time_stage(
+        lambda: (
+            compute_metrics_from_results(compact_results, k_list),
+            extract_instance_results(compact_results),
+        ),
+        args.repeats,
+    )
+    stages["grouping"], scores = time_stage(
+        lambda: compute_group_scores(table, GROUP_BY_LIST, k_list), args.repeats
+    )
+    stages["output"], _ = time_stage(lambda: write(scores), args.repeats)
+    return {
+        "stages": stages,
+        "eval_all_bytes": os.path.getsize(eval_all_file),
+        "num_verdicts": len(compact_results.codes),
+        "pass@1": scores["overall"]["pass@1"],
+    }
+
+
+def benchmark_ioi(args, rng: np.random.Generator, n: int, work_dir: str) -> dict:
+    ioi_aggregator = _load_ioi_aggregator()
+    records, composite_config = synthesize_ioi_records(
+        rng, args.num_problems, n, args.composite_every
+    )
+    score_file = os.path.join(work_dir, f"synthetic_{n}_score_merge.jsonl")
+    composite_config_file = os.path.join(work_dir, f"synthetic_{n}_composite_problems.json")
+    results_file = os.path.join(work_dir, f"synthetic_{n}_results.jsonl")
+    with open(score_file, "w") as f:
+        json.dump(records, f)
+    with open(composite_config_file, "w") as f:
+        json.dump(composite_config, f)
+    del records
+    composite_problems = ioi_aggregator.load_composite_config(composite_config_file)
+    k_list = [k for k in [1, 5] if k <= n]
+
+    def write(final_stats, problem_stats):
+        ## same lines as `compute_ioi_final_results.py`
+        with open(results_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "overall_stats", **final_stats}) + "\n")
+            for problem, stats in problem_stats.items():
+                f.write(json.dumps({"type": "problem_stats", "problem": problem, **stats}) + "\n")
+
+    stages = {}
+    stages["load"], records = time_stage(
+        lambda: list(ioi_aggregator.iter_score_records(score_file)), args.repeats
+    )
+    stages["aggregate"], (final_stats, problem_stats) = time_stage(
+        lambda: ioi_aggregator.IOIScoreAggregator(composite_problems, k_list=k_list)
+        .add_all(records)
+        .finalize(),
+        args.repeats,
+    )
+    stages["output"], _ = time_stage(lambda: write(final_stats, problem_stats), args.repeats)
+    return {
+        "stages": stages,
+        "score_file_bytes": os.path.getsize(score_file),
+        "num_records": len(records),
+        "num_composite_problems": len(composite_problems),
+        "pass@1": final_stats["pass@1"],
+    }
+
+
+def get_environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(args, work_dir: str) -> dict:
+    results = {"icpc": {}, "ioi": {}}
+    for n in args.n_list:
+        rng = np.random.default_rng([args.seed, n])
+        print(f"Benchmarking n = {n}")
+        results["icpc"][str(n)] = benchmark_icpc(args, rng, n, work_dir)
+        results["ioi"][str(n)] = benchmark_ioi(args, rng, n, work_dir)
+    return {
+        "version": BENCHMARK_VERSION,
+        "settings": {
+            "num_problems": args.num_problems,
+            "n_list": args.n_list,
+            "num_tests": args.num_tests,
+            "composite_every": args.composite_every,
+            "repeats": args.repeats,
+            "seed": args.seed,
+        },
+        "environment": get_environment(),
+        "results": results,
+    }
+
+
+def format_benchmarks(benchmarks: dict, baseline: dict = None) -> str:
+    header = ["suite", "n", "stage", "min (s)", "mean (s)"]
+    if baseline is not None:
+        header.append("speedup")
+    rows = []
+    for suite, by_n in benchmarks["results"].items():
+        for n, result in by_n.items():
+            for stage, timing in result["stages"].items():
+                row = [suite, n, stage, f"{timing['seconds_min']:.5f}", f"{timing['seconds_mean']:.5f}"]
+                if baseline is not None:
+                    baseline_timing = (
+                        baseline["results"].get(suite, {}).get(n, {}).get("stages", {}).get(stage)
+                    )
+                    row.append(
+                        f"{baseline_timing['seconds_min'] / timing['seconds_min']:.2f}x"
+                        if baseline_timing and timing["seconds_min"] > 0
+                        else "-"
+                    )
+                rows.append(row)
+    table = [header] + rows
+    widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+    lines = [
+        "  ".join(
+            cell.ljust(width) if i < 3 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in table
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+    return "\n".join(lines)
+
+
+def main():
+    args = get_parser()
+
+    baseline = None
+    if args.baseline_json is not None:
+        with open(args.baseline_json, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("version") != BENCHMARK_VERSION or baseline.get("settings", {}).get(
+            "num_problems"
+        ) != args.num_problems:
+            print(f"Warning: {args.baseline_json} was run with other settings or benchmark version")
+
+    if args.work_dir is not None:
+        os.makedirs(args.work_dir, exist_ok=True)
+        benchmarks = run_benchmarks(args, args.work_dir)
+    else:
+        with tempfile.TemporaryDirectory() as work_dir:
+            benchmarks = run_benchmarks(args, work_dir)
+
+    print(format_benchmarks(benchmarks, baseline))
+
+    if args.output_json is not None:
+        with open(args.output_json, "w") as f:
+            json.dump(benchmarks, f, indent=4)
+        print(f"Saved the benchmark results to {args.output_json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+""" Checks that solutions get the same verdicts with plain tests and with tests read from the compressed test store. """
+import json
+import argparse
+import tempfile
+
+from lcb_runner.utils.compressed_test_store import save_problem_tests
+from lcb_runner.evaluation.compute_code_generation_metrics import check_correctness
+
+## tests of a problem summing the integers of every line
+TESTS = [("1 2\n3 4\n", "3\n7\n"), ("5 5\n", "10\n")]
+
+## the stdin access patterns of Python solutions, each summing the integers of every line
+SOLUTIONS = {
+    "input": "for _ in range(2):\n    try:\n        print(sum(map(int, input().split())))\n    except EOFError:\n        break",
+    "sys.stdin.readline": "for line in iter(sys.stdin.readline, ''):\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "stdin.readline (from sys import stdin)": "from sys import stdin\nline = stdin.readline()\nwhile line:\n    print(sum(map(int, line.split())))\n    line = stdin.readline()",
+    "stdin.readlines": "from sys import stdin\nfor line in stdin.readlines():\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "stdin.read": "from sys import stdin\nfor line in stdin.read().split('\\n'):\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "sys.stdin.read": "import sys\nfor line in sys.stdin.read().splitlines():\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "sys.stdin.readlines": "import sys\nfor line in sys.stdin.readlines():\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "for line in sys.stdin": "import sys\nfor line in sys.stdin:\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "sys.stdin.buffer": "import sys\nfor line in sys.stdin.buffer.read().split(b'\\n'):\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "os.read(sys.stdin.fileno())": "import os, sys\nfor line in os.read(sys.stdin.fileno(), 1 << 20).split(b'\\n'):\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "open(0).read": "for line in open(0).read().split('\\n'):\n    if line.strip():\n        print(sum(map(int, line.split())))",
+    "open(0).readlines": "for line in open(0).readlines():\n    if line.strip():\n        print(sum(map(int, line.split())))",
+}
+
+
+def get_samples(store_dir: str):
+    """The same tests as a plain sample and as a sample of the compressed test store"""
+    plain = {
+        "inputs": [test_input for test_input, _ in TESTS],
+        "outputs": [test_output for _, test_output in TESTS],
+    }
+    manifest = save_problem_tests(store_dir, "stdin_consistency", TESTS)
+    compressed = {
+        "inputs": [],
+        "outputs": [],
+        "compressed_tests": [
+            [entry["input_path"], entry["output_path"]] for entry in manifest
+        ],
+    }
+    return {"input_output": json.dumps(plain)}, {"input_output": json.dumps(compressed)}
+
+
+def check_stdin_consistency(timeout: int = 6) -> dict:
+    """Returns {pattern: (plain verdicts, compressed verdicts)} of every solution"""
+    with tempfile.TemporaryDirectory() as store_dir:
+        plain_sample, compressed_sample = get_samples(store_dir)
+        verdicts = {}
+        for pattern, solution in SOLUTIONS.items():
+            ## every run is a separate process, `run_test` disables parts of the interpreter
+            plain, _ = check_correctness(plain_sample, solution, timeout, debug=False)
+            compressed, _ = check_correctness(compressed_sample, solution, timeout, debug=False)
+            verdicts[pattern] = (list(plain), list(compressed))
+    return verdicts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that every stdin access pattern gets the same verdicts with plain and compressed tests"
+    )
+    parser.add_argument("--timeout", type=int, default=6)
+    args = parser.parse_args()
+
+    verdicts = check_stdin_consistency(args.timeout)
+    mismatches = [
+        pattern for pattern, (plain, compressed) in verdicts.items() if plain != compressed
+    ]
+    for pattern, (plain, compressed) in verdicts.items():
+        status = "MISMATCH" if pattern in mismatches else "ok"
+        print(f"{status:>8}  {pattern:<40} plain {plain}  compressed {compressed}")
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} stdin access patterns get different verdicts")
+    print("Plain and compressed tests give the same verdicts")
+
+
+if __name__ == "__main__":
+    main()
@@ -22,6 +22,16 @@ from pyext import RuntimeModule
 
 from enum import Enum
 
+from lcb_runner.utils.compressed_test_store import (
+    CompressedStdin,
+    OutputHasher,
+    iter_compressed_lines,
+    open_compressed_text,
+    read_compressed_head,
+    read_compressed_text,
+    stream_compare_stripped,
+)
+
 
 def truncatefn(s, length=300):
     assert isinstance(s, str)
@@ -68,6 +78,56 @@ class Capturing(list):
         sys.stdout = self._stdout
 
 
+# hashes stdout as it is written instead of keeping it, only a short prefix is stored for the metadata
+class FingerprintCapturing(list):
+    def __init__(self, keep_output=False, preview_length=300):
+        super().__init__()
+        self.keep_output = keep_output
+        self.preview_length = preview_length
+
+    def __enter__(self):
+        self._stdout = sys.stdout
+        self._hasher = OutputHasher(normalize_newlines=True)
+        self._chunks = []
+        self._preview_size = 0
+        sys.stdout = self
+        return self
+
+    def write(self, text):
+        self._hasher.update(text)
+        if self.keep_output or self._preview_size < self.preview_length:
+            self._chunks.append(text)
+            self._preview_size += len(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def fingerprint(self):
+        return self._fingerprint
+
+    def __exit__(self, *args):
+        self._fingerprint = self._hasher.fingerprint()
+        output = "".join(self._chunks)
+        if not self.keep_output:
+            output = output[: self.preview_length]
+        self.append(output)
+        del self._chunks  # free up some memory
+        sys.stdout = self._stdout
+
+
+class CompressedTestInput(str):
+    """Path of a compressed test input, fed to the solution as a stream"""
+
+    pass
+
+
+def get_num_tests(in_outs: dict) -> int:
+    if in_outs.get("compressed_tests"):
+        return len(in_outs["compressed_tests"])
+    return len(in_outs["inputs"])
+
+
 def only_int_check(val):
     return isinstance(val, int)
 
@@ -102,6 +162,19 @@ def run_test(sample, test=None, debug=False, timeout=60):
         else:
             which_type = CODE_TYPE.call_based  # Call-based
             method_name = in_outs["fn_name"]
+        compressed_tests = in_outs.get("compressed_tests")
+        if compressed_tests:
+            ## tests live in the compressed test store, only paths are kept in memory
+            in_outs["inputs"] = [
+                CompressedTestInput(input_path) for input_path, _ in compressed_tests
+            ]
+            in_outs["outputs"] = [None] * len(compressed_tests)
+        ## verify_mode="fingerprint": a test passes iff the hash of the stripped output matches
+        ## (with diagnostics a mismatch still runs the full comparison)
+        fingerprints = in_outs.get("output_fingerprints")
+        diagnostics = in_outs.get("diagnostics", False)
+        ## fail_fast=False runs every test and reports the first failure at the end
+        fail_fast = in_outs.get("fail_fast", True)
 
     if debug:
         print(f"loaded input_output = {datetime.now().time()}")
@@ -217,10 +290,14 @@ def run_test(sample, test=None, debug=False, timeout=60):
                 "error_message": "Unable to extract code",
             }
 
+        failure = None
         for index, inputs in enumerate(in_outs["inputs"]):
             raw_inputs = inputs
             raw_outputs = in_outs["outputs"][index]
-            if which_type == CODE_TYPE.call_based:
+            if compressed_tests:
+                raw_inputs = read_compressed_head(compressed_tests[index][0])
+                raw_outputs = read_compressed_head(compressed_tests[index][1], 200)
+            elif which_type == CODE_TYPE.call_based:
                 inputs = [json.loads(line) for line in inputs.split("\n")]
                 in_outs["outputs"][index] = json.loads(in_outs["outputs"][index])
 
@@ -234,7 +311,9 @@ def run_test(sample, test=None, debug=False, timeout=60):
                 raw_outputs = truncatefn(raw_outputs, 200)
             else:
                 raw_inputs = truncatefn(raw_inputs)
-                raw_outputs = truncatefn(raw_outputs, 200)
+                raw_outputs = (
+                    truncatefn(raw_outputs, 200) if raw_outputs is not None else ""
+                )
             # JSON forces dictionaries to have string keys; this undoes this (assuming a singleton list)
             try:
                 if isinstance(inputs[0], dict):
@@ -294,13 +373,15 @@ def run_test(sample, test=None, debug=False, timeout=60):
                         True
                     results.append(tmp_result)
                     if tmp_result != True:
-                        return results, {
+                        failure = failure or {
                             "output": raw_true_output_copy,
                             "expected": raw_outputs,
                             "inputs": raw_inputs,
                             "error_code": -2,
                             "error_message": "Wrong Answer",
                         }
+                        if fail_fast:
+                            return results, failure
                     # reset the alarm
                     signal.alarm(0)
                 except Exception as e:
@@ -312,7 +393,7 @@ def run_test(sample, test=None, debug=False, timeout=60):
                         )
                     results.append(-1)
                     if "timeoutexception" in repr(e).lower():
-                        return results, {
+                        failure = failure or {
                             "error": repr(e),
                             "error_code": -3,
                             "error_message": "Time Limit Exceeded",
@@ -320,13 +401,16 @@ def run_test(sample, test=None, debug=False, timeout=60):
                             "expected": raw_outputs,
                         }
                     else:
-                        return results, {
+                        failure = failure or {
                             "error": repr(e),
                             "error_code": -4,
                             "error_message": "Runtime Error",
                             "inputs": raw_inputs,
                             "expected": raw_outputs,
                         }
+                    if fail_fast:
+                        return results, failure
+                    continue
                 faulthandler.disable()
                 signal.alarm(0)
                 if debug:
@@ -342,8 +426,14 @@ def run_test(sample, test=None, debug=False, timeout=60):
                 if isinstance(in_outs["outputs"][index], list):
                     in_outs["outputs"][index] = "\n".join(in_outs["outputs"][index])
 
+                if fingerprints is not None:
+                    ## the output is only kept for the full comparison of the diagnostics
+                    capturing = FingerprintCapturing(keep_output=diagnostics)
+                else:
+                    capturing = Capturing()
+
                 signal.alarm(timeout)
-                with Capturing() as output:
+                with capturing as output:
                     try:
                         call_method(method, inputs)
                         # reset the alarm
@@ -357,7 +447,7 @@ def run_test(sample, test=None, debug=False, timeout=60):
                         )
                         results.append(-1)
                         if "timeoutexception" in repr(e).lower():
-                            return results, {
+                            failure = failure or {
                                 "error": repr(e),
                                 "error_code": -3,
                                 "error_message": "Time Limit Exceeded",
@@ -365,17 +455,41 @@ def run_test(sample, test=None, debug=False, timeout=60):
                                 "expected": raw_outputs,
                             }
                         else:
-                            return results, {
+                            failure = failure or {
                                 "error": repr(e),
                                 "error_code": -4,
                                 "error_message": "Runtime Error",
                                 "inputs": raw_inputs,
                                 "expected": raw_outputs,
                             }
+                        if fail_fast:
+                            return results, failure
+                        continue
                     signal.alarm(0)
                 raw_true_output = output[0]
                 raw_true_output_copy = truncatefn(raw_true_output, 200)
                 output = raw_true_output.splitlines()
+
+                if passed and fingerprints is not None:
+                    ## a match implies that the full comparison passes
+                    if capturing.fingerprint() == list(fingerprints[index]):
+                        results.append(True)
+                        continue
+                    ## without diagnostics a mismatch is a wrong answer (exact match of the
+                    ## stripped output), the expected output is not even in memory
+                    if not diagnostics:
+                        results.append(False)
+                        failure = failure or {
+                            "output": raw_true_output_copy,
+                            "expected": raw_outputs,
+                            "inputs": raw_inputs,
+                            "error_code": -2,
+                            "error_message": "Wrong Answer",
+                        }
+                        if fail_fast:
+                            return results, failure
+                        continue
+                    ## diagnostics run the full comparison and report both fingerprints
                 if not passed:
                     if debug:
                         nl = "\n"
@@ -394,6 +508,15 @@ def run_test(sample, test=None, debug=False, timeout=60):
                         f"==> output = {output}, test outputs = {in_outs['outputs'][index]}"
                     )
 
+                if compressed_tests:
+                    if stream_compare_stripped(output, compressed_tests[index][1]):
+                        results.append(True)
+                        continue
+                    ## the lenient checks below need the expected output in memory
+                    in_outs["outputs"][index] = read_compressed_text(
+                        compressed_tests[index][1]
+                    )
+
                 if custom_compare_(output, in_outs["outputs"][index]):
                     tmp_result = True
                     results.append(tmp_result)
@@ -602,13 +725,20 @@ def run_test(sample, test=None, debug=False, timeout=60):
 
                 results.append(tmp_result)
                 if tmp_result != True:
-                    return results, {
+                    wrong_answer = {
                         "output": raw_true_output_copy,
                         "expected": raw_outputs,
                         "inputs": raw_inputs,
                         "error_code": -2,
                         "error_message": "Wrong Answer",
                     }
+                    if fingerprints is not None and diagnostics:
+                        wrong_answer["output_fingerprint"] = capturing.fingerprint()
+                        wrong_answer["expected_fingerprint"] = list(fingerprints[index])
+                    failure = failure or wrong_answer
+                    if fail_fast:
+                        return results, failure
+                    continue
 
                 if debug:
                     nl = "\n"
@@ -623,7 +753,7 @@ def run_test(sample, test=None, debug=False, timeout=60):
 
                     print(f"results = {results}")
 
-    return results, {}
+    return results, failure or {}
 
 
 def custom_compare_(output, ground_truth):
@@ -650,6 +780,9 @@ def stripped_string_compare(s1, s2):
 
 def call_method(method, inputs):
 
+    if isinstance(inputs, CompressedTestInput):
+        return call_method_stream(method, inputs)
+
     if isinstance(inputs, list):
         inputs = "\n".join(inputs)
 
@@ -675,6 +808,35 @@ def call_method(method, inputs):
     return _inner_call_method(method)
 
 
+def call_method_stream(method, input_path):
+    """
+    Same as `call_method` but decompresses the test input while the solution reads it,
+    the solution sees the same stdin objects and methods as with `call_method`
+    """
+
+    stdin = CompressedStdin(input_path)
+    inputs_line_iterator = iter_compressed_lines(input_path)
+
+    @patch("builtins.open", lambda *args, **kwargs: open_compressed_text(input_path))
+    @patch("sys.stdin", stdin)
+    @patch("sys.stdin.readline", lambda *args: next(inputs_line_iterator))
+    @patch("sys.stdin.readlines", lambda *args: read_compressed_text(input_path).split("\n"))
+    @patch("sys.stdin.read", lambda *args: read_compressed_text(input_path))
+    def _inner_call_method(_method):
+        try:
+            return _method()
+        except SystemExit as e:
+            pass
+        finally:
+            pass
+
+    try:
+        return _inner_call_method(method)
+    finally:
+        inputs_line_iterator.close()
+        stdin.close()
+
+
 def reliability_guard(maximum_memory_bytes=None):
     """
     This disables various destructive functions and prevents the generated code
@@ -2,3 +2,4 @@ from lcb_runner.prompts.code_execution import format_prompt_execution, format_pr
 from lcb_runner.prompts.code_generation import format_prompt_generation
 from lcb_runner.prompts.test_output_prediction import format_prompt_test_output
 from lcb_runner.prompts.self_repair import format_prompt_self_repair
+from lcb_runner.prompts.chat_templates import format_prompts, set_tokenizer_path
@@ -0,0 +1,61 @@
+""" Process-wide registry of the tokenizers whose chat templates are used to build prompts. """
+import os
+from functools import lru_cache
+from typing import List, Optional
+
+## tokenizer name -> default huggingface repo (or local path)
+DEFAULT_TOKENIZER_PATHS = {
+    "llama3": "meta-llama/Meta-Llama-3-8B-Instruct",
+    "qwen1.5": "Qwen/Qwen1.5-72B-Chat",
+    "dracarys-qwen": "abacusai/Dracarys-72B-Instruct",
+    "dracarys-llama": "abacusai/Dracarys-Llama-3.1-70B-Instruct",
+}
+
+## set from --tokenizer_path, takes precedence over every name
+_path_override: Optional[str] = None
+
+
+def set_tokenizer_path(path: Optional[str]):
+    global _path_override
+    _path_override = path
+
+
+def get_tokenizer_path(name: str) -> str:
+    """
+    --tokenizer_path, then LCB_TOKENIZER_PATH, then LCB_TOKENIZER_<NAME>
+    (e.g. LCB_TOKENIZER_LLAMA3), then the default of the name
+    """
+    if _path_override is not None:
+        return _path_override
+    env_name = "LCB_TOKENIZER_" + name.upper().replace("-", "_").replace(".", "_")
+    return (
+        os.getenv("LCB_TOKENIZER_PATH")
+        or os.getenv(env_name)
+        or DEFAULT_TOKENIZER_PATHS[name]
+    )
+
+
+@lru_cache(maxsize=None)
+def _load_tokenizer(path: str, padding_side: str, use_fast: bool):
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(
+        path, padding_side=padding_side, use_fast=use_fast
+    )
+
+
+def get_tokenizer(name: str, padding_side: str = "left", use_fast: bool = False):
+    """Loaded on first use, then shared by every prompt of the process"""
+    return _load_tokenizer(get_tokenizer_path(name), padding_side, use_fast)
+
+
+def format_prompts(problems: List, style, format_prompt: callable = None) -> List:
+    """
+    Formats all the problems for a language model style in one pass, the chat
+    template tokenizer (if any) is loaded once for the whole batch
+    """
+    if format_prompt is None:
+        from lcb_runner.prompts.code_generation import format_prompt_generation
+
+        format_prompt = format_prompt_generation
+    return [format_prompt(problem, style) for problem in problems]
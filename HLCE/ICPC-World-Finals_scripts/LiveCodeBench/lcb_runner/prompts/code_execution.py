@@ -1,6 +1,7 @@
 import json
 
 from lcb_runner.lm_styles import LMStyle
+from lcb_runner.prompts.chat_templates import get_tokenizer
 from lcb_runner.benchmarks import CodeExecutionProblem
 
 
@@ -105,11 +106,7 @@ def format_prompt_execution_base(
         chat_messages += [
             {"role": "user", "content": prompt},
         ]
-        from transformers import AutoTokenizer
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            "meta-llama/Meta-Llama-3-8B-Instruct", padding_side="left", use_fast=False
-        )
+        tokenizer = get_tokenizer("llama3", padding_side="left")
         return tokenizer.apply_chat_template(
             chat_messages,
             tokenize=False,
@@ -7,6 +7,7 @@ except ImportError:
     AI_PROMPT = None
 
 from lcb_runner.lm_styles import LMStyle
+from lcb_runner.prompts.chat_templates import get_tokenizer
 from lcb_runner.benchmarks.code_generation import CodeGenerationProblem
 
 
@@ -79,11 +80,7 @@ def get_deepseekcode_question_template_answer(question: CodeGenerationProblem):
 
 
 def get_qwen_question_template_answer(question: CodeGenerationProblem):
-    from transformers import AutoTokenizer
-
-    tokenizer = AutoTokenizer.from_pretrained(
-        "/abacus/models/Qwen1.5-72B-Chat/", padding_side="left", use_fast=False
-    )
+    tokenizer = get_tokenizer("qwen1.5", padding_side="left")
     prompt = "You will be given a question (problem specification) and will generate a correct Python program that matches the specification and passes all tests. You will NOT return anything except for the program.\n\n"
     prompt += f"Question:\n{question.question_content}\n\n"
     if question.starter_code:
@@ -234,14 +231,7 @@ def format_prompt_generation(
                 "content": get_generic_question_template_answer(question),
             },
         ]
-        from transformers import AutoTokenizer
-
-        # tokenizer = AutoTokenizer.from_pretrained(
-        #     "meta-llama/Meta-Llama-3-8B-Instruct", padding_side="left", use_fast=False
-        # )
-        tokenizer = AutoTokenizer.from_pretrained(
-            "/home/lixiangyang/code_llm_eval_v2/human-eval-master/pretrained_LLMs/LLama3-8B-Chinese", padding_side="left", use_fast=False
-        )
+        tokenizer = get_tokenizer("llama3", padding_side="left")
         return tokenizer.apply_chat_template(
             chat_messages,
             tokenize=False,
@@ -375,11 +365,7 @@ def format_prompt_generation(
                 "content": get_generic_question_template_answer(question),
             },
         ]
-        from transformers import AutoTokenizer
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            "abacusai/Dracarys-Llama-3.1-70B-Instruct", padding_side="right", use_fast=False
-        )
+        tokenizer = get_tokenizer("dracarys-llama", padding_side="right")
 
         return tokenizer.apply_chat_template(
             chat_messages,
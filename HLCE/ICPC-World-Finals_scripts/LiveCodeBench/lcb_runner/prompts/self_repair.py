@@ -3,6 +3,7 @@ import json
 from anthropic import HUMAN_PROMPT, AI_PROMPT
 
 from lcb_runner.lm_styles import LMStyle
+from lcb_runner.prompts.chat_templates import get_tokenizer
 
 
 class PromptConstants:
@@ -141,11 +142,7 @@ def get_phind_question_template_answer(question: str, code, result, metadata):
     return prompt
 
 def get_qwen_question_template_answer(question: str, code, result, metadata):
-    from transformers import AutoTokenizer
-
-    tokenizer = AutoTokenizer.from_pretrained(
-        "abacusai/Dracarys-72B-Instruct", padding_side="left", use_fast=False
-    )
+    tokenizer = get_tokenizer("dracarys-qwen", padding_side="left")
     prompt = f"""### Instruction: You are a helpful programming assistant and an expert Python programmer. You are helping a user write a program to solve a problem. The user has written some code, but it has some errors and is not passing the tests. You will help the user by first giving a concise (at most 2-3 sentences) textual explanation of what is wrong with the code. After you have pointed out what is wrong with the code, you will then generate a fixed version of the program. You must put the entired fixed program within code delimiters only for once., for example:
     ```python
     # YOUR CODE HERE
@@ -206,11 +203,7 @@ def format_prompt_self_repair(
             },
         ]
 
-        from transformers import AutoTokenizer
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            "meta-llama/Meta-Llama-3-8B-Instruct", padding_side="left", use_fast=False
-        )
+        tokenizer = get_tokenizer("llama3", padding_side="left")
         return tokenizer.apply_chat_template(
             chat_messages,
             tokenize=False,
@@ -284,11 +277,7 @@ def format_prompt_self_repair(
             },
         ]
 
-        from transformers import AutoTokenizer
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            "abacusai/Dracarys-Llama-3.1-70B-Instruct", padding_side="right", use_fast=False
-        )
+        tokenizer = get_tokenizer("dracarys-llama", padding_side="right")
         return tokenizer.apply_chat_template(
             chat_messages,
             tokenize=False,
@@ -3,6 +3,7 @@ import json
 from anthropic import HUMAN_PROMPT, AI_PROMPT
 
 from lcb_runner.lm_styles import LMStyle
+from lcb_runner.prompts.chat_templates import get_tokenizer
 from lcb_runner.benchmarks import TestOutputPredictionProblem
 
 
@@ -133,11 +134,7 @@ def get_phind_question_template_answer(
     return prompt
 
 def get_qwen_question_template_answer(question: TestOutputPredictionProblem, testcase_input: str):
-    from transformers import AutoTokenizer
-
-    tokenizer = AutoTokenizer.from_pretrained(
-        "abacusai/Dracarys-72B-Instruct", padding_side="left", use_fast=False
-    )
+    tokenizer = get_tokenizer("dracarys-qwen", padding_side="left")
 
     prompt = f"""### Instruction: {PromptConstants.SYSTEM_MESSAGE_CHAT_GENERIC}\n"""
     prompt += get_generic_question_template_test_completion(question, testcase_input)
@@ -191,11 +188,7 @@ def format_prompt_test_output(
                 ),
             },
         ]
-        from transformers import AutoTokenizer
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            "meta-llama/Meta-Llama-3-8B-Instruct", padding_side="left", use_fast=False
-        )
+        tokenizer = get_tokenizer("llama3", padding_side="left")
         return tokenizer.apply_chat_template(
             chat_messages,
             tokenize=False,
@@ -293,11 +286,7 @@ def format_prompt_test_output(
                 ),
             },
         ]
-        from transformers import AutoTokenizer
-
-        tokenizer = AutoTokenizer.from_pretrained(
-            "abacusai/Dracarys-Llama-3.1-70B-Instruct", padding_side="right", use_fast=False
-        )
+        tokenizer = get_tokenizer("dracarys-llama", padding_side="right")
         return tokenizer.apply_chat_template(
             chat_messages,
             tokenize=False,
@@ -0,0 +1,123 @@
+""" Adaptive number of samples per problem for code generation runs. """
+import math
+from statistics import NormalDist
+from typing import List, Tuple
+
+from lcb_runner.lm_styles import LanguageModel
+from lcb_runner.evaluation.compute_code_generation_metrics import (
+    linearize_generations,
+    evaluate_generations,
+    assemble_codegen_metrics,
+)
+from lcb_runner.runner.scenario_router import combine_results, get_evaluation_samples
+from lcb_runner.runner.generation_cache import RoundGenerationCache
+
+
+def wilson_interval(num_correct: int, num_samples: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Wilson score interval of the probability that a sample is correct"""
+    if num_samples == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    p = num_correct / num_samples
+    denominator = 1 + z * z / num_samples
+    center = (p + z * z / (2 * num_samples)) / denominator
+    margin = (
+        z
+        * math.sqrt(p * (1 - p) / num_samples + z * z / (4 * num_samples * num_samples))
+        / denominator
+    )
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def pass_at_k_interval(
+    num_correct: int, num_samples: int, k: int, confidence: float = 0.95
+) -> Tuple[float, float]:
+    """pass@k = 1 - (1 - p)^k is increasing in p, the Wilson bounds of p map to bounds of pass@k"""
+    lower, upper = wilson_interval(num_correct, num_samples, confidence)
+    return 1 - (1 - lower) ** k, 1 - (1 - upper) ** k
+
+
+def run_adaptive_sampling(
+    args,
+    runner,
+    model: LanguageModel,
+    benchmark: List,
+    format_prompt: callable,
+    max_samples: int,
+) -> Tuple[List[List[str]], list]:
+    """
+    Generates and evaluates `args.n` (the round size) samples of every problem still
+    sampled per round. A problem stops being sampled once the confidence interval of
+    its pass@`args.adaptive_k` is at most `args.adaptive_ci_width` wide, or when
+    another round would exceed `max_samples`.
+    The generation cache of the runner is keyed by round, so a restarted run gets
+    the rounds it already generated from the cache.
+    Returns the outputs of every problem (as many as its samples) and the same
+    metrics as `get_metrics`, pass@k being estimated with the n of each problem.
+    """
+    eval_samples = get_evaluation_samples(args.scenario, args, benchmark)
+    outputs = [[] for _ in benchmark]
+    results = {index: [] for index in range(len(benchmark))}
+    metadatas = {index: [] for index in range(len(benchmark))}
+
+    active = list(range(len(benchmark)))
+    num_rounds = 0
+    cache = runner.cache
+    while active:
+        num_rounds += 1
+        if cache is not None:
+            runner.cache = RoundGenerationCache(cache, num_rounds - 1)
+        round_outputs = runner.run_main([benchmark[i] for i in active], format_prompt)
+        combined_results = combine_results(
+            args.scenario, round_outputs, model, args.cot_code_execution
+        )
+        samples_linear, generations_linear, remap_index = linearize_generations(
+            [eval_samples[i] for i in active],
+            [extracted for _, extracted in combined_results],
+        )
+        print(f"Round {num_rounds}: evaluating {len(samples_linear)} samples of {len(active)} problems")
+        results_linear, metadatas_linear = evaluate_generations(
+            samples_linear,
+            generations_linear,
+            num_process_evaluate=args.num_process_evaluate,
+            timeout=args.timeout,
+        )
+        for position, index in enumerate(active):
+            outputs[index].extend(round_outputs[position])
+        for idx in sorted(results_linear):
+            index = active[remap_index[idx]]
+            results[index].append(results_linear[idx][0])
+            metadatas[index].append(metadatas_linear[idx][0])
+
+        still_active = []
+        for index in active:
+            num_samples = len(results[index])
+            num_correct = sum(
+                all(result > 0 for result in generation) for generation in results[index]
+            )
+            lower, upper = pass_at_k_interval(
+                num_correct, num_samples, args.adaptive_k, args.adaptive_confidence
+            )
+            if upper - lower > args.adaptive_ci_width and num_samples + args.n <= max_samples:
+                still_active.append(index)
+        print(
+            f"Round {num_rounds}: {len(active) - len(still_active)} problems done, {len(still_active)} still sampled"
+        )
+        active = still_active
+    runner.cache = cache
+
+    num_samples = [len(results[index]) for index in range(len(benchmark))]
+    metrics = assemble_codegen_metrics(results, metadatas, num_samples)
+    metrics[0]["adaptive_sampling"] = {
+        "rounds": num_rounds,
+        "round_size": args.n,
+        "max_samples": max_samples,
+        "ci_width": args.adaptive_ci_width,
+        "k": args.adaptive_k,
+        "confidence": args.adaptive_confidence,
+        "num_samples": dict(enumerate(num_samples)),
+    }
+    print(
+        f"Adaptive sampling: {sum(num_samples)} samples instead of {max_samples * len(benchmark)} in {num_rounds} rounds"
+    )
+    return outputs, metrics
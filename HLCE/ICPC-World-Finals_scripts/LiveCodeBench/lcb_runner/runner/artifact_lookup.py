@@ -0,0 +1,51 @@
+import os
+import sys
+import json
+
+from lcb_runner.runner.parser import get_args
+from lcb_runner.lm_styles import LanguageModelStore
+from lcb_runner.utils.path_utils import get_output_path
+from lcb_runner.utils.artifact_store import (
+    MANIFEST_FILE,
+    build_manifest,
+    find_artifact,
+    get_manifest_key,
+)
+from lcb_runner.runner.custom_evaluator import load_custom_outputs
+from lcb_runner.runner.scenario_router import (
+    build_prompt_benchmark,
+    sort_and_extract_save_results,
+)
+
+
+def main():
+    """
+    Finds an existing evaluation identical to the one the same arguments would
+    run, for `--custom_output_file` outputs or the `_output.json` of `--model`
+    """
+    args = get_args()
+
+    benchmark, _ = build_prompt_benchmark(args)
+
+    if args.custom_output_file is not None:
+        _, combined_results = load_custom_outputs(args, benchmark)
+    else:
+        output_path = get_output_path(LanguageModelStore[args.model].model_repr, args)
+        with open(output_path) as f:
+            save_results = json.load(f)
+        _, combined_results = sort_and_extract_save_results(args.scenario, save_results)
+
+    manifest = build_manifest(args, benchmark, combined_results)
+    artifact_dir = find_artifact(args.artifact_dir, manifest)
+    if artifact_dir is None:
+        print(f"No identical evaluation found (key {get_manifest_key(manifest)})")
+        sys.exit(1)
+
+    with open(os.path.join(artifact_dir, MANIFEST_FILE)) as f:
+        saved_manifest = json.load(f)
+    print(f"Found an identical evaluation from {saved_manifest['created_at']}")
+    print(artifact_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,29 @@
-import os
 import json
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Tuple, Optional
 from tqdm import tqdm
 
 from lcb_runner.lm_styles import LanguageModel
 from lcb_runner.utils.path_utils import get_cache_path
-from lcb_runner.utils.multiprocess import run_tasks_in_parallel
+from lcb_runner.utils.multiprocess import run_tasks_in_parallel_iter
+from lcb_runner.utils.async_utils import run_coroutines_in_parallel
+from lcb_runner.utils.rate_limiter import RateLimiter, format_rate_limit_stats
+from lcb_runner.utils.telemetry import Telemetry, run_traced, arun_traced
 from lcb_runner.runner.scenario_router import Scenario
+from lcb_runner.runner.generation_cache import build_generation_cache, serialize_prompt
+from lcb_runner.prompts.chat_templates import format_prompts
 
 
 class BaseRunner(ABC):
+    ## API runners share a rate limiter per provider across all their workers
+    rate_limit_provider: str = None
+    ## providers returning one sample per request implement `_run_single_sample`
+    ## (and `_arun_single_sample`) instead, the n samples of a prompt are then independent tasks.
+    ## Providers returning several choices per request implement `_run_samples` (and `_arun_samples`)
+    ## so that only the samples missing from the cache are requested.
+    single_choice: bool = False
+
     def __init__(self, args, model: LanguageModel):
         self.args = args
         self.model = model
@@ -18,23 +31,112 @@ class BaseRunner(ABC):
 
         if self.args.use_cache:
             self.cache_path = get_cache_path(model.model_repr, args)
-            if os.path.exists(self.cache_path):
-                with open(self.cache_path) as f:
-                    self.cache: dict = json.load(f)
-            else:
-                self.cache = {}
+            self.cache = build_generation_cache(self.cache_path, model.model_repr, args)
         else:
             self.cache_path = None
             self.cache = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.samples_recovered = 0
+        self.tokens_recovered = 0
+        ## async clients are bound to the event loop they are first used in,
+        ## both are created lazily and kept for the whole run
+        self.async_client = None
+        self.event_loop = None
+        ## traces of the requests sent by this runner, see `utils/telemetry.py`
+        self.telemetry = Telemetry()
+
+        if self.rate_limit_provider is not None:
+            self.rate_limiter = RateLimiter(
+                self.rate_limit_provider,
+                state_dir=args.rate_limit_dir,
+                requests_per_minute=args.requests_per_minute,
+                tokens_per_minute=args.tokens_per_minute,
+                max_retries=args.max_retries,
+            )
+        else:
+            self.rate_limiter = None
 
     def save_cache(self):
         if self.args.use_cache:
-            with open(self.cache_path, "w") as f:
-                json.dump(self.cache, f, indent=4)
+            self.cache.save()
 
     # @abstractmethod
     def _run_single(self, prompt: Union[str, List[Dict[str, str]]]) -> List[str]:
-        pass
+        if self.supports_samples():
+            return [output for output, _ in self._run_samples(prompt, self.args.n)]
+
+    def estimate_request_tokens(
+        self, prompt: Union[str, List[Dict[str, str]]], n: int = 1
+    ) -> int:
+        """Upper bound of the tokens of a request reserved in the tokens per minute bucket"""
+        ## ~4 characters per token for the prompt, the full completion budget for every sample
+        return len(serialize_prompt(prompt)) // 4 + n * self.args.max_tokens
+
+    def _build_async_client(self):
+        """Providers implementing `_arun_single` (or `_arun_single_sample`) return their async client here"""
+        return None
+
+    async def _arun_single(self, prompt: Union[str, List[Dict[str, str]]]) -> List[str]:
+        raise NotImplementedError
+
+    def _run_single_sample(
+        self, prompt: Union[str, List[Dict[str, str]]]
+    ) -> Tuple[str, Optional[int]]:
+        """Returns one sample and its number of completion tokens (None if unknown)"""
+        raise NotImplementedError
+
+    async def _arun_single_sample(
+        self, prompt: Union[str, List[Dict[str, str]]]
+    ) -> Tuple[str, Optional[int]]:
+        raise NotImplementedError
+
+    def _run_samples(
+        self, prompt: Union[str, List[Dict[str, str]]], n: int
+    ) -> List[Tuple[str, Optional[int]]]:
+        """Returns `n` samples with their number of completion tokens (None if unknown)"""
+        if self.single_choice:
+            return [self._run_single_sample(prompt) for _ in range(n)]
+        raise NotImplementedError
+
+    async def _arun_samples(
+        self, prompt: Union[str, List[Dict[str, str]]], n: int
+    ) -> List[Tuple[str, Optional[int]]]:
+        if self.single_choice:
+            return [await self._arun_single_sample(prompt) for _ in range(n)]
+        raise NotImplementedError
+
+    def supports_samples(self) -> bool:
+        return self.single_choice or type(self)._run_samples is not BaseRunner._run_samples
+
+    def supports_async(self) -> bool:
+        if self.single_choice:
+            return type(self)._arun_single_sample is not BaseRunner._arun_single_sample
+        if self.supports_samples():
+            return type(self)._arun_samples is not BaseRunner._arun_samples
+        return type(self)._arun_single is not BaseRunner._arun_single
+
+    def use_async(self) -> bool:
+        return self.supports_async() and not self.args.disable_async
+
+    def get_async_client(self):
+        if self.async_client is None:
+            self.async_client = self._build_async_client()
+        return self.async_client
+
+    def get_event_loop(self) -> asyncio.AbstractEventLoop:
+        if self.event_loop is None:
+            self.event_loop = asyncio.new_event_loop()
+        return self.event_loop
+
+    def __getstate__(self):
+        ## `_run_single` is shipped to the workers bound to the runner, leave the cache behind
+        state = self.__dict__.copy()
+        state["cache"] = None
+        state["async_client"] = None
+        state["event_loop"] = None
+        state["telemetry"] = None
+        return state
 
     @staticmethod
     def run_single(combined_args) -> List[str]:
@@ -44,73 +146,304 @@ class BaseRunner(ABC):
         Calls the _run_single method with the combined arguments
         """
         prompt: str | List[dict[str, str]]
-        cache: dict[str, str]
         call_method: callable
-        prompt, cache, args, call_method = combined_args
-
-        if isinstance(prompt, List):
-            prompt_cache = json.dumps(prompt)
-        if cache is not None and prompt_cache in cache:
-            if len(cache[prompt_cache]) == args.n:
-                return cache[prompt_cache]
+        prompt, args, call_method = combined_args
 
         result = call_method(prompt)
         assert len(result) == args.n
 
         return result
 
-    # def run_batch(self, prompts: List[str | List[dict[str, str]]]) -> List[List[str]]:
-    def run_batch(self, prompts: List[Union[str, List[Dict[str, str]]]]) -> List[List[str]]:
-
-        outputs = []
-        arguments = [
-            (
-                prompt,
-                self.cache,  ## pass the cache as argument for cache check
-                self.args,  ## pass the args as argument for cache check
-                self._run_single,  ## pass the _run_single method as argument because of multiprocessing
-            )
-            for prompt in prompts
+    async def arun_single(self, prompt: Union[str, List[Dict[str, str]]]) -> List[str]:
+        """Coroutine counterpart of `run_single`, runs in the event loop of the runner"""
+        result = await self._arun_single(prompt)
+        assert len(result) == self.args.n
+
+        return result
+
+    @staticmethod
+    def run_samples(combined_args) -> List[Tuple[str, Optional[int]]]:
+        """
+        Run the model for `num_samples` samples of a prompt
+        Static method to be used in multiprocessing
+        """
+        prompt, num_samples, call_method = combined_args
+        result = call_method(prompt, num_samples)
+        assert len(result) == num_samples
+
+        return result
+
+    async def arun_samples(self, task) -> List[Tuple[str, Optional[int]]]:
+        prompt, num_samples = task
+        result = await self._arun_samples(prompt, num_samples)
+        assert len(result) == num_samples
+
+        return result
+
+    @staticmethod
+    def extract_task_result(task_result):
+        if task_result.is_success():
+            return task_result.result
+        print("Failed to run the model for some prompts")
+        print(task_result.status)
+        print(task_result.exception_tb)
+        return None
+
+    def extract_traced_result(self, traced_result):
+        """Keeps the trace of a request and returns its result, None if it failed"""
+        if traced_result is None:
+            return None
+        result, trace = traced_result
+        self.telemetry.add(trace)
+        if trace.error is not None:
+            print("Failed to run the model for some prompts")
+            print(trace.exception_tb)
+        return result
+
+    def dispatch(
+        self,
+        run_func: callable,
+        arguments: List,
+        arun_func: callable,
+        tasks: List,
+        on_result: callable,
+        task_prompts: List,
+        task_num_samples: List[int],
+    ):
+        """
+        Runs every task, with `arun_func(task)` on the event loop when the runner
+        is async and `run_func(argument)` otherwise. `on_result(index, output)` is
+        called as soon as a task is done, with None as output if the task failed.
+        Every task is traced (see `utils/telemetry.py`), `task_prompts` give the
+        input token estimates of the providers that do not report usage.
+        """
+        estimated_input_tokens = [
+            len(serialize_prompt(prompt)) // 4 for prompt in task_prompts
         ]
-        if self.args.multiprocess > 1:
-            parallel_outputs = run_tasks_in_parallel(
-                self.run_single,
-                arguments,
-                self.args.multiprocess,
+        if self.use_async():
+            ## requests are pure I/O, a single event loop keeps all of them in flight
+            run_coroutines_in_parallel(
+                lambda traced_task: arun_traced(arun_func, *traced_task),
+                list(zip(tasks, task_num_samples, estimated_input_tokens)),
+                self.args.async_concurrency,
                 use_progress_bar=True,
+                callback=lambda index, task_result: on_result(
+                    index,
+                    self.extract_traced_result(self.extract_task_result(task_result)),
+                ),
+                loop=self.get_event_loop(),
+            )
+            return
+
+        traced_arguments = [
+            (run_func, argument, num_samples, num_tokens)
+            for argument, num_samples, num_tokens in zip(
+                arguments, task_num_samples, estimated_input_tokens
             )
-            for output in parallel_outputs:
-                if output.is_success():
-                    outputs.append(output.result)
-                else:
-                    print("Failed to run the model for some prompts")
-                    print(output.status)
-                    print(output.exception_tb)
-                    outputs.extend([""] * self.args.n)
+        ]
+        if self.args.multiprocess > 1:
+            for index, task_result in enumerate(
+                run_tasks_in_parallel_iter(
+                    run_traced,
+                    traced_arguments,
+                    self.args.multiprocess,
+                    use_progress_bar=True,
+                )
+            ):
+                on_result(
+                    index,
+                    self.extract_traced_result(self.extract_task_result(task_result)),
+                )
         else:
-            outputs = [self.run_single(argument) for argument in tqdm(arguments)]
+            for index, traced_argument in enumerate(tqdm(traced_arguments)):
+                on_result(index, self.extract_traced_result(run_traced(traced_argument)))
 
-        if self.args.use_cache:
-            for prompt, output in zip(prompts, outputs):
-                if isinstance(prompt, list):
-                    prompt_cache = json.dumps(prompt)
-                self.cache[prompt_cache] = output  ## save the output to cache
+    @staticmethod
+    def get_output_setter(outputs: List, on_output: Optional[callable] = None) -> callable:
+        """`on_output(prompt_index, outputs)` is called as soon as the outputs of a prompt are final"""
+
+        def set_output(prompt_index: int, prompt_outputs: List[str]):
+            outputs[prompt_index] = prompt_outputs
+            if on_output is not None:
+                on_output(prompt_index, prompt_outputs)
+
+        return set_output
 
+    # def run_batch(self, prompts: List[str | List[dict[str, str]]]) -> List[List[str]]:
+    def run_batch(
+        self,
+        prompts: List[Union[str, List[Dict[str, str]]]],
+        on_output: Optional[callable] = None,
+    ) -> List[List[str]]:
+        outputs = [None for _ in prompts]
+        set_output = self.get_output_setter(outputs, on_output)
+        remaining_prompts = []
+        remaining_indices = []
+        ## cache hits are resolved here so only the misses are sent to the workers
+        for prompt_index, prompt in enumerate(prompts):
+            if self.args.use_cache:
+                cached_outputs = self.cache.get(prompt)
+                if cached_outputs is not None and len(cached_outputs) == self.args.n:
+                    set_output(prompt_index, cached_outputs)
+                    self.cache_hits += 1
+                    self.tokens_recovered += sum(
+                        num_tokens or 0
+                        for _, num_tokens in self.cache.get_samples(prompt).values()
+                    )
+                    continue
+                self.cache_misses += 1
+            remaining_prompts.append(prompt)
+            remaining_indices.append(prompt_index)
+
+        if self.supports_samples():
+            self.run_remaining_samples(
+                remaining_prompts, remaining_indices, outputs, set_output
+            )
+            return outputs
+
+        def on_result(task_index: int, output):
+            prompt_index = remaining_indices[task_index]
+            if output is None:
+                ## failed prompts are not cached so that they are retried on the next run
+                set_output(prompt_index, [""] * self.args.n)
+                return
+            set_output(prompt_index, output)
+            if self.args.use_cache:
+                self.cache[remaining_prompts[task_index]] = output  ## save the output to cache
+
+        self.dispatch(
+            self.run_single,
+            [
+                (
+                    prompt,
+                    self.args,  ## pass the args as argument for the output check
+                    self._run_single,  ## pass the _run_single method as argument because of multiprocessing
+                )
+                for prompt in remaining_prompts
+            ],
+            self.arun_single,
+            remaining_prompts,
+            on_result,
+            remaining_prompts,
+            [self.args.n for _ in remaining_prompts],
+        )
         return outputs
 
+    def run_remaining_samples(
+        self,
+        prompts: List[Union[str, List[Dict[str, str]]]],
+        prompt_indices: List[int],
+        outputs: List,
+        set_output: callable,
+    ):
+        """
+        Requests only the samples missing from the sample cache: single choice
+        providers get one task per missing sample, the others one task per prompt
+        asking for as many choices as there are missing samples. Samples are cached
+        as they arrive and the list of a prompt is assembled once all its samples are back.
+        """
+        samples = [
+            self.cache.get_samples(prompt) if self.args.use_cache else {}
+            for prompt in prompts
+        ]
+        for prompt_samples in samples:
+            ## samples beyond n (cached by a run with a larger n) are not needed
+            for sample_index in [i for i in prompt_samples if i >= self.args.n]:
+                del prompt_samples[sample_index]
+            self.samples_recovered += len(prompt_samples)
+            self.tokens_recovered += sum(
+                num_tokens or 0 for _, num_tokens in prompt_samples.values()
+            )
+
+        tasks = []
+        for prompt_position, prompt_samples in enumerate(samples):
+            missing_indices = [i for i in range(self.args.n) if i not in prompt_samples]
+            if not missing_indices:
+                continue
+            if self.single_choice:
+                tasks.extend((prompt_position, [i]) for i in missing_indices)
+            else:
+                tasks.append((prompt_position, missing_indices))
+
+        def on_result(task_index: int, results):
+            prompt_position, sample_indices = tasks[task_index]
+            if results is None:
+                return
+            prompt = prompts[prompt_position]
+            for sample_index, (output, num_tokens) in zip(sample_indices, results):
+                samples[prompt_position][sample_index] = (output, num_tokens)
+                if self.args.use_cache:
+                    self.cache.put_sample(prompt, sample_index, output, num_tokens)
+            if len(samples[prompt_position]) == self.args.n:
+                prompt_outputs = [
+                    samples[prompt_position][i][0] for i in range(self.args.n)
+                ]
+                set_output(prompt_indices[prompt_position], prompt_outputs)
+                if self.args.use_cache:
+                    self.cache[prompt] = prompt_outputs
+
+        self.dispatch(
+            self.run_samples,
+            [
+                (prompts[prompt_position], len(sample_indices), self._run_samples)
+                for prompt_position, sample_indices in tasks
+            ],
+            self.arun_samples,
+            [
+                (prompts[prompt_position], len(sample_indices))
+                for prompt_position, sample_indices in tasks
+            ],
+            on_result,
+            [prompts[prompt_position] for prompt_position, _ in tasks],
+            [len(sample_indices) for _, sample_indices in tasks],
+        )
+
+        for prompt_position, prompt_index in enumerate(prompt_indices):
+            if outputs[prompt_index] is None:
+                ## prompts fully recovered from the sample cache, or with failed samples
+                ## (left out of the cache so that they are retried on the next run)
+                prompt_outputs = [
+                    samples[prompt_position].get(i, ("", None))[0]
+                    for i in range(self.args.n)
+                ]
+                set_output(prompt_index, prompt_outputs)
+                if self.args.use_cache and len(samples[prompt_position]) == self.args.n:
+                    self.cache[prompts[prompt_position]] = prompt_outputs
+
     def prompts_to_outputs(
-            self, prompts: List[Union[str, List[Dict[str, str]]]]
+            self,
+            prompts: List[Union[str, List[Dict[str, str]]]],
+            on_output: Optional[callable] = None,
     ) -> List[List[str]]:
         if self.args.use_cache:
             outputs = []
             batch_size = self.args.cache_batch_size
             for i in range(0, len(prompts), batch_size):
                 batch = prompts[i : i + batch_size]
-                batch_outputs = self.run_batch(batch)
+                batch_on_output = None
+                if on_output is not None:
+                    batch_on_output = lambda index, output, offset=i: on_output(
+                        offset + index, output
+                    )
+                batch_outputs = self.run_batch(batch, on_output=batch_on_output)
                 outputs.extend(batch_outputs)
                 self.save_cache()
+            print(
+                f"Generation cache: {self.cache_hits} hits, {self.cache_misses} misses"
+            )
+            if self.supports_samples():
+                print(
+                    f"Sample cache: {self.samples_recovered} samples of unfinished prompts resumed, "
+                    f"{self.tokens_recovered} completion tokens recovered from cache"
+                )
         else:
-            outputs = self.run_batch(prompts)
+            outputs = self.run_batch(prompts, on_output=on_output)
+        if self.rate_limiter is not None:
+            print(
+                format_rate_limit_stats(
+                    self.rate_limit_provider, self.rate_limiter.get_stats()
+                )
+            )
         return outputs
 
     def run_main_repair(self, benchmark: List, format_prompt: callable) -> List[List[str]]:
@@ -163,12 +496,17 @@ class BaseRunner(ABC):
 
         return outputs
 
-    def run_main(self, benchmark: List, format_prompt: callable) -> List[List[str]]:
+    def run_main(
+        self,
+        benchmark: List,
+        format_prompt: callable,
+        on_output: Optional[callable] = None,
+    ) -> List[List[str]]:
+        """`on_output(problem_index, outputs)` is called as soon as the outputs of a problem are final"""
         if self.args.scenario == Scenario.selfrepair:
+            assert on_output is None, "on_output is not supported for selfrepair"
             return self.run_main_repair(benchmark, format_prompt)
 
-        prompts = [
-            format_prompt(problem, self.model.model_style) for problem in benchmark
-        ]
-        outputs = self.prompts_to_outputs(prompts)
+        prompts = format_prompts(benchmark, self.model.model_style, format_prompt)
+        outputs = self.prompts_to_outputs(prompts, on_output=on_output)
         return outputs
@@ -0,0 +1,217 @@
+""" Request and result files of the provider batch APIs (OpenAI and Anthropic message batches). """
+import json
+import hashlib
+from typing import List, Dict, Tuple, Optional
+
+from lcb_runner.lm_styles import LanguageModel, LMStyle
+from lcb_runner.runner.generation_cache import PromptType, serialize_prompt
+
+BATCH_FORMATS = {
+    LMStyle.OpenAIChat: "openai",
+    LMStyle.DeepSeekAPI: "openai",
+    LMStyle.Claude3: "anthropic",
+}
+## providers returning one sample per request (the `single_choice` runners) get one request per sample
+SINGLE_CHOICE_STYLES = {LMStyle.DeepSeekAPI, LMStyle.Claude3}
+
+## samples of a prompt, by sample index: (output, number of completion tokens)
+Samples = Dict[int, Tuple[str, Optional[int]]]
+
+
+def get_batch_format(model: LanguageModel) -> str:
+    if model.model_style not in BATCH_FORMATS:
+        raise ValueError(
+            f"Batch files are not supported for language model style {model.model_style}"
+        )
+    return BATCH_FORMATS[model.model_style]
+
+
+def get_prompt_hash(prompt: PromptType) -> str:
+    return hashlib.sha256(serialize_prompt(prompt).encode("utf-8")).hexdigest()[:32]
+
+
+def get_custom_id(prompt_hash: str, start_index: int, num_samples: int) -> str:
+    ## at most 64 characters of [a-zA-Z0-9_-] as required by the batch APIs
+    return f"{prompt_hash}_{start_index}_{num_samples}"
+
+
+def parse_custom_id(custom_id: str) -> Tuple[str, int, int]:
+    prompt_hash, start_index, num_samples = custom_id.split("_")
+    return prompt_hash, int(start_index), int(num_samples)
+
+
+def get_missing_ranges(missing_indices: List[int]) -> List[Tuple[int, int]]:
+    """Groups sorted sample indices into (start index, number of samples) ranges"""
+    ranges = []
+    for index in missing_indices:
+        if ranges and ranges[-1][0] + ranges[-1][1] == index:
+            ranges[-1] = (ranges[-1][0], ranges[-1][1] + 1)
+        else:
+            ranges.append((index, 1))
+    return ranges
+
+
+def build_batch_request(
+    batch_format: str, custom_id: str, prompt: PromptType, args, num_samples: int
+) -> dict:
+    if batch_format == "openai":
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": args.model,
+                "messages": prompt,
+                "temperature": args.temperature,
+                "max_tokens": args.max_tokens,
+                "top_p": args.top_p,
+                "frequency_penalty": 0,
+                "presence_penalty": 0,
+                "n": num_samples,
+            },
+        }
+    ## anthropic returns a single sample per request
+    assert num_samples == 1
+    system, messages = prompt
+    return {
+        "custom_id": custom_id,
+        "params": {
+            "model": args.model,
+            "system": system,
+            "messages": messages,
+            "temperature": args.temperature,
+            "max_tokens": args.max_tokens,
+            "top_p": args.top_p,
+        },
+    }
+
+
+def get_cached_samples(prompt: PromptType, args, cache=None) -> Samples:
+    if cache is None:
+        return {}
+    cached_outputs = cache.get(prompt)
+    if cached_outputs is not None and len(cached_outputs) == args.n:
+        return {i: (output, None) for i, output in enumerate(cached_outputs)}
+    return cache.get_samples(prompt)
+
+
+def write_batch_requests(
+    path: str, prompts: List[PromptType], model: LanguageModel, args, cache=None
+) -> int:
+    """
+    Writes one request per range of samples missing from the cache (one per
+    sample for single choice providers) and returns the number of requests
+    """
+    batch_format = get_batch_format(model)
+    num_requests = 0
+    seen_hashes = set()
+    with open(path, "w") as f:
+        for prompt in prompts:
+            prompt_hash = get_prompt_hash(prompt)
+            if prompt_hash in seen_hashes:
+                continue
+            seen_hashes.add(prompt_hash)
+
+            cached_samples = get_cached_samples(prompt, args, cache)
+            missing_indices = [i for i in range(args.n) if i not in cached_samples]
+            if model.model_style not in SINGLE_CHOICE_STYLES:
+                ranges = get_missing_ranges(missing_indices)
+            else:
+                ranges = [(index, 1) for index in missing_indices]
+
+            for start_index, num_samples in ranges:
+                request = build_batch_request(
+                    batch_format,
+                    get_custom_id(prompt_hash, start_index, num_samples),
+                    prompt,
+                    args,
+                    num_samples,
+                )
+                f.write(json.dumps(request) + "\n")
+                num_requests += 1
+    return num_requests
+
+
+def parse_batch_result(batch_format: str, result: dict) -> Optional[List[Tuple[str, Optional[int]]]]:
+    """Returns the samples of a result line, None if the request failed"""
+    if batch_format == "openai":
+        response = result.get("response")
+        if result.get("error") or response is None or response["status_code"] != 200:
+            return None
+        body = response["body"]
+        if not body.get("choices"):
+            ## e.g. a filtered response, counted as a failed request
+            return None
+        num_tokens = None
+        if body.get("usage"):
+            num_tokens = body["usage"]["completion_tokens"] // len(body["choices"])
+        return [(choice["message"]["content"], num_tokens) for choice in body["choices"]]
+
+    if result["result"]["type"] != "succeeded":
+        return None
+    message = result["result"]["message"]
+    content = "\n".join(
+        [block["text"] for block in message["content"] if block["type"] == "text"]
+    )
+    return [(content, message["usage"]["output_tokens"])]
+
+
+def read_batch_results(path: str, model: LanguageModel) -> Dict[str, Samples]:
+    """Reads a result file of the provider into the samples of every prompt hash"""
+    batch_format = get_batch_format(model)
+    samples: Dict[str, Samples] = {}
+    num_failed = 0
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            prompt_hash, start_index, num_samples = parse_custom_id(result["custom_id"])
+            parsed = parse_batch_result(batch_format, result)
+            if parsed is None:
+                num_failed += 1
+                continue
+            prompt_samples = samples.setdefault(prompt_hash, {})
+            for offset, sample in enumerate(parsed[:num_samples]):
+                prompt_samples[start_index + offset] = sample
+    if num_failed:
+        print(f"{num_failed} failed requests in {path}")
+    return samples
+
+
+def load_batch_outputs(
+    path: str, prompts: List[PromptType], model: LanguageModel, args, cache=None
+) -> List[List[str]]:
+    """
+    Assembles the outputs of the prompts from the batch results and the cache.
+    Ingested samples are written into the cache, samples missing from both are
+    left empty (and uncached) so that the next request file asks for them again.
+    """
+    batch_samples = read_batch_results(path, model)
+    outputs = []
+    num_missing = 0
+    for prompt in prompts:
+        prompt_samples = get_cached_samples(prompt, args, cache)
+        for sample_index, (output, num_tokens) in batch_samples.get(
+            get_prompt_hash(prompt), {}
+        ).items():
+            if sample_index >= args.n:
+                continue
+            prompt_samples[sample_index] = (output, num_tokens)
+            if cache is not None:
+                cache.put_sample(prompt, sample_index, output, num_tokens)
+
+        prompt_outputs = [
+            prompt_samples.get(i, ("", None))[0] for i in range(args.n)
+        ]
+        missing = args.n - sum(i in prompt_samples for i in range(args.n))
+        if missing == 0 and cache is not None:
+            cache[prompt] = prompt_outputs
+        num_missing += missing
+        outputs.append(prompt_outputs)
+
+    if cache is not None:
+        cache.save()
+    if num_missing:
+        print(f"{num_missing} samples are missing from {path} and the cache")
+    return outputs
@@ -0,0 +1,147 @@
+"""
+Throughput benchmark of the API runners against the local mock server.
+
+python -m lcb_runner.runner.benchmark_runners --model gpt-4o-2024-05-13 --n 10 \
+    --num_prompts 200 --settings async,1,8,32 --latency_ms 800 --latency_sigma 0.5 --rate_limit_rate 0.05
+"""
+import os
+import copy
+import json
+import time
+import tempfile
+
+import numpy as np
+
+from lcb_runner.lm_styles import LanguageModelStore
+from lcb_runner.runner.parser import get_parser, process_args
+from lcb_runner.runner.mock_server import (
+    start_mock_server,
+    add_mock_server_args,
+    get_mock_server_config,
+)
+
+
+def get_benchmark_args():
+    parser = get_parser()
+    parser.add_argument(
+        "--runners",
+        type=str,
+        default="openai,deepseek",
+        help="Runners to benchmark (`,` separated, openai and/or deepseek)",
+    )
+    parser.add_argument(
+        "--settings",
+        type=str,
+        default="async,1,4,16",
+        help="Concurrency settings to benchmark (`,` separated), `async` for the event loop and integers for `--multiprocess`",
+    )
+    parser.add_argument("--num_prompts", type=int, default=100)
+    parser.add_argument(
+        "--benchmark_output_file",
+        type=str,
+        default=None,
+        help="Write the benchmark results as json to this file",
+    )
+    add_mock_server_args(parser)
+    ## the mock server has no quota, the async setting keeps its full concurrency
+    parser.set_defaults(async_concurrency=100)
+    return process_args(parser.parse_args())
+
+
+def get_runner_class(name: str):
+    ## imported after the base urls are set, the clients are created at import time
+    if name == "openai":
+        from lcb_runner.runner.oai_runner import OpenAIRunner
+
+        return OpenAIRunner
+    if name == "deepseek":
+        from lcb_runner.runner.deepseek_runner import DeepSeekRunner
+
+        return DeepSeekRunner
+    raise ValueError(f"Unknown runner {name}")
+
+
+def run_setting(runner_class, setting: str, args, model, server, prompts) -> dict:
+    run_args = copy.copy(args)
+    run_args.use_cache = False
+    run_args.rate_limit_dir = tempfile.mkdtemp()
+    if setting == "async":
+        run_args.disable_async = False
+    else:
+        run_args.disable_async = True
+        run_args.multiprocess = int(setting)
+
+    runner = runner_class(run_args, model)
+    server.reset_stats()
+    start = time.time()
+    outputs = runner.prompts_to_outputs(prompts)
+    elapsed = time.time() - start
+
+    stats = server.stats
+    limiter_stats = runner.rate_limiter.get_stats()
+    latencies = np.array(stats.latencies) if stats.latencies else np.zeros(1)
+    num_failed = sum(all(output == "" for output in outputs_list) for outputs_list in outputs)
+    return {
+        "runner": runner_class.__name__,
+        "setting": setting,
+        "num_prompts": len(prompts),
+        "num_failed_prompts": num_failed,
+        "elapsed": elapsed,
+        "requests_per_second": len(stats.latencies) / elapsed,
+        "prompts_per_second": len(prompts) / elapsed,
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_p99": float(np.percentile(latencies, 99)),
+        "backoff_seconds": limiter_stats.get("backoff_seconds", 0.0),
+        "throttled_seconds": limiter_stats.get("throttled_seconds", 0.0),
+        "num_retries": limiter_stats.get("num_retries", 0),
+        **stats.to_dict(),
+    }
+
+
+def format_results(results: list) -> str:
+    header = (
+        f"{'runner':<16}{'setting':>8}{'req/s':>9}{'prompt/s':>10}{'p50 (s)':>9}"
+        f"{'p99 (s)':>9}{'429s':>6}{'500s':>6}{'backoff (s)':>13}{'failed':>8}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        lines.append(
+            f"{result['runner']:<16}{result['setting']:>8}{result['requests_per_second']:>9.2f}"
+            f"{result['prompts_per_second']:>10.2f}{result['latency_p50']:>9.3f}"
+            f"{result['latency_p99']:>9.3f}{result['num_rate_limited']:>6}{result['num_errors']:>6}"
+            f"{result['backoff_seconds']:>13.1f}{result['num_failed_prompts']:>8}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    args = get_benchmark_args()
+    server = start_mock_server(get_mock_server_config(args))
+    host, port = server.server_address
+    os.environ["OPENAI_BASE_URL"] = f"http://{host}:{port}/v1"
+    os.environ["DEEPSEEK_BASE_URL"] = f"http://{host}:{port}"
+    os.environ.setdefault("OPENAI_KEY", "mock")
+    os.environ.setdefault("DEEPSEEK_API", "mock")
+
+    model = LanguageModelStore[args.model]
+    prompts = [
+        [{"role": "user", "content": f"Benchmark prompt {index}"}]
+        for index in range(args.num_prompts)
+    ]
+
+    results = []
+    for runner_name in args.runners.split(","):
+        runner_class = get_runner_class(runner_name)
+        for setting in args.settings.split(","):
+            print(f"Running {runner_class.__name__} with {setting}")
+            results.append(run_setting(runner_class, setting, args, model, server, prompts))
+
+    print(format_results(results))
+    if args.benchmark_output_file is not None:
+        with open(args.benchmark_output_file, "w") as f:
+            json.dump(results, f, indent=4)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,23 @@
 import os
-from time import sleep
 
 try:
-    from anthropic import Anthropic
+    from anthropic import Anthropic, AsyncAnthropic
 except ImportError as e:
     pass
 
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.utils.telemetry import record_usage
+
+
+def get_anthropic_used_tokens(response) -> int:
+    return response.usage.input_tokens + response.usage.output_tokens
 
 
 class Claude3Runner(BaseRunner):
-    client = Anthropic(api_key=os.getenv("ANTHROPIC_KEY"))
+    ## retries are handled by the shared rate limiter
+    client = Anthropic(api_key=os.getenv("ANTHROPIC_KEY"), max_retries=0)
+    rate_limit_provider = "anthropic"
+    single_choice = True
 
     def __init__(self, args, model):
         super().__init__(args, model)
@@ -21,32 +28,43 @@ class Claude3Runner(BaseRunner):
             "top_p": args.top_p,
         }
 
-    def _run_single(self, prompt: tuple[str, str]) -> list[str]:
-
-        def __run_single(counter):
-            try:
-                response = self.client.messages.create(
+    def _run_single_sample(self, prompt: tuple[str, str]) -> tuple[str, int | None]:
+        try:
+            response = self.rate_limiter.call(
+                lambda: self.client.messages.create(
                     system=prompt[0],
                     messages=prompt[1],
                     **self.client_kwargs,
-                )
-                content = "\n".join([x.text for x in response.content])
-                return content
-            except Exception as e:
-                print("Exception: ", repr(e), "Sleeping for 20 seconds...")
-                sleep(20 * (11 - counter))
-                counter = counter - 1
-                if counter == 0:
-                    print(f"Failed to run model for {prompt}!")
-                    print("Exception: ", repr(e))
-                    raise e
-                return __run_single(counter)
-
-        outputs = []
-        try:
-            for _ in range(self.args.n):
-                outputs.append(__run_single(10))
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                get_used_tokens=get_anthropic_used_tokens,
+            )
         except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
             raise e
+        content = "\n".join([x.text for x in response.content])
+        record_usage(response.usage.input_tokens, response.usage.output_tokens)
+        return content, response.usage.output_tokens
+
+    def _build_async_client(self):
+        return AsyncAnthropic(api_key=os.getenv("ANTHROPIC_KEY"), max_retries=0)
 
-        return outputs
+    async def _arun_single_sample(self, prompt: tuple[str, str]) -> tuple[str, int | None]:
+        try:
+            response = await self.rate_limiter.acall(
+                lambda: self.get_async_client().messages.create(
+                    system=prompt[0],
+                    messages=prompt[1],
+                    **self.client_kwargs,
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                get_used_tokens=get_anthropic_used_tokens,
+            )
+        except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
+            raise e
+        content = "\n".join([x.text for x in response.content])
+        record_usage(response.usage.input_tokens, response.usage.output_tokens)
+        return content, response.usage.output_tokens
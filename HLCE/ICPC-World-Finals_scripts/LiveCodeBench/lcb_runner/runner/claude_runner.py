@@ -1,5 +1,4 @@
 import os
-from time import sleep
 
 try:
     from anthropic import Anthropic
@@ -10,7 +9,10 @@ from lcb_runner.runner.base_runner import BaseRunner
 
 
 class ClaudeRunner(BaseRunner):
-    client = Anthropic(api_key=os.getenv("ANTHROPIC_KEY"))
+    ## retries are handled by the shared rate limiter
+    client = Anthropic(api_key=os.getenv("ANTHROPIC_KEY"), max_retries=0)
+    rate_limit_provider = "anthropic"
+    single_choice = True
 
     def __init__(self, args, model):
         super().__init__(args, model)
@@ -21,31 +23,18 @@ class ClaudeRunner(BaseRunner):
             "top_p": args.top_p,
         }
 
-    def _run_single(self, prompt: str) -> list[str]:
-
-        def __run_single(counter):
-            try:
-                response = self.client.completions.create(
+    def _run_single_sample(self, prompt: str) -> tuple[str, int | None]:
+        try:
+            response = self.rate_limiter.call(
+                lambda: self.client.completions.create(
                     prompt=prompt,
                     **self.client_kwargs,
-                )                                
-                content = response.completion
-                return content
-            except Exception as e:
-                print("Exception: ", repr(e), "Sleeping for 20 seconds...")
-                sleep(20 * (11 - counter))
-                counter = counter - 1
-                if counter == 0:
-                    print(f"Failed to run model for {prompt}!")
-                    print("Exception: ", repr(e))
-                    raise e
-                return __run_single(counter)
-
-        outputs = []
-        try:
-            for _ in range(self.args.n):
-                outputs.append(__run_single(10))
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+            )
         except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
             raise e
-
-        return outputs
+        content = response.completion
+        return content, None
@@ -1,5 +1,4 @@
 import os
-from time import sleep
 
 try:
     import cohere
@@ -7,10 +6,24 @@ except ImportError as e:
     pass
 
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.utils.telemetry import record_usage
+
+
+def get_cohere_output_tokens(response) -> int | None:
+    billed_units = getattr(getattr(response, "meta", None), "billed_units", None)
+    if billed_units is None or billed_units.output_tokens is None:
+        return None
+    record_usage(
+        int(billed_units.input_tokens) if billed_units.input_tokens is not None else None,
+        int(billed_units.output_tokens),
+    )
+    return int(billed_units.output_tokens)
 
 
 class CohereRunner(BaseRunner):
     client = cohere.Client(os.getenv("COHERE_API_KEY"))
+    rate_limit_provider = "cohere"
+    single_choice = True
 
     def __init__(self, args, model):
         super().__init__(args, model)
@@ -21,33 +34,43 @@ class CohereRunner(BaseRunner):
             "p": args.top_p,
         }
 
-    def _run_single(self, prompt: tuple[dict[str,str], str]) -> list[str]:
+    def _run_single_sample(self, prompt: tuple[dict[str,str], str]) -> tuple[str, int | None]:
         chat_history, message = prompt
 
-        def __run_single(counter):
-            try:
-                response = self.client.chat(
+        try:
+            response = self.rate_limiter.call(
+                lambda: self.client.chat(
                     message=message,
                     chat_history=chat_history,
                     **self.client_kwargs,
-                )
-                content = response.text
-                return content
-            except Exception as e:
-                print("Exception: ", repr(e), "Sleeping for 20 seconds...")
-                sleep(20 * (11 - counter))
-                counter = counter - 1
-                if counter == 0:
-                    print(f"Failed to run model for {prompt}!")
-                    print("Exception: ", repr(e))
-                    raise e
-                return __run_single(counter)
-
-        outputs = []
-        try:
-            for _ in range(self.args.n):
-                outputs.append(__run_single(10))
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+            )
         except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
             raise e
+        content = response.text
+        return content, get_cohere_output_tokens(response)
+
+    def _build_async_client(self):
+        return cohere.AsyncClient(os.getenv("COHERE_API_KEY"))
+
+    async def _arun_single_sample(self, prompt: tuple[dict[str,str], str]) -> tuple[str, int | None]:
+        chat_history, message = prompt
 
-        return outputs
+        try:
+            response = await self.rate_limiter.acall(
+                lambda: self.get_async_client().chat(
+                    message=message,
+                    chat_history=chat_history,
+                    **self.client_kwargs,
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+            )
+        except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
+            raise e
+        content = response.text
+        return content, get_cohere_output_tokens(response)
@@ -4,7 +4,15 @@ import json
 from lcb_runner.runner.parser import get_args
 from lcb_runner.utils.scenarios import Scenario
 from lcb_runner.utils.path_utils import get_output_path
+from lcb_runner.utils.artifact_store import (
+    build_manifest,
+    find_artifact,
+    save_artifact,
+    restore_artifact,
+)
 from lcb_runner.evaluation import extract_instance_results
+from lcb_runner.evaluation.per_test_bitmaps import add_test_bitmaps
+from lcb_runner.evaluation.compact_results import to_jsonable
 from lcb_runner.runner.scenario_router import (
     build_prompt_benchmark,
     sort_and_extract_save_results,
@@ -12,11 +20,7 @@ from lcb_runner.runner.scenario_router import (
 )
 
 
-def main():
-    args = get_args()
-
-    benchmark, _ = build_prompt_benchmark(args)
-
+def load_custom_outputs(args, benchmark):
     with open(args.custom_output_file, "r") as f:
         custom_outputs = json.load(f)
         assert isinstance(custom_outputs, list)
@@ -67,9 +71,33 @@ def main():
         for instance, custom_output in zip(benchmark, custom_outputs)
     ]
 
-    save_results, combined_results = sort_and_extract_save_results(
-        args.scenario, save_results
-    )
+    return sort_and_extract_save_results(args.scenario, save_results)
+
+
+def main():
+    args = get_args()
+
+    benchmark, _ = build_prompt_benchmark(args)
+
+    save_results, combined_results = load_custom_outputs(args, benchmark)
+
+    if args.custom_output_save_name is None:
+        output_path = args.custom_output_file[:-5] + f"_{args.scenario.value}_output.json"
+    else:
+        output_path = get_output_path(args.custom_output_save_name, args)
+    artifact_files = {
+        "output.json": output_path,
+        "eval.json": output_path.replace(".json", "_eval.json"),
+        "eval_all.json": output_path.replace(".json", "_eval_all.json"),
+    }
+
+    manifest = build_manifest(args, benchmark, combined_results)
+    if args.reuse_artifacts:
+        artifact_dir = find_artifact(args.artifact_dir, manifest)
+        if artifact_dir is not None:
+            print(f"Found an identical evaluation in {artifact_dir}, reusing it")
+            restore_artifact(artifact_dir, artifact_files)
+            return
 
     metrics = get_metrics(args.scenario, args, benchmark, combined_results)
     graded = extract_instance_results(metrics[1])
@@ -84,6 +112,8 @@ def main():
                 benchmark, combined_results, graded, metadatas
             )
         ]
+        if args.per_test_results:
+            add_test_bitmaps(save_eval_results, benchmark, metrics[1])
     else:
         save_eval_results = [
             instance.insert_output_evaluation(
@@ -93,22 +123,20 @@ def main():
                 benchmark, combined_results, graded
             )
         ]
-    
 
-    if args.custom_output_save_name is None:
-        output_path = args.custom_output_file[:-5] + f"_{args.scenario.value}_output.json"
-    else:
-        output_path = get_output_path(args.custom_output_save_name, args)
 
     with open(output_path, "w") as f:
         json.dump(save_results, f, indent=4)
 
 
-    with open(output_path.replace(".json", "_eval.json"), "w") as f:
-        json.dump(metrics, f, indent=4)
+    with open(artifact_files["eval.json"], "w") as f:
+        json.dump(metrics, f, indent=4, default=to_jsonable)
 
-    with open(output_path.replace(".json", "_eval_all.json"), "w") as f:
+    with open(artifact_files["eval_all.json"], "w") as f:
         json.dump(save_eval_results, f, indent=4)
 
+    artifact_dir = save_artifact(args.artifact_dir, manifest, artifact_files, run_args=args)
+    print(f"Saved the evaluation artifacts to {artifact_dir}")
+
 if __name__ == "__main__":
     main()
@@ -1,18 +1,29 @@
 import os
-from time import sleep
 
 try:
     import openai
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except ImportError as e:
     pass
 
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.runner.oai_runner import get_openai_used_tokens, get_openai_single_sample
 
 
 class DeepSeekRunner(BaseRunner):
+    ## retries are handled by the shared rate limiter
     client = OpenAI(
-        api_key=os.getenv("DEEPSEEK_API"), base_url="https://api.deepseek.com"
+        api_key=os.getenv("DEEPSEEK_API"),
+        base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+        max_retries=0,
+    )
+    rate_limit_provider = "deepseek"
+    single_choice = True
+    retry_on = (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
     )
 
     def __init__(self, args, model):
@@ -29,41 +40,47 @@ class DeepSeekRunner(BaseRunner):
             # "stop": args.stop, --> stop is only used for base models currently
         }
 
-    def _run_single(self, prompt: list[dict[str, str]]) -> list[str]:
+    def _run_single_sample(self, prompt: list[dict[str, str]]) -> tuple[str, int | None]:
         assert isinstance(prompt, list)
 
-        def __run_single(counter):
-            try:
-                response = self.client.chat.completions.create(
+        try:
+            response = self.rate_limiter.call(
+                lambda: self.client.chat.completions.create(
                     messages=prompt,
                     **self.client_kwargs,
-                )
-                content = response.choices[0].message.content
-                return content
-            except (
-                openai.APIError,
-                openai.RateLimitError,
-                openai.InternalServerError,
-                openai.OpenAIError,
-                openai.APIStatusError,
-                openai.APITimeoutError,
-                openai.InternalServerError,
-                openai.APIConnectionError,
-            ) as e:
-                print("Exception: ", repr(e))
-                print("Sleeping for 30 seconds...")
-                print("Consider reducing the number of parallel processes.")
-                sleep(30)
-                return DeepSeekRunner._run_single(prompt)
-            except Exception as e:
-                print(f"Failed to run the model for {prompt}!")
-                print("Exception: ", repr(e))
-                raise e
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                retry_on=DeepSeekRunner.retry_on,
+                get_used_tokens=get_openai_used_tokens,
+            )
+        except Exception as e:
+            print(f"Failed to run the model for {prompt}!")
+            print("Exception: ", repr(e))
+            raise e
+        return get_openai_single_sample(response)
+
+    def _build_async_client(self):
+        return AsyncOpenAI(
+            api_key=os.getenv("DEEPSEEK_API"),
+            base_url=os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com"),
+            max_retries=0,
+        )
+
+    async def _arun_single_sample(self, prompt: list[dict[str, str]]) -> tuple[str, int | None]:
+        assert isinstance(prompt, list)
 
-        outputs = []
         try:
-            for _ in range(self.args.n):
-                outputs.append(__run_single(10))
+            response = await self.rate_limiter.acall(
+                lambda: self.get_async_client().chat.completions.create(
+                    messages=prompt,
+                    **self.client_kwargs,
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                retry_on=DeepSeekRunner.retry_on,
+                get_used_tokens=get_openai_used_tokens,
+            )
         except Exception as e:
+            print(f"Failed to run the model for {prompt}!")
+            print("Exception: ", repr(e))
             raise e
-        return outputs
+        return get_openai_single_sample(response)
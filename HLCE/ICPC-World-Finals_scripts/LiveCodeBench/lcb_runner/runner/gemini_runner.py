@@ -1,5 +1,4 @@
 import os
-from time import sleep
 
 try:
     import google.generativeai as genai
@@ -8,10 +7,30 @@ except ImportError as e:
     pass
 
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.utils.telemetry import record_usage
+
+
+def get_gemini_used_tokens(response) -> int | None:
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is None:
+        return None
+    return usage_metadata.total_token_count
+
+
+def get_gemini_output_tokens(response) -> int | None:
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if usage_metadata is None:
+        return None
+    record_usage(
+        usage_metadata.prompt_token_count, usage_metadata.candidates_token_count
+    )
+    return usage_metadata.candidates_token_count
 
 
 class GeminiRunner(BaseRunner):
     client = genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    rate_limit_provider = "gemini"
+    single_choice = True
     safety_settings = [
         {
             "category": "HARM_CATEGORY_HARASSMENT",
@@ -41,40 +60,49 @@ class GeminiRunner(BaseRunner):
             top_p=args.top_p,
         )
 
-    def _run_single(self, prompt: str) -> list[str]:
+    def _build_async_client(self):
+        ## the same model object serves async requests through `generate_content_async`
+        return self.client
 
-        def __run_single(counter):
-            try:
-                return self.client.generate_content(
+    def _run_single_sample(self, prompt: str) -> tuple[str, int | None]:
+        try:
+            response = self.rate_limiter.call(
+                lambda: self.client.generate_content(
                     prompt,
                     generation_config=self.generation_config,
                     safety_settings=GeminiRunner.safety_settings,
-                )
-            except Exception as e:
-                print("Exception: ", repr(e), "Sleeping for 20 seconds...")
-                sleep(20 * (11 - counter))
-                counter = counter - 1
-                if counter == 0:
-                    print(f"Failed to run model for {prompt}!")
-                    print("Exception: ", repr(e))
-                    raise e
-                return __run_single(counter)
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                get_used_tokens=get_gemini_used_tokens,
+            )
+        except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
+            raise e
+        return self._extract_text(response), get_gemini_output_tokens(response)
 
-        outputs = []
+    async def _arun_single_sample(self, prompt: str) -> tuple[str, int | None]:
         try:
-            for _ in range(self.args.n):
-                outputs.append(__run_single(10))
+            response = await self.rate_limiter.acall(
+                lambda: self.get_async_client().generate_content_async(
+                    prompt,
+                    generation_config=self.generation_config,
+                    safety_settings=GeminiRunner.safety_settings,
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                get_used_tokens=get_gemini_used_tokens,
+            )
         except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
             raise e
+        return self._extract_text(response), get_gemini_output_tokens(response)
 
-        new_outputs = []
-        for output in outputs:
-            try:
-                new_outputs.append(output.text)
-            except Exception as e:
-                print("Cannot extract text exception: ", repr(e))
-                print(output.__dict__)
-                new_outputs.append("")
-        outputs = new_outputs
-
-        return outputs
+    @staticmethod
+    def _extract_text(output) -> str:
+        try:
+            return output.text
+        except Exception as e:
+            print("Cannot extract text exception: ", repr(e))
+            print(output.__dict__)
+            return ""
@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+from typing import List, Dict, Union, Optional, Tuple
+
+from lcb_runner.utils.path_utils import ensure_dir, get_json_cache_path
+
+PromptType = Union[str, List[Dict[str, str]]]
+
+
+def serialize_prompt(prompt: PromptType) -> str:
+    ## same serialization as the keys of the old json cache
+    if isinstance(prompt, str):
+        return prompt
+    return json.dumps(prompt)
+
+
+def get_sampling_params(args) -> dict:
+    return {
+        "n": args.n,
+        "temperature": args.temperature,
+        "top_p": args.top_p,
+        "max_tokens": args.max_tokens,
+        "stop": args.stop,
+    }
+
+
+class JsonGenerationCache:
+    """
+    Generation cache kept as a single json dict keyed by the serialized prompt,
+    the whole file is rewritten on `save`
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.cache: dict = json.load(f)
+        else:
+            self.cache = {}
+
+    def get(self, prompt: PromptType, default=None) -> Optional[List[str]]:
+        return self.cache.get(serialize_prompt(prompt), default)
+
+    def __contains__(self, prompt: PromptType) -> bool:
+        return serialize_prompt(prompt) in self.cache
+
+    def __getitem__(self, prompt: PromptType) -> List[str]:
+        return self.cache[serialize_prompt(prompt)]
+
+    def __setitem__(self, prompt: PromptType, outputs: List[str]):
+        self.cache[serialize_prompt(prompt)] = outputs
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def get_samples(self, prompt: PromptType) -> Dict[int, Tuple[str, Optional[int]]]:
+        ## individual samples are only kept by the sqlite backend
+        return {}
+
+    def put_sample(
+        self,
+        prompt: PromptType,
+        sample_index: int,
+        output: str,
+        num_tokens: Optional[int] = None,
+    ):
+        pass
+
+    def save(self):
+        ## write to a temporary file first so an interrupted write keeps the old cache
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.cache, f, indent=4)
+        os.replace(self.path + ".tmp", self.path)
+
+
+class SqliteGenerationCache:
+    """
+    Generation cache stored in sqlite (WAL mode). Entries are keyed by the
+    sha256 of the prompt together with the model and sampling parameters and
+    inserted one at a time, so nothing has to be rewritten when the cache grows.
+    """
+
+    def __init__(self, path: str, model_repr: str, sampling_params: dict):
+        self.path = path
+        self.model_repr = model_repr
+        self.sampling_params = sampling_params
+        self._conn: Optional[sqlite3.Connection] = None
+        self._create_tables()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def _create_tables(self):
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                "key TEXT PRIMARY KEY, model TEXT, sampling_params TEXT, "
+                "prompt TEXT, outputs TEXT, created_at REAL)"
+            )
+            ## every sample is written as soon as it is generated, keyed without `n`
+            ## so that an interrupted run (or a run with a larger `n`) only requests the missing ones
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS samples ("
+                "key TEXT, sample_index INTEGER, output TEXT, num_tokens INTEGER, "
+                "created_at REAL, PRIMARY KEY (key, sample_index))"
+            )
+            columns = [
+                row[1] for row in self.conn.execute("PRAGMA table_info(samples)")
+            ]
+            if "num_tokens" not in columns:
+                self.conn.execute("ALTER TABLE samples ADD COLUMN num_tokens INTEGER")
+            ## json caches imported into this file, with their mtime at the time of the import
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS migrations ("
+                "path TEXT PRIMARY KEY, mtime REAL, migrated_at REAL)"
+            )
+
+    def key(self, serialized_prompt: str) -> str:
+        key_data = json.dumps(
+            {
+                "model": self.model_repr,
+                "sampling_params": self.sampling_params,
+                "prompt": serialized_prompt,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def sample_key(self, serialized_prompt: str) -> str:
+        sampling_params = {
+            name: value for name, value in self.sampling_params.items() if name != "n"
+        }
+        key_data = json.dumps(
+            {
+                "model": self.model_repr,
+                "sampling_params": sampling_params,
+                "prompt": serialized_prompt,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+
+    def get(self, prompt: PromptType, default=None) -> Optional[List[str]]:
+        row = self.conn.execute(
+            "SELECT outputs FROM generations WHERE key = ?",
+            (self.key(serialize_prompt(prompt)),),
+        ).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def __contains__(self, prompt: PromptType) -> bool:
+        return self.get(prompt) is not None
+
+    def __getitem__(self, prompt: PromptType) -> List[str]:
+        outputs = self.get(prompt)
+        if outputs is None:
+            raise KeyError(serialize_prompt(prompt)[:100])
+        return outputs
+
+    def put_serialized(self, serialized_prompt: str, outputs: List[str]):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO generations VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.key(serialized_prompt),
+                    self.model_repr,
+                    json.dumps(self.sampling_params, sort_keys=True),
+                    serialized_prompt,
+                    json.dumps(outputs),
+                    time.time(),
+                ),
+            )
+
+    def __setitem__(self, prompt: PromptType, outputs: List[str]):
+        self.put_serialized(serialize_prompt(prompt), outputs)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def get_samples(self, prompt: PromptType) -> Dict[int, Tuple[str, Optional[int]]]:
+        rows = self.conn.execute(
+            "SELECT sample_index, output, num_tokens FROM samples WHERE key = ?",
+            (self.sample_key(serialize_prompt(prompt)),),
+        ).fetchall()
+        return {
+            sample_index: (output, num_tokens)
+            for sample_index, output, num_tokens in rows
+        }
+
+    def put_sample(
+        self,
+        prompt: PromptType,
+        sample_index: int,
+        output: str,
+        num_tokens: Optional[int] = None,
+    ):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO samples "
+                "(key, sample_index, output, num_tokens, created_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    self.sample_key(serialize_prompt(prompt)),
+                    sample_index,
+                    output,
+                    num_tokens,
+                    time.time(),
+                ),
+            )
+
+    def is_migrated(self, json_path: str) -> bool:
+        row = self.conn.execute(
+            "SELECT mtime FROM migrations WHERE path = ?", (os.path.abspath(json_path),)
+        ).fetchone()
+        return row is not None and row[0] == os.path.getmtime(json_path)
+
+    def mark_migrated(self, json_path: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO migrations VALUES (?, ?, ?)",
+                (os.path.abspath(json_path), os.path.getmtime(json_path), time.time()),
+            )
+
+    def save(self):
+        ## every entry is committed when it is inserted
+        pass
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __getstate__(self):
+        ## connections cannot be pickled, worker processes reopen their own
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+
+class RoundGenerationCache:
+    """
+    View of a generation cache for one round of adaptive sampling, which requests the
+    same prompts in every round. Rounds after the first are cached under the prompt
+    tagged with the round, so every round keeps its own samples.
+    """
+
+    def __init__(self, cache, round_index: int):
+        self.cache = cache
+        self.round_index = round_index
+
+    def round_prompt(self, prompt: PromptType) -> PromptType:
+        ## the first round shares its entries with plain runs of the same n
+        if self.round_index == 0:
+            return prompt
+        return f"{serialize_prompt(prompt)}\n## adaptive sampling round {self.round_index}"
+
+    def get(self, prompt: PromptType, default=None) -> Optional[List[str]]:
+        return self.cache.get(self.round_prompt(prompt), default)
+
+    def __contains__(self, prompt: PromptType) -> bool:
+        return self.round_prompt(prompt) in self.cache
+
+    def __getitem__(self, prompt: PromptType) -> List[str]:
+        return self.cache[self.round_prompt(prompt)]
+
+    def __setitem__(self, prompt: PromptType, outputs: List[str]):
+        self.cache[self.round_prompt(prompt)] = outputs
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def get_samples(self, prompt: PromptType) -> Dict[int, Tuple[str, Optional[int]]]:
+        return self.cache.get_samples(self.round_prompt(prompt))
+
+    def put_sample(
+        self,
+        prompt: PromptType,
+        sample_index: int,
+        output: str,
+        num_tokens: Optional[int] = None,
+    ):
+        self.cache.put_sample(self.round_prompt(prompt), sample_index, output, num_tokens)
+
+    def save(self):
+        self.cache.save()
+
+
+def build_generation_cache(path: str, model_repr: str, args):
+    if args.cache_backend == "json":
+        return JsonGenerationCache(path)
+    cache = SqliteGenerationCache(path, model_repr, get_sampling_params(args))
+    ## json caches (the previous default backend) of the same run are imported once
+    json_path = get_json_cache_path(model_repr, args)
+    if os.path.exists(json_path) and not cache.is_migrated(json_path):
+        count = migrate_json_cache(json_path, cache)
+        print(f"Migrated {count} entries of the json generation cache {json_path} into {path}")
+    return cache
+
+
+def migrate_json_cache(json_path: str, cache: SqliteGenerationCache) -> int:
+    with open(json_path) as f:
+        json_cache: dict = json.load(f)
+    ## keys of the json cache are already the serialized prompts
+    for serialized_prompt, outputs in json_cache.items():
+        cache.put_serialized(serialized_prompt, outputs)
+    cache.mark_migrated(json_path)
+    return len(json_cache)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrate a json generation cache into the sqlite generation cache"
+    )
+    parser.add_argument("--json_cache", type=str, required=True)
+    parser.add_argument("--sqlite_cache", type=str, required=True)
+    parser.add_argument(
+        "--model_repr", type=str, required=True, help="`model_repr` of the cached model"
+    )
+    ## the json cache only encodes n and temperature in its file name, the other
+    ## sampling parameters must match the ones of the original run
+    parser.add_argument("--n", type=int, default=10)
+    parser.add_argument("--temperature", type=float, default=0.2)
+    parser.add_argument("--top_p", type=float, default=0.95)
+    parser.add_argument("--max_tokens", type=int, default=2000)
+    parser.add_argument("--stop", type=str, default="###")
+    args = parser.parse_args()
+    args.stop = args.stop.split(",")
+
+    ensure_dir(args.sqlite_cache)
+    cache = SqliteGenerationCache(
+        args.sqlite_cache, args.model_repr, get_sampling_params(args)
+    )
+    count = migrate_json_cache(args.json_cache, cache)
+    print(f"Migrated {count} entries, {len(cache)} entries in {args.sqlite_cache}")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
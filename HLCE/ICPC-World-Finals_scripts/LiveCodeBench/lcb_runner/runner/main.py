@@ -2,11 +2,26 @@ import os
 import json
 
 from lcb_runner.runner.parser import get_args
+from lcb_runner.prompts import format_prompts, set_tokenizer_path
 from lcb_runner.utils.scenarios import Scenario
 from lcb_runner.lm_styles import LanguageModelStore
 from lcb_runner.runner.runner_utils import build_runner
-from lcb_runner.utils.path_utils import get_output_path
+from lcb_runner.utils.path_utils import get_output_path, get_cache_path
+from lcb_runner.utils.artifact_store import (
+    build_manifest,
+    find_artifact,
+    save_artifact,
+    restore_artifact,
+)
 from lcb_runner.evaluation import extract_instance_results
+from lcb_runner.evaluation.eval_state import EvalState, merge_eval_states
+from lcb_runner.evaluation.per_test_bitmaps import add_test_bitmaps
+from lcb_runner.evaluation.compact_results import to_jsonable
+from lcb_runner.runner.generation_cache import build_generation_cache
+from lcb_runner.runner.batch_io import write_batch_requests, load_batch_outputs
+from lcb_runner.runner.pipeline import run_pipeline
+from lcb_runner.runner.adaptive_sampling import run_adaptive_sampling
+from lcb_runner.utils.telemetry import format_telemetry_summary
 from lcb_runner.runner.scenario_router import (
     build_prompt_benchmark,
     combine_results,
@@ -19,6 +34,7 @@ def main():
     args = get_args()
 
     model = LanguageModelStore[args.model]
+    set_tokenizer_path(args.tokenizer_path)
     benchmark, format_prompt = build_prompt_benchmark(args)
     if args.debug:
         print(f"Running with {len(benchmark)} instances in debug mode")
@@ -27,6 +43,7 @@ def main():
     output_path = get_output_path(model.model_repr, args)
     eval_file = output_path.replace(".json", "_eval.json")
     eval_all_file = output_path.replace(".json", "_eval_all.json")
+    eval_state_file = output_path.replace(".json", "_eval_state.json")
 
     if args.continue_existing or args.continue_existing_with_eval:
         if os.path.exists(output_path):
@@ -61,12 +78,83 @@ def main():
         old_save_results = []
         remaining_benchmark = benchmark
 
-    if len(remaining_benchmark) > 0:
+    ## the pipeline and adaptive sampling evaluate the whole benchmark while it is generated
+    evaluate_while_generating = (
+        args.evaluate
+        and args.scenario == Scenario.codegeneration
+        and not (args.continue_existing or args.continue_existing_with_eval)
+        and args.batch_requests_file is None
+        and args.batch_results_file is None
+    )
+    use_adaptive_sampling = args.adaptive_sampling and evaluate_while_generating
+    use_pipeline = args.pipeline and evaluate_while_generating and not use_adaptive_sampling
+    if args.adaptive_sampling and not use_adaptive_sampling:
+        print("--adaptive_sampling requires --evaluate on codegeneration without continue or batch files, ignoring it")
+    if args.pipeline and not use_pipeline:
+        print("--pipeline requires --evaluate on codegeneration without continue, batch files or adaptive sampling, ignoring it")
+    generation_metrics = None
+    runner = None
+
+    if args.batch_requests_file is not None or args.batch_results_file is not None:
+        ## offline batch mode, no runner (and no network access) is needed
+        assert args.scenario != Scenario.selfrepair, "Batch files are not supported for selfrepair"
+        prompts = format_prompts(remaining_benchmark, model.model_style, format_prompt)
+        cache = (
+            build_generation_cache(
+                get_cache_path(model.model_repr, args), model.model_repr, args
+            )
+            if args.use_cache
+            else None
+        )
+        if args.batch_requests_file is not None:
+            num_requests = write_batch_requests(
+                args.batch_requests_file, prompts, model, args, cache
+            )
+            print(f"Wrote {num_requests} requests to {args.batch_requests_file}")
+            return
+        results = load_batch_outputs(args.batch_results_file, prompts, model, args, cache)
+    elif len(remaining_benchmark) > 0 and use_pipeline:
+        runner = build_runner(args, model)
+        results, generation_metrics = run_pipeline(
+            args, runner, model, remaining_benchmark, format_prompt
+        )
+    elif len(remaining_benchmark) > 0 and use_adaptive_sampling:
+        ## --n is the maximum number of samples, the runner generates one round of samples per call
+        max_samples = args.n
+        assert (
+            max_samples >= args.adaptive_k
+        ), f"--n ({max_samples}) is the maximum number of samples in --adaptive_sampling, it must be at least --adaptive_k ({args.adaptive_k})"
+        args.n = max(args.adaptive_round_size, args.adaptive_k)
+        if args.n > max_samples:
+            print(f"Round size {args.n} is larger than --n, sampling a single round of {max_samples}")
+            args.n = max_samples
+        if args.temperature == 0:
+            print("--adaptive_sampling with temperature 0 samples the same outputs in every round")
+        runner = build_runner(args, model)
+        results, generation_metrics = run_adaptive_sampling(
+            args, runner, model, remaining_benchmark, format_prompt, max_samples
+        )
+        args.n = max_samples
+    elif len(remaining_benchmark) > 0:
         runner = build_runner(args, model)
         results: list[list[str]] = runner.run_main(remaining_benchmark, format_prompt)
     else:
         results = []
 
+    if runner is not None:
+        telemetry_file = args.telemetry_file or output_path.replace(
+            ".json", "_telemetry.jsonl"
+        )
+        runner.telemetry.write(telemetry_file)
+        print(
+            format_telemetry_summary(
+                runner.telemetry.summary(
+                    args.price_per_million_input, args.price_per_million_output
+                )
+            )
+        )
+        print(f"Wrote the request traces to {telemetry_file}")
+
     combined_results = combine_results(
         args.scenario, results, model, args.cot_code_execution
     )
@@ -89,6 +177,12 @@ def main():
         json.dump(save_results, f, indent=4)
 
     if args.evaluate:
+        artifact_files = {
+            "output.json": output_path,
+            "eval.json": eval_file,
+            "eval_all.json": eval_all_file,
+        }
+        manifest = None
         if args.continue_existing_with_eval and os.path.exists(eval_all_file):
             with open(eval_all_file) as fp:
                 old_eval_all_results = json.load(fp)
@@ -99,17 +193,55 @@ def main():
             else:
                 old_eval_results = None
 
-            old_eval_results_question_ids = [
-                instance["question_id"] for instance in old_eval_all_results
-            ]
+            ## problems missing from the old eval_all, plus the requested or changed ones
+            old_code_lists = {
+                instance["question_id"]: instance.get("code_list")
+                for instance in old_eval_all_results
+            }
+            reevaluate_question_ids = set(args.reevaluate_question_ids or [])
             remaining_indices = [
                 idx
                 for idx in range(len(benchmark))
-                if benchmark[idx].question_id not in old_eval_results_question_ids
+                if benchmark[idx].question_id not in old_code_lists
+                or benchmark[idx].question_id in reevaluate_question_ids
+                or (
+                    args.reevaluate_changed
+                    and old_code_lists[benchmark[idx].question_id]
+                    != combined_results[idx][1]
+                )
             ]
             benchmark = [benchmark[idx] for idx in remaining_indices]
             combined_results = [combined_results[idx] for idx in remaining_indices]
 
+            ## re-evaluated problems leave the old results, their new ones are appended
+            reevaluated_question_ids = {
+                instance.question_id for instance in benchmark
+            } & set(old_code_lists)
+            kept_positions = [
+                position
+                for position, instance in enumerate(old_eval_all_results)
+                if instance["question_id"] not in reevaluated_question_ids
+            ]
+            old_eval_all_results = [old_eval_all_results[position] for position in kept_positions]
+            if old_eval_results is not None:
+                old_raw_results = old_eval_results[1]
+                old_eval_results[1] = {
+                    str(new_position): old_raw_results[str(position)]
+                    for new_position, position in enumerate(kept_positions)
+                    if str(position) in old_raw_results
+                }
+                if len(old_eval_results) > 2:
+                    old_eval_results[2] = [
+                        old_eval_results[2][position]
+                        for position in kept_positions
+                        if position < len(old_eval_results[2])
+                    ]
+            if reevaluated_question_ids:
+                print(f"Re-evaluating {len(reevaluated_question_ids)} already evaluated problems")
+            old_eval_results_question_ids = [
+                instance["question_id"] for instance in old_eval_all_results
+            ]
+
             old_eval_size = len(old_eval_results_question_ids)
             new_eval_size = len(benchmark)
 
@@ -121,38 +253,62 @@ def main():
             metrics = get_metrics(args.scenario, args, benchmark, combined_results)
             graded = extract_instance_results(metrics[1])
 
-            if old_eval_results:
-                for key in metrics[0]:
-                    if key in old_eval_results[0]:
-                        if key != "detail":
-                            metrics[0][key] = (
-                                old_eval_size * old_eval_results[0][key]
-                                + new_eval_size * metrics[0][key]
-                            )
-                            metrics[0][key] /= old_eval_size + new_eval_size
-
-                for key in metrics[0]["detail"]:
-                    if key in old_eval_results[0]["detail"]:
-                        metrics[0]["detail"][key] = {
-                            **metrics[0]["detail"][key],
-                            **old_eval_results[0]["detail"][key],
-                        }
-                metrics[1] = {**metrics[1], **old_eval_results[1]}
-            else:
-                print("Old eval file not present, cannot update eval file")
-                metrics = {}
+            ## the headline metrics are recomputed from the merged per problem verdicts,
+            ## the eval_all file stands in for the state of runs that did not save it
+            eval_state = merge_eval_states(
+                EvalState.from_eval_all(old_eval_all_results),
+                (
+                    EvalState.load(eval_state_file)
+                    if os.path.exists(eval_state_file)
+                    else EvalState()
+                ),
+                EvalState.from_graded(
+                    [instance.question_id for instance in benchmark], graded
+                ),
+            )
+            k_list = [
+                int(key[len("pass@") :]) for key in metrics[0] if key.startswith("pass@")
+            ]
+            merged_metrics = eval_state.compute_metrics(
+                k_list,
+                old_eval_results_question_ids
+                + [instance.question_id for instance in benchmark],
+            )
+            if args.scenario == Scenario.codeexecution:
+                ## code execution reports pass@1 in percent without details
+                merged_metrics = {"pass@1": merged_metrics["pass@1"] * 100}
+            metrics[0] = merged_metrics
 
+            ## the raw results are keyed by position in the eval_all file (old then new)
+            if old_eval_results is None:
+                print("Old eval file not present, only keeping the new raw results")
+            old_raw_results = old_eval_results[1] if old_eval_results else {}
+            metrics[1] = {
+                **{int(key): value for key, value in old_raw_results.items()},
+                **{old_eval_size + int(key): value for key, value in metrics[1].items()},
+            }
         else:
-            metrics = get_metrics(args.scenario, args, benchmark, combined_results)
+            manifest = build_manifest(args, benchmark, combined_results)
+            if args.reuse_artifacts and generation_metrics is None:
+                artifact_dir = find_artifact(args.artifact_dir, manifest)
+                if artifact_dir is not None:
+                    print(f"Found an identical evaluation in {artifact_dir}, reusing it")
+                    restore_artifact(
+                        artifact_dir,
+                        {"eval.json": eval_file, "eval_all.json": eval_all_file},
+                    )
+                    return
+
+            if generation_metrics is not None:
+                metrics = generation_metrics
+            else:
+                metrics = get_metrics(args.scenario, args, benchmark, combined_results)
             graded = extract_instance_results(metrics[1])
             old_eval_all_results = []
             old_eval_results = []
 
         if args.scenario == Scenario.codegeneration:
-            if metrics:
-                metadatas = metrics[2]
-            else:
-                metadatas = [[] for _ in benchmark]
+            metadatas = metrics[2]
             save_eval_results = [
                 instance.insert_output_evaluation(
                     outputs_list, extracted_list, graded_list, metadata=meta
@@ -161,9 +317,16 @@ def main():
                     benchmark, combined_results, graded, metadatas
                 )
             ]
-            if metrics and old_eval_results:
-                old_eval_results
-                metrics[2] = old_eval_results[2] + metrics[2]
+            if args.per_test_results:
+                add_test_bitmaps(save_eval_results, benchmark, metrics[1])
+            if old_eval_all_results:
+                metrics[2] = (
+                    old_eval_results[2]
+                    if old_eval_results
+                    else [
+                        instance.get("metadata", []) for instance in old_eval_all_results
+                    ]
+                ) + metrics[2]
         elif args.scenario == Scenario.selfrepair:
             metadatas = metrics[2]
             with open(
@@ -201,13 +364,23 @@ def main():
             ]
 
         save_eval_results = old_eval_all_results + save_eval_results
+        if old_eval_all_results:
+            eval_state.save(eval_state_file)
+        else:
+            EvalState.from_eval_all(save_eval_results).save(eval_state_file)
 
         with open(eval_file, "w") as f:
-            json.dump(metrics, f, indent=4)
+            json.dump(metrics, f, indent=4, default=to_jsonable)
 
         with open(eval_all_file, "w") as f:
             json.dump(save_eval_results, f, indent=4)
 
+        if manifest is not None:
+            artifact_dir = save_artifact(
+                args.artifact_dir, manifest, artifact_files, run_args=args
+            )
+            print(f"Saved the evaluation artifacts to {artifact_dir}")
+
 
 if __name__ == "__main__":
     main()
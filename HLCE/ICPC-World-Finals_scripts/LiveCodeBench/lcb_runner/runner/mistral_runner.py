@@ -1,5 +1,4 @@
 import os
-from time import sleep
 
 try:
     from mistralai.client import MistralClient
@@ -7,12 +6,28 @@ except ImportError as e:
     pass
 
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.utils.telemetry import record_usage
+
+
+def get_mistral_used_tokens(response) -> int | None:
+    if response.usage is None:
+        return None
+    return response.usage.total_tokens
+
+
+def get_mistral_output_tokens(response) -> int | None:
+    if response.usage is None:
+        return None
+    record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+    return response.usage.completion_tokens
 
 
 class MistralRunner(BaseRunner):
     client = MistralClient(
         api_key=os.environ["MISTRAL_API_KEY"],
     )
+    rate_limit_provider = "mistral"
+    single_choice = True
 
     def __init__(self, args, model):
         super().__init__(args, model)
@@ -23,31 +38,19 @@ class MistralRunner(BaseRunner):
             "top_p": args.top_p,
         }
 
-    def _run_single(self, prompt: list[dict[str, str]]) -> list[str]:
-
-        def __run_single(counter):
-            try:
-                response = self.client.chat(
+    def _run_single_sample(self, prompt: list[dict[str, str]]) -> tuple[str, int | None]:
+        try:
+            response = self.rate_limiter.call(
+                lambda: self.client.chat(
                     messages=prompt,
                     **self.client_kwargs,
-                )
-                content = response.choices[0].message.content
-                return content
-            except Exception as e:
-                print("Exception: ", repr(e), "Sleeping for 20 seconds...")
-                sleep(20 * (11 - counter))
-                counter = counter - 1
-                if counter == 0:
-                    print(f"Failed to run model for {prompt}!")
-                    print("Exception: ", repr(e))
-                    raise e
-                return __run_single(counter)
-
-        outputs = []
-        try:
-            for _ in range(self.args.n):
-                outputs.append(__run_single(10))
+                ),
+                num_tokens=self.estimate_request_tokens(prompt),
+                get_used_tokens=get_mistral_used_tokens,
+            )
         except Exception as e:
+            print(f"Failed to run model for {prompt}!")
+            print("Exception: ", repr(e))
             raise e
-
-        return outputs
+        content = response.choices[0].message.content
+        return content, get_mistral_output_tokens(response)
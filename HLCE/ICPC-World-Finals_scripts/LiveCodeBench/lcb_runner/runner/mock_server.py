@@ -0,0 +1,211 @@
+""" Local stand-in for an OpenAI-compatible chat completions endpoint, used to measure the runners without API costs. """
+import json
+import time
+import random
+import argparse
+import threading
+from dataclasses import dataclass, field
+from typing import List, Tuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class MockServerConfig:
+    latency_ms: float = 500.0  ## median latency of a request
+    latency_sigma: float = 0.0  ## sigma of the lognormal latency distribution, 0 for a constant latency
+    error_rate: float = 0.0  ## fraction of requests answered with a 500
+    rate_limit_rate: float = 0.0  ## fraction of requests answered with a 429
+    retry_after: float = 1.0  ## Retry-After (seconds) sent with the 429s, no header if negative
+    output_mode: str = "canned"  ## `canned` returns `canned_output`, `echo` the last message
+    canned_output: str = "```python\nprint(input())\n```"
+    seed: int = 0
+
+
+@dataclass
+class MockServerStats:
+    num_requests: int = 0
+    num_errors: int = 0
+    num_rate_limited: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "num_requests": self.num_requests,
+            "num_errors": self.num_errors,
+            "num_rate_limited": self.num_rate_limited,
+        }
+
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: MockServerConfig):
+        super().__init__(address, MockHandler)
+        self.config = config
+        self.stats = MockServerStats()
+        self.lock = threading.Lock()
+        self.random = random.Random(config.seed)
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = MockServerStats()
+
+    def sample_outcome(self) -> Tuple[float, str]:
+        with self.lock:
+            self.stats.num_requests += 1
+            latency = self.config.latency_ms / 1000
+            if self.config.latency_sigma > 0:
+                latency *= self.random.lognormvariate(0, self.config.latency_sigma)
+            draw = self.random.random()
+            if draw < self.config.rate_limit_rate:
+                self.stats.num_rate_limited += 1
+                return 0.0, "rate_limited"
+            if draw < self.config.rate_limit_rate + self.config.error_rate:
+                self.stats.num_errors += 1
+                return latency, "error"
+            return latency, "ok"
+
+    def record_latency(self, latency: float):
+        with self.lock:
+            self.stats.latencies.append(latency)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: MockServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        start = time.time()
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        ## both `/v1/chat/completions` (OpenAI) and `/chat/completions` (DeepSeek) base urls
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        latency, outcome = self.server.sample_outcome()
+        time.sleep(latency)
+        if outcome == "rate_limited":
+            headers = {}
+            if self.server.config.retry_after >= 0:
+                headers["Retry-After"] = str(self.server.config.retry_after)
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                headers,
+            )
+            return
+        if outcome == "error":
+            self.send_json(
+                500, {"error": {"message": "Injected server error", "type": "server_error"}}
+            )
+            return
+
+        messages = request.get("messages", [])
+        if self.server.config.output_mode == "echo" and messages:
+            content = messages[-1]["content"]
+        else:
+            content = self.server.config.canned_output
+        n = request.get("n") or 1
+        prompt_tokens = sum(count_tokens(message["content"]) for message in messages)
+        completion_tokens = n * count_tokens(content)
+        self.send_json(
+            200,
+            {
+                "id": f"chatcmpl-mock-{self.server.stats.num_requests}",
+                "object": "chat.completion",
+                "created": int(start),
+                "model": request.get("model", "mock"),
+                "choices": [
+                    {
+                        "index": index,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                    for index in range(n)
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        )
+        self.server.record_latency(time.time() - start)
+
+
+def start_mock_server(
+    config: MockServerConfig, host: str = "127.0.0.1", port: int = 0
+) -> MockServer:
+    """Starts the server in a daemon thread, port 0 picks a free port"""
+    server = MockServer((host, port), config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_mock_server_args(parser: argparse.ArgumentParser):
+    defaults = MockServerConfig()
+    parser.add_argument("--latency_ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency_sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--error_rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate_limit_rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--retry_after", type=float, default=defaults.retry_after)
+    parser.add_argument(
+        "--output_mode", type=str, default=defaults.output_mode, choices=["canned", "echo"]
+    )
+    parser.add_argument("--canned_output", type=str, default=defaults.canned_output)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def get_mock_server_config(args) -> MockServerConfig:
+    return MockServerConfig(
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        output_mode=args.output_mode,
+        canned_output=args.canned_output,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="OpenAI-compatible mock chat completions server"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_mock_server_args(parser)
+    args = parser.parse_args()
+
+    server = MockServer((args.host, args.port), get_mock_server_config(args))
+    print(
+        f"Serving on http://{args.host}:{args.port}, use OPENAI_BASE_URL=http://{args.host}:{args.port}/v1 "
+        f"or DEEPSEEK_BASE_URL=http://{args.host}:{args.port}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats.to_dict()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,53 @@
 import os
-from time import sleep
 
 try:
     import openai
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except ImportError as e:
     pass
 
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.utils.telemetry import record_usage
+
+
+def get_openai_used_tokens(response) -> int | None:
+    if response.usage is None:
+        return None
+    return response.usage.total_tokens
+
+
+def get_openai_samples(response) -> list[tuple[str, int | None]]:
+    ## usage is only reported for the whole request, split it evenly between the choices
+    num_tokens = None
+    if response.usage is not None:
+        record_usage(response.usage.prompt_tokens, response.usage.completion_tokens)
+    if not response.choices:
+        ## e.g. a filtered response, no samples makes the request fail and be retried later
+        return []
+    if response.usage is not None:
+        num_tokens = response.usage.completion_tokens // len(response.choices)
+    return [(c.message.content, num_tokens) for c in response.choices]
+
+
+def get_openai_single_sample(response) -> tuple[str, int | None]:
+    samples = get_openai_samples(response)
+    if not samples:
+        raise ValueError("The response has no choices")
+    return samples[0]
 
 
 class OpenAIRunner(BaseRunner):
+    ## retries are handled by the shared rate limiter
     client = OpenAI(
         api_key=os.getenv("OPENAI_KEY"),
+        max_retries=0,
+    )
+    rate_limit_provider = "openai"
+    retry_on = (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
     )
 
     def __init__(self, args, model):
@@ -29,31 +64,46 @@ class OpenAIRunner(BaseRunner):
             # "stop": args.stop, --> stop is only used for base models currently
         }
 
-    def _run_single(self, prompt: list[dict[str, str]]) -> list[str]:
+    def _run_samples(self, prompt: list[dict[str, str]], n: int) -> list[tuple[str, int | None]]:
         assert isinstance(prompt, list)
 
         try:
-            response = OpenAIRunner.client.chat.completions.create(
-                messages=prompt,
-                **self.client_kwargs,
+            response = self.rate_limiter.call(
+                lambda: OpenAIRunner.client.chat.completions.create(
+                    messages=prompt,
+                    **{**self.client_kwargs, "n": n},
+                ),
+                num_tokens=self.estimate_request_tokens(prompt, n),
+                retry_on=OpenAIRunner.retry_on,
+                get_used_tokens=get_openai_used_tokens,
             )
-        except (
-            openai.APIError,
-            openai.RateLimitError,
-            openai.InternalServerError,
-            openai.OpenAIError,
-            openai.APIStatusError,
-            openai.APITimeoutError,
-            openai.InternalServerError,
-            openai.APIConnectionError,
-        ) as e:
+        except Exception as e:
+            print(f"Failed to run the model for {prompt}!")
             print("Exception: ", repr(e))
-            print("Sleeping for 30 seconds...")
-            print("Consider reducing the number of parallel processes.")
-            sleep(30)
-            return OpenAIRunner._run_single(prompt)
+            raise e
+        return get_openai_samples(response)
+
+    def _build_async_client(self):
+        return AsyncOpenAI(
+            api_key=os.getenv("OPENAI_KEY"),
+            max_retries=0,
+        )
+
+    async def _arun_samples(self, prompt: list[dict[str, str]], n: int) -> list[tuple[str, int | None]]:
+        assert isinstance(prompt, list)
+
+        try:
+            response = await self.rate_limiter.acall(
+                lambda: self.get_async_client().chat.completions.create(
+                    messages=prompt,
+                    **{**self.client_kwargs, "n": n},
+                ),
+                num_tokens=self.estimate_request_tokens(prompt, n),
+                retry_on=OpenAIRunner.retry_on,
+                get_used_tokens=get_openai_used_tokens,
+            )
         except Exception as e:
             print(f"Failed to run the model for {prompt}!")
             print("Exception: ", repr(e))
             raise e
-        return [c.message.content for c in response.choices]
+        return get_openai_samples(response)
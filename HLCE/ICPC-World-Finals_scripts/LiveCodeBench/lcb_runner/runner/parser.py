@@ -5,7 +5,7 @@ import argparse
 from lcb_runner.utils.scenarios import Scenario
 
 
-def get_args():
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--model",
@@ -19,6 +19,12 @@ def get_args():
         default=None,
         help="If you have a local model, specify it here in conjunction with --model",
     )
+    parser.add_argument(
+        "--tokenizer_path",
+        type=str,
+        default=None,
+        help="Tokenizer (huggingface repo or local path) whose chat template formats the prompts of chat template styles such as LLaMa3, defaults to LCB_TOKENIZER_PATH / LCB_TOKENIZER_<NAME> or the upstream model",
+    )
     parser.add_argument(
         "--trust_remote_code",
         action="store_true",
@@ -41,6 +47,12 @@ def get_args():
         default="release_v1",
         help="whether to use full set of tests (slower and more memory intensive evaluation)",
     )
+    parser.add_argument(
+        "--test_store_dir",
+        type=str,
+        default=None,
+        help="Directory to store the code generation test cases compressed on disk (tests are streamed from there during evaluation)",
+    )
     parser.add_argument(
         "--cot_code_execution",
         action="store_true",
@@ -68,6 +80,59 @@ def get_args():
         type=int,
         help="Number of processes to use for generation (vllm runs do not use this)",
     )
+    parser.add_argument(
+        "--async_concurrency",
+        default=64,
+        type=int,
+        help="Maximum number of concurrent requests for runners with an async client (OpenAI, DeepSeek, Claude3, Gemini, Cohere), the requests still wait for the shared rate limiter (--requests_per_minute, --tokens_per_minute) so the cap only bounds the requests in flight",
+    )
+    parser.add_argument(
+        "--disable_async",
+        action="store_true",
+        help="Use the synchronous clients with `--multiprocess` processes even if the runner has an async client",
+    )
+    parser.add_argument(
+        "--requests_per_minute",
+        default=None,
+        type=float,
+        help="Requests per minute allowed by the provider quota, shared by all workers (no limit if None)",
+    )
+    parser.add_argument(
+        "--tokens_per_minute",
+        default=None,
+        type=float,
+        help="Tokens per minute allowed by the provider quota, shared by all workers (no limit if None)",
+    )
+    parser.add_argument(
+        "--max_retries",
+        default=10,
+        type=int,
+        help="Retries of a failed API request (jittered exponential backoff, or the provider Retry-After)",
+    )
+    parser.add_argument(
+        "--rate_limit_dir",
+        default="cache/ratelimit",
+        type=str,
+        help="Directory of the rate limiter state shared by the workers",
+    )
+    parser.add_argument(
+        "--telemetry_file",
+        default=None,
+        type=str,
+        help="JSONL trace of the generation requests (latency, tokens, retries, backoff), defaults to the output file with a `_telemetry.jsonl` suffix",
+    )
+    parser.add_argument(
+        "--price_per_million_input",
+        default=None,
+        type=float,
+        help="Price in dollars per million input tokens for the cost estimate of the telemetry summary",
+    )
+    parser.add_argument(
+        "--price_per_million_output",
+        default=None,
+        type=float,
+        help="Price in dollars per million output tokens for the cost estimate of the telemetry summary",
+    )
     parser.add_argument(
         "--stop",
         default="###",
@@ -76,12 +141,43 @@ def get_args():
     )
     parser.add_argument("--continue_existing", action="store_true")
     parser.add_argument("--continue_existing_with_eval", action="store_true")
+    parser.add_argument(
+        "--reevaluate_question_ids",
+        type=str,
+        nargs="+",
+        default=None,
+        help="With --continue_existing_with_eval, also re-evaluate these already evaluated problems, their new verdicts replace the old ones in the merged eval state",
+    )
+    parser.add_argument(
+        "--reevaluate_changed",
+        action="store_true",
+        help="With --continue_existing_with_eval, also re-evaluate the evaluated problems whose extracted code differs from the one in the old eval_all file",
+    )
     parser.add_argument(
         "--use_cache", action="store_true", help="Use cache for generation"
     )
     parser.add_argument(
         "--cache_batch_size", type=int, default=100, help="Batch size for caching"
     )
+    parser.add_argument(
+        "--cache_backend",
+        type=str,
+        default="sqlite",
+        choices=["sqlite", "json"],
+        help="Storage of the generation cache, an existing `json` cache of the same scenario, n and temperature is imported into the sqlite cache automatically (other `json` caches can be migrated with `python -m lcb_runner.runner.generation_cache`)",
+    )
+    parser.add_argument(
+        "--batch_requests_file",
+        type=str,
+        default=None,
+        help="Write the requests of the samples missing from the cache to this JSONL file for the provider batch API (OpenAI or Anthropic format) and exit",
+    )
+    parser.add_argument(
+        "--batch_results_file",
+        type=str,
+        default=None,
+        help="Read the generations from this JSONL result file of the provider batch API instead of calling the model",
+    )
     parser.add_argument("--debug", action="store_true", help="Debug mode")
     parser.add_argument("--evaluate", action="store_true", help="Evaluate the results")
     parser.add_argument(
@@ -91,6 +187,63 @@ def get_args():
         help="Number of processes to use for evaluation",
     )
     parser.add_argument("--timeout", type=int, default=60, help="Timeout for evaluation")
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Extract and evaluate the outputs of each problem while the remaining problems are generated (codegeneration with --evaluate)",
+    )
+    parser.add_argument(
+        "--pipeline_queue_size",
+        type=int,
+        default=64,
+        help="Number of generated problems waiting for evaluation before generation blocks in --pipeline",
+    )
+    parser.add_argument(
+        "--adaptive_sampling",
+        action="store_true",
+        help="Generate and evaluate the code generation samples in rounds of --adaptive_round_size and stop sampling a problem once the confidence interval of its pass@k (--adaptive_k) is at most --adaptive_ci_width wide, --n is then the maximum number of samples of a problem (codegeneration with --evaluate)",
+    )
+    parser.add_argument(
+        "--adaptive_round_size",
+        type=int,
+        default=5,
+        help="Number of samples generated per problem and round in --adaptive_sampling (at least --adaptive_k, at most --n), every round is kept in the generation cache under its own key",
+    )
+    parser.add_argument(
+        "--adaptive_ci_width",
+        type=float,
+        default=0.2,
+        help="Width of the confidence interval of pass@k under which a problem stops being sampled in --adaptive_sampling",
+    )
+    parser.add_argument(
+        "--adaptive_k",
+        type=int,
+        default=1,
+        help="k of the pass@k whose confidence interval is targeted in --adaptive_sampling",
+    )
+    parser.add_argument(
+        "--adaptive_confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the (Wilson) intervals in --adaptive_sampling",
+    )
+    parser.add_argument(
+        "--verify_mode",
+        type=str,
+        default="full",
+        choices=["full", "fingerprint"],
+        help="How outputs are verified in code generation: `full` compares against the expected outputs, `fingerprint` hashes the stripped output while it is written and passes a test iff the hash equals the one of the expected output, neither output is held in the workers (exact match up to surrounding whitespace and line break style, no float tolerance nor per line stripping, exact-match problems only)",
+    )
+    parser.add_argument(
+        "--verify_diagnostics",
+        action="store_true",
+        help="In fingerprint verify mode, keep the expected and captured outputs, run the full comparison on a hash mismatch (same verdicts as `full`) and add both fingerprints to the metadata of wrong answers",
+    )
+    parser.add_argument(
+        "--per_test_results",
+        action="store_true",
+        help="In code generation, run every test of every generation instead of stopping at the first failure and store the per test outcomes as bitmaps in the eval_all file (see `lcb_runner.evaluation.hard_test_analytics`)",
+    )
     parser.add_argument(
         "--openai_timeout", type=int, default=45, help="Timeout for requests to OpenAI"
     )
@@ -118,9 +271,39 @@ def get_args():
         help="Folder name to save the custom output results (output file folder modified if None)"
     )
     parser.add_argument("--dtype", type=str, default="float16", help="Dtype for vllm")
+    parser.add_argument(
+        "--max_model_len",
+        type=int,
+        default=4096,
+        help="Context length for vllm, prompts longer than this are skipped and completions are shortened to fit",
+    )
+    parser.add_argument(
+        "--disable_enforce_eager",
+        action="store_true",
+        help="Let vllm capture CUDA graphs instead of running in eager mode",
+    )
+    parser.add_argument(
+        "--vllm_batch_tokens",
+        type=int,
+        default=1_000_000,
+        help="KV cache budget (prompt + n * max_tokens tokens per prompt) of a vllm micro-batch, the cache is saved after each micro-batch",
+    )
+    parser.add_argument(
+        "--artifact_dir",
+        type=str,
+        default="artifacts",
+        help="Directory of the content-addressed evaluation artifacts",
+    )
+    parser.add_argument(
+        "--reuse_artifacts",
+        action="store_true",
+        help="Reuse an existing identical evaluation (same dataset, harness version, evaluation args and outputs) instead of recomputing it",
+    )
+
+    return parser
 
-    args = parser.parse_args()
 
+def process_args(args):
     args.stop = args.stop.split(",")
 
     if args.tensor_parallel_size == -1:
@@ -132,6 +315,10 @@ def get_args():
     return args
 
 
+def get_args():
+    return process_args(get_parser().parse_args())
+
+
 def test():
     args = get_args()
     print("args",args)
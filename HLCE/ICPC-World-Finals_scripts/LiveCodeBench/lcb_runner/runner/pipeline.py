@@ -0,0 +1,110 @@
+""" Pipelined generation, extraction and evaluation of code generation runs. """
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+    ALL_COMPLETED,
+)
+from typing import List, Tuple
+
+from tqdm import tqdm
+
+from lcb_runner.lm_styles import LanguageModel
+from lcb_runner.evaluation.compute_code_generation_metrics import (
+    evaluate_generations_by_problem,
+    assemble_codegen_metrics,
+)
+from lcb_runner.runner.scenario_router import combine_results, get_evaluation_samples
+
+## pushed on the queue once generation is over
+_GENERATION_DONE = object()
+
+
+def run_pipeline(
+    args, runner, model: LanguageModel, benchmark: List, format_prompt: callable
+) -> Tuple[List[List[str]], list]:
+    """
+    Generates, extracts and evaluates the problems of `benchmark` in overlapping stages:
+    the outputs of a problem are extracted and submitted to the evaluation pool as soon
+    as the runner returns them. Generation blocks when `args.pipeline_queue_size` problems
+    wait for extraction, extraction when twice `args.num_process_evaluate` evaluations are in flight.
+    Returns the outputs of the runner and the same metrics as `get_metrics`.
+    """
+    eval_samples = get_evaluation_samples(args.scenario, args, benchmark)
+    generation_queue = queue.Queue(maxsize=args.pipeline_queue_size)
+    generation_errors = []
+    outputs = [None for _ in benchmark]
+
+    def generate():
+        try:
+            runner.run_main(
+                benchmark,
+                format_prompt,
+                on_output=lambda index, outputs_list: generation_queue.put(
+                    (index, outputs_list)
+                ),
+            )
+        except BaseException as e:
+            generation_errors.append(e)
+        finally:
+            generation_queue.put(_GENERATION_DONE)
+
+    generation_thread = threading.Thread(target=generate, daemon=True)
+    generation_thread.start()
+
+    results = defaultdict(dict)
+    metadatas = defaultdict(dict)
+    max_in_flight = 2 * args.num_process_evaluate
+
+    def collect(futures: dict, return_when):
+        done, _ = wait(futures, return_when=return_when)
+        for future in done:
+            index, generation_index = futures.pop(future)
+            curr_results, curr_metadatas = future.result()
+            results[index][generation_index] = curr_results[0]
+            metadatas[index][generation_index] = curr_metadatas[0]
+            pbar.update(1)
+
+    with ProcessPoolExecutor(max_workers=args.num_process_evaluate) as executor, tqdm(
+        desc="Evaluating", total=len(benchmark) * args.n
+    ) as pbar:
+        futures = {}
+        while True:
+            item = generation_queue.get()
+            if item is _GENERATION_DONE:
+                break
+            index, outputs_list = item
+            outputs[index] = outputs_list
+            _, extracted_list = combine_results(
+                args.scenario, [outputs_list], model, args.cot_code_execution
+            )[0]
+            for generation_index, generation in enumerate(extracted_list):
+                future = executor.submit(
+                    evaluate_generations_by_problem,
+                    ([generation], eval_samples[index], False, args.timeout),
+                )
+                futures[future] = (index, generation_index)
+                if len(futures) >= max_in_flight:
+                    collect(futures, FIRST_COMPLETED)
+        if futures:
+            collect(futures, ALL_COMPLETED)
+
+    generation_thread.join()
+    if generation_errors:
+        raise generation_errors[0]
+
+    ## back to lists in generation order, as in the batch evaluation
+    results = {
+        index: [problem_results[i] for i in range(len(problem_results))]
+        for index, problem_results in results.items()
+    }
+    metadatas = {
+        index: [problem_metadatas[i] for i in range(len(problem_metadatas))]
+        for index, problem_metadatas in metadatas.items()
+    }
+    metrics = assemble_codegen_metrics(results, metadatas, len(outputs[0]))
+    print(metrics[0]["pass@1"])
+    return outputs, metrics
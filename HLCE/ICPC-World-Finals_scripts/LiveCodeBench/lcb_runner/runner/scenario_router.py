@@ -54,7 +54,9 @@ def build_prompt_benchmark(
         if not_fast:
             benchmark = load_code_generation_dataset_not_fast(args.release_version)
         else:
-            benchmark = load_code_generation_dataset(args.release_version)
+            benchmark = load_code_generation_dataset(
+                args.release_version, test_store_dir=args.test_store_dir
+            )
         benchmark = sorted(benchmark, key=lambda x: x.question_id)
         format_prompt = format_prompt_generation
     elif scenario == Scenario.testoutputprediction:
@@ -62,7 +64,9 @@ def build_prompt_benchmark(
         benchmark = sorted(benchmark, key=lambda x: (x.question_id, x.test_id))
         format_prompt = format_prompt_test_output
     elif scenario == Scenario.selfrepair:
-        benchmark = load_code_generation_dataset(args.release_version)
+        benchmark = load_code_generation_dataset(
+            args.release_version, test_store_dir=args.test_store_dir
+        )
         benchmark = sorted(benchmark, key=lambda x: x.question_id)
         format_prompt = format_prompt_self_repair
     elif scenario == Scenario.codeexecution:
@@ -175,6 +179,25 @@ def sort_and_extract_save_results(scenario: Scenario, save_results: List[dict]):
     return save_results, combined_results
 
 
+def get_evaluation_samples(
+    scenario: Scenario,
+    args,
+    benchmark: List[
+        Union[CodeGenerationProblem, CodeExecutionProblem, TestOutputPredictionProblem]
+    ],
+):
+    if scenario == Scenario.codegeneration or scenario == Scenario.selfrepair:
+        return [
+            instance.get_evaluation_sample(
+                verify_mode=args.verify_mode,
+                diagnostics=args.verify_diagnostics,
+                fail_fast=not args.per_test_results,
+            )
+            for instance in benchmark
+        ]
+    return [instance.get_evaluation_sample() for instance in benchmark]
+
+
 def get_metrics(
     scenario: Scenario,
     args,
@@ -183,9 +206,10 @@ def get_metrics(
     ],
     combined_results,
 ):
-    eval_samples = [instance.get_evaluation_sample() for instance in benchmark]
     generations = [extracted for _, extracted in combined_results]
 
+    eval_samples = get_evaluation_samples(scenario, args, benchmark)
+
     if scenario == Scenario.codegeneration or scenario == Scenario.selfrepair:
         metrics = codegen_metrics(
             eval_samples,
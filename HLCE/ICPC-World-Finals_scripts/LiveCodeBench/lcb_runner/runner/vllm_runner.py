@@ -7,8 +7,10 @@ except ImportError as e:
     pass
 from transformers import AutoTokenizer
 from vllm import LLM, SamplingParams
-from typing import List
+import time
+from typing import Dict, List
 from lcb_runner.runner.base_runner import BaseRunner
+from lcb_runner.utils.telemetry import RequestTrace
 
 
 class VLLMRunner(BaseRunner):
@@ -22,15 +24,18 @@ class VLLMRunner(BaseRunner):
             tokenizer=model_tokenizer_path,
             tensor_parallel_size=args.tensor_parallel_size,
             dtype=args.dtype,
-            enforce_eager=True,
-            max_model_len=4096,
+            enforce_eager=not args.disable_enforce_eager,
+            max_model_len=args.max_model_len,
             disable_custom_all_reduce=True,
             enable_prefix_caching=args.enable_prefix_caching,
             trust_remote_code=args.trust_remote_code,
         )
-        self.sampling_params = SamplingParams(
+        self.sampling_params = self.build_sampling_params(self.args.max_tokens)
+
+    def build_sampling_params(self, max_tokens: int) -> SamplingParams:
+        return SamplingParams(
             n=self.args.n,
-            max_tokens=self.args.max_tokens,
+            max_tokens=max_tokens,
             temperature=self.args.temperature,
             top_p=self.args.top_p,
             frequency_penalty=0,
@@ -41,27 +46,100 @@ class VLLMRunner(BaseRunner):
     def _run_single(self, prompt: str) -> List[str]:
         pass
 
-    def run_batch(self, prompts: List[str]) -> List[List[str]]:
+    def get_micro_batches(
+        self, prompt_lengths: Dict[int, int], indices: List[int]
+    ) -> List[List[int]]:
+        """
+        Groups the prompts, longest first, into micro-batches whose KV cache
+        footprint (prompt + n * max_tokens tokens per prompt) fits in `--vllm_batch_tokens`
+        """
+        micro_batches = []
+        batch_tokens = 0
+        for index in sorted(indices, key=lambda i: prompt_lengths[i], reverse=True):
+            num_tokens = prompt_lengths[index] + self.args.n * self.args.max_tokens
+            if micro_batches and batch_tokens + num_tokens <= self.args.vllm_batch_tokens:
+                micro_batches[-1].append(index)
+                batch_tokens += num_tokens
+            else:
+                micro_batches.append([index])
+                batch_tokens = num_tokens
+        return micro_batches
+
+    def get_sampling_params(self, prompt_length: int) -> SamplingParams:
+        ## long statements keep their full prompt and get a shorter completion budget
+        max_tokens = min(self.args.max_tokens, self.args.max_model_len - prompt_length)
+        if max_tokens == self.args.max_tokens:
+            return self.sampling_params
+        return self.build_sampling_params(max_tokens)
+
+    def run_batch(self, prompts: List[str], on_output=None) -> List[List[str]]:
         outputs = [None for _ in prompts]
+        set_output = self.get_output_setter(outputs, on_output)
         remaining_prompts = []
-        remaining_indices = []
         for prompt_index, prompt in enumerate(prompts):
-            if self.args.use_cache and prompt in self.cache:
-                if len(self.cache[prompt]) == self.args.n:
-                    outputs[prompt_index] = self.cache[prompt]
+            if self.args.use_cache:
+                cached_outputs = self.cache.get(prompt)
+                if cached_outputs is not None and len(cached_outputs) == self.args.n:
+                    set_output(prompt_index, cached_outputs)
+                    self.cache_hits += 1
                     continue
-            remaining_prompts.append(prompt)
-            remaining_indices.append(prompt_index)
-        if remaining_prompts:
-            vllm_outputs = self.llm.generate(remaining_prompts, self.sampling_params)
+                self.cache_misses += 1
+            remaining_prompts.append(prompt_index)
+        if not remaining_prompts:
+            return outputs
+
+        tokenizer = self.llm.get_tokenizer()
+        prompt_lengths = {
+            index: len(tokenizer.encode(prompts[index])) for index in remaining_prompts
+        }
+        too_long = [
+            index
+            for index in remaining_prompts
+            if prompt_lengths[index] >= self.args.max_model_len
+        ]
+        for index in too_long:
+            ## left empty and uncached, a run with a larger --max_model_len retries them
+            print(
+                f"Prompt {index} has {prompt_lengths[index]} tokens, more than --max_model_len {self.args.max_model_len}, skipping it"
+            )
+            set_output(index, ["" for _ in range(self.args.n)])
+        remaining_prompts = [index for index in remaining_prompts if index not in too_long]
+
+        micro_batches = self.get_micro_batches(prompt_lengths, remaining_prompts)
+        for batch_index, micro_batch in enumerate(micro_batches):
+            start = time.time()
+            vllm_outputs = self.llm.generate(
+                [prompts[index] for index in micro_batch],
+                [self.get_sampling_params(prompt_lengths[index]) for index in micro_batch],
+                use_tqdm=False,
+            )
+            elapsed = time.time() - start
+            assert len(micro_batch) == len(vllm_outputs)
+            num_generated_tokens = 0
+            for index, vllm_output in zip(micro_batch, vllm_outputs):
+                prompt_outputs = [o.text for o in vllm_output.outputs]
+                num_generated_tokens += sum(len(o.token_ids) for o in vllm_output.outputs)
+                if self.args.use_cache:
+                    self.cache[prompts[index]] = prompt_outputs
+                set_output(index, prompt_outputs)
+            ## a micro-batch is a single request of the engine
+            self.telemetry.add(
+                RequestTrace(
+                    start=start,
+                    end=start + elapsed,
+                    num_samples=len(micro_batch) * self.args.n,
+                    input_tokens=sum(prompt_lengths[index] for index in micro_batch),
+                    output_tokens=num_generated_tokens,
+                    num_attempts=1,
+                )
+            )
+            ## checkpoint, a killed job resumes after the last finished micro-batch
             if self.args.use_cache:
-                assert len(remaining_prompts) == len(vllm_outputs)
-                for index, remaining_prompt, vllm_output in zip(
-                    remaining_indices, remaining_prompts, vllm_outputs
-                ):
-                    self.cache[remaining_prompt] = [o.text for o in vllm_output.outputs]
-                    outputs[index] = [o.text for o in vllm_output.outputs]
-            else:
-                for index, vllm_output in zip(remaining_indices, vllm_outputs):
-                    outputs[index] = [o.text for o in vllm_output.outputs]
+                self.save_cache()
+            print(
+                f"Micro-batch {batch_index + 1}/{len(micro_batches)}: {len(micro_batch)} prompts, "
+                f"{sum(prompt_lengths[index] for index in micro_batch)} prompt tokens, "
+                f"{num_generated_tokens} generated tokens in {elapsed:.1f}s "
+                f"({num_generated_tokens / max(elapsed, 1e-9):.1f} tokens/s)"
+            )
         return outputs
@@ -0,0 +1,108 @@
+""" Content-addressed storage of evaluation artifacts, keyed by everything that determines the evaluation. """
+import os
+import json
+import time
+import shutil
+import hashlib
+from typing import List, Dict, Optional
+
+from lcb_runner.utils.path_utils import get_artifact_dir
+
+## bump whenever a change in the harness can change the evaluation results
+HARNESS_VERSION = "3"
+
+## arguments that change the evaluation of a fixed code_list
+EVALUATION_ARGS = [
+    "scenario",
+    "release_version",
+    "not_fast",
+    "cot_code_execution",
+    "timeout",
+    "verify_mode",
+    "verify_diagnostics",
+    "per_test_results",
+]
+
+MANIFEST_FILE = "manifest.json"
+
+
+def hash_json(obj) -> str:
+    return hashlib.sha256(
+        json.dumps(obj, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def hash_dataset(benchmark: List) -> str:
+    dataset_hash = hashlib.sha256()
+    for instance in benchmark:
+        sample = instance.get_evaluation_sample()
+        dataset_hash.update(
+            json.dumps(sample, sort_keys=True, default=str).encode("utf-8")
+        )
+        ## tests of the compressed store are referenced by path, their content by digest
+        content_digests = [
+            test.get_content_digest()
+            for test in getattr(instance, "test_cases", [])
+            if hasattr(test, "get_content_digest")
+        ]
+        if content_digests:
+            dataset_hash.update(json.dumps(content_digests).encode("utf-8"))
+    return dataset_hash.hexdigest()
+
+
+def build_manifest(args, benchmark: List, combined_results: List) -> dict:
+    return {
+        "harness_version": HARNESS_VERSION,
+        "dataset_hash": hash_dataset(benchmark),
+        "output_list_hash": hash_json([outputs for outputs, _ in combined_results]),
+        "code_list_hash": hash_json([extracted for _, extracted in combined_results]),
+        "args": {name: getattr(args, name, None) for name in EVALUATION_ARGS},
+    }
+
+
+def get_manifest_key(manifest: dict) -> str:
+    return hash_json(manifest)
+
+
+def find_artifact(artifact_root: str, manifest: dict) -> Optional[str]:
+    """Returns the directory of a finished evaluation with the same manifest"""
+    artifact_dir = get_artifact_dir(artifact_root, get_manifest_key(manifest))
+    ## the manifest is written last, a directory without it is an interrupted save
+    if os.path.exists(os.path.join(artifact_dir, MANIFEST_FILE)):
+        return artifact_dir
+    return None
+
+
+def save_artifact(
+    artifact_root: str, manifest: dict, files: Dict[str, str], run_args=None
+) -> str:
+    """
+    Copies `files` (artifact file name -> path) into the directory of the
+    manifest and writes the manifest
+    """
+    key = get_manifest_key(manifest)
+    artifact_dir = get_artifact_dir(artifact_root, key)
+    os.makedirs(artifact_dir, exist_ok=True)
+    for name, path in files.items():
+        shutil.copyfile(path, os.path.join(artifact_dir, name))
+
+    saved_manifest = {
+        **manifest,
+        "key": key,
+        "files": sorted(files),
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "run_args": vars(run_args) if run_args is not None else None,
+    }
+    with open(os.path.join(artifact_dir, MANIFEST_FILE + ".tmp"), "w") as f:
+        json.dump(saved_manifest, f, indent=4, default=str)
+    os.replace(
+        os.path.join(artifact_dir, MANIFEST_FILE + ".tmp"),
+        os.path.join(artifact_dir, MANIFEST_FILE),
+    )
+    return artifact_dir
+
+
+def restore_artifact(artifact_dir: str, files: Dict[str, str]):
+    """Copies the artifact files back to the given paths (artifact file name -> path)"""
+    for name, path in files.items():
+        shutil.copyfile(os.path.join(artifact_dir, name), path)
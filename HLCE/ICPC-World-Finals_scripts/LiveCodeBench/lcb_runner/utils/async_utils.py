@@ -0,0 +1,116 @@
+""" Utilities for running coroutines concurrently on a single event loop. """
+import sys
+import asyncio
+import traceback
+from typing import Callable, Optional, Any, List, Awaitable
+
+import tqdm
+
+from lcb_runner.utils.multiprocess import TaskResult, TaskRunStatus
+
+
+async def _run_task(
+    func: Callable[[Any], Awaitable[Any]],
+    task: Any,
+    semaphore: asyncio.Semaphore,
+    timeout_per_task: Optional[int],
+) -> TaskResult:
+    async with semaphore:
+        try:
+            result = await asyncio.wait_for(func(task), timeout=timeout_per_task)
+        except asyncio.TimeoutError:
+            return TaskResult(status=TaskRunStatus.TIMEOUT)
+        except Exception:
+            return TaskResult(
+                status=TaskRunStatus.EXCEPTION, exception_tb=traceback.format_exc()
+            )
+    return TaskResult(status=TaskRunStatus.SUCCESS, result=result)
+
+
+async def run_coroutines_in_parallel_async(
+    func: Callable[[Any], Awaitable[Any]],
+    tasks: List[Any],
+    max_concurrency: int = 100,
+    timeout_per_task: Optional[int] = None,
+    use_progress_bar: bool = False,
+    progress_bar_desc: Optional[str] = None,
+    callback: Optional[Callable[[int, TaskResult], None]] = None,
+) -> List[TaskResult]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _indexed_task(index, task):
+        return index, await _run_task(func, task, semaphore, timeout_per_task)
+
+    if use_progress_bar:
+        pbar = tqdm.tqdm(
+            desc=progress_bar_desc,
+            total=len(tasks),
+            dynamic_ncols=True,
+            file=sys.stdout,
+        )
+    else:
+        pbar = None
+
+    task_results: List[Optional[TaskResult]] = [None for _ in tasks]
+    succ = timeouts = exceptions = 0
+    futures = [
+        asyncio.ensure_future(_indexed_task(index, task))
+        for index, task in enumerate(tasks)
+    ]
+    for future in asyncio.as_completed(futures):
+        index, task_result = await future
+        task_results[index] = task_result
+        if callback is not None:
+            callback(index, task_result)
+
+        if task_result.is_success():
+            succ += 1
+        elif task_result.is_timeout():
+            timeouts += 1
+        else:
+            exceptions += 1
+        if pbar is not None:
+            pbar.update(1)
+            pbar.set_postfix(succ=succ, timeouts=timeouts, exc=exceptions)
+
+    if pbar is not None:
+        pbar.close()
+    return task_results
+
+
+def run_coroutines_in_parallel(
+    func: Callable[[Any], Awaitable[Any]],
+    tasks: List[Any],
+    max_concurrency: int = 100,
+    timeout_per_task: Optional[int] = None,
+    use_progress_bar: bool = False,
+    progress_bar_desc: Optional[str] = None,
+    callback: Optional[Callable[[int, TaskResult], None]] = None,
+    loop: Optional[asyncio.AbstractEventLoop] = None,
+) -> List[TaskResult]:
+    """
+    Args:
+        func: The coroutine function to run. The function must accept a single argument.
+        tasks: A list of tasks i.e. arguments to func.
+        max_concurrency: Maximum number of coroutines awaiting at the same time.
+        timeout_per_task: The timeout, in seconds, to use per task.
+        use_progress_bar: Whether to use a progress bar. Defaults False.
+        progress_bar_desc: String to display in the progress bar. Default None.
+        callback: Called with the task index and its TaskResult as soon as a task finishes.
+        loop: The event loop to run on, clients bound to a loop can be reused
+            across calls by passing the same loop. A new loop is used if None.
+    Returns:
+        A list of TaskResult objects, one per task, in the order of the tasks.
+    """
+    coroutine = run_coroutines_in_parallel_async(
+        func,
+        tasks,
+        max_concurrency=max_concurrency,
+        timeout_per_task=timeout_per_task,
+        use_progress_bar=use_progress_bar,
+        progress_bar_desc=progress_bar_desc,
+        callback=callback,
+    )
+    if loop is None:
+        return asyncio.run(coroutine)
+    return loop.run_until_complete(coroutine)
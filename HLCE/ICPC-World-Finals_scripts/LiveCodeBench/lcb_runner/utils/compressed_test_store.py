@@ -0,0 +1,270 @@
+""" Utilities for storing test cases compressed on disk and reading them back as streams. """
+import io
+import os
+import re
+import gzip
+import json
+import hashlib
+import builtins
+from typing import List, Tuple
+
+# keep a handle on the real `open`, evaluation patches `builtins.open` while the solution runs
+_open = builtins.open
+
+TEST_STORE_MANIFEST = "tests.json"
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def get_problem_store_dir(store_dir: str, question_id: str) -> str:
+    safe_question_id = re.sub(r"[^\w.-]", "_", str(question_id))
+    return os.path.join(os.path.abspath(store_dir), safe_question_id)
+
+
+def write_compressed_text(path: str, text: str, compresslevel: int = 6):
+    with _open(path, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=compresslevel) as f:
+            f.write(text.encode("utf-8"))
+
+
+def open_compressed_text(path: str) -> io.TextIOWrapper:
+    """
+    Opens a compressed test file as a text stream, the content is decompressed
+    lazily as it is read so the full test is never materialized
+    """
+    raw = _open(path, "rb")
+    compressed = gzip.GzipFile(fileobj=raw, mode="rb")
+    compressed.myfileobj = raw  ## closes the underlying file together with the stream
+    return io.TextIOWrapper(compressed, encoding="utf-8", newline="\n")
+
+
+class CompressedStdin(io.TextIOBase):
+    """
+    `sys.stdin` of a solution reading a compressed test input. It has the interface of
+    the `StringIO` that `testing_util.call_method` installs for plain tests (no `buffer`,
+    no `fileno`) so that a solution gets the same verdict however its tests are stored
+    """
+
+    def __init__(self, path: str):
+        self._stream = open_compressed_text(path)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size=-1) -> str:
+        return self._stream.read(-1 if size is None else size)
+
+    def readline(self, size=-1) -> str:
+        return self._stream.readline(-1 if size is None else size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def close(self):
+        self._stream.close()
+        super().close()
+
+
+def iter_compressed_lines(path: str):
+    """Same as `iter(text.split("\n"))` for the text of a compressed file"""
+    with open_compressed_text(path) as f:
+        last = ""
+        for line in f:
+            if line.endswith("\n"):
+                yield line[:-1]
+                last = ""
+            else:
+                last = line
+        yield last
+
+
+def read_compressed_text(path: str) -> str:
+    with open_compressed_text(path) as f:
+        return f.read()
+
+
+def read_compressed_head(path: str, length: int = 300) -> str:
+    with open_compressed_text(path) as f:
+        head = f.read(length + 1)
+    if len(head) > length:
+        return head[:length] + "...(truncated)"
+    return head
+
+
+def _stream_equals_stripped(path: str, actual: str) -> bool:
+    """
+    Same as `actual.strip() == expected.strip()` where expected is read from
+    the compressed file chunk by chunk
+    """
+    actual = actual.strip()
+    position = 0
+    started = False
+    with open_compressed_text(path) as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            if not started:
+                chunk = chunk.lstrip()
+                if not chunk:
+                    continue
+                started = True
+            if position < len(actual):
+                overlap = min(len(chunk), len(actual) - position)
+                if chunk[:overlap] != actual[position : position + overlap]:
+                    return False
+                position += overlap
+                chunk = chunk[overlap:]
+            if chunk.strip():
+                return False
+    return position == len(actual)
+
+
+def stream_compare_stripped(output_lines: List[str], path: str) -> bool:
+    """
+    Streaming counterpart of `testing_util.custom_compare_` for expected
+    outputs stored in the test store
+    """
+    if _stream_equals_stripped(path, "\n".join(output_lines)):
+        return True
+    return _stream_equals_stripped(path, "\n".join(o.strip() for o in output_lines))
+
+
+## the line breaks of `str.splitlines`, "\r\n" being a single one
+LINE_BREAK_PATTERN = re.compile("\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+class OutputHasher:
+    """
+    Incrementally hashes `text.strip()`, so `update("1 2")` followed by `update("3\n")`
+    gives the same fingerprint as `update("1 23\n")`. With `normalize_newlines` (captured
+    outputs) every line break is hashed as "\n", as in `"\n".join(output.splitlines())`,
+    so equal fingerprints of a captured and an expected output imply that
+    `testing_util.custom_compare_` accepts the output
+    """
+
+    def __init__(self, normalize_newlines: bool = False):
+        self.normalize_newlines = normalize_newlines
+        self._hash = hashlib.sha256()
+        self._started = False
+        self._pending = ""
+        self._carry_cr = False
+        self.length = 0
+
+    def _add(self, text: str):
+        self._hash.update(text.encode("utf-8", "surrogatepass"))
+        self.length += len(text)
+
+    def update(self, text: str):
+        if self.normalize_newlines:
+            if self._carry_cr:
+                text = "\r" + text
+            ## a trailing "\r" may be the first half of a "\r\n"
+            self._carry_cr = text.endswith("\r")
+            if self._carry_cr:
+                text = text[:-1]
+            text = LINE_BREAK_PATTERN.sub("\n", text)
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        ## trailing whitespace is only hashed once something follows it
+        stripped = text.rstrip()
+        if stripped:
+            self._add(self._pending + stripped)
+            self._pending = text[len(stripped) :]
+        else:
+            self._pending += text
+
+    def fingerprint(self) -> List:
+        """Returns [sha256 of the stripped text, its length]"""
+        return [self._hash.hexdigest(), self.length]
+
+
+def compute_fingerprint(text: str) -> List:
+    hasher = OutputHasher()
+    hasher.update(text)
+    return hasher.fingerprint()
+
+
+def compute_compressed_fingerprint(path: str) -> List:
+    hasher = OutputHasher()
+    with open_compressed_text(path) as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.fingerprint()
+
+
+def compute_text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def compute_compressed_digest(path: str) -> str:
+    """Digest of the text of a compressed test file, equal to `compute_text_digest` of the text"""
+    digest = hashlib.sha256()
+    with open_compressed_text(path) as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def save_problem_tests(
+    store_dir: str, question_id: str, tests: List[Tuple[str, str]]
+) -> List[dict]:
+    """
+    Writes every (input, output) pair of a problem into its own compressed
+    files and returns the manifest entries (paths, content digests and the fingerprint
+    of the expected output). A problem already present in the store is only rewritten
+    when its tests changed (or its manifest predates the digests).
+    """
+    problem_dir = get_problem_store_dir(store_dir, question_id)
+    manifest_path = os.path.join(problem_dir, TEST_STORE_MANIFEST)
+    digests = [
+        (compute_text_digest(test_input), compute_text_digest(test_output))
+        for test_input, test_output in tests
+    ]
+    if os.path.exists(manifest_path):
+        with _open(manifest_path) as f:
+            manifest = json.load(f)
+        if [
+            (entry.get("input_digest"), entry.get("output_digest")) for entry in manifest
+        ] == digests:
+            return manifest
+        print(f"Tests of {question_id} changed since they were stored, rewriting them")
+
+    os.makedirs(problem_dir, exist_ok=True)
+    manifest = []
+    for index, ((test_input, test_output), (input_digest, output_digest)) in enumerate(
+        zip(tests, digests)
+    ):
+        input_path = os.path.join(problem_dir, f"{index}.in.gz")
+        output_path = os.path.join(problem_dir, f"{index}.out.gz")
+        write_compressed_text(input_path, test_input)
+        write_compressed_text(output_path, test_output)
+        manifest.append(
+            {
+                "input_path": input_path,
+                "output_path": output_path,
+                "output_fingerprint": compute_fingerprint(test_output),
+                "input_digest": input_digest,
+                "output_digest": output_digest,
+            }
+        )
+
+    ## write the manifest last so an interrupted snapshot is redone next time
+    with _open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
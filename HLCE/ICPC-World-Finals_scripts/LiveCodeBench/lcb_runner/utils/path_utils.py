@@ -13,12 +13,21 @@ def ensure_dir(path: str, is_file=True):
 
 
 def get_cache_path(model_repr:str, args) -> str:
+    if args.cache_backend == "sqlite":
+        ## sampling parameters are part of the sqlite cache keys, one file per model
+        path = f"cache/{model_repr}/generations.sqlite"
+        ensure_dir(path)
+        return path
+    path = get_json_cache_path(model_repr, args)
+    ensure_dir(path)
+    return path
+
+
+def get_json_cache_path(model_repr:str, args) -> str:
     scenario: Scenario = args.scenario
     n = args.n
     temperature = args.temperature
-    path = f"cache/{model_repr}/{scenario}_{n}_{temperature}.json"
-    ensure_dir(path)
-    return path
+    return f"cache/{model_repr}/{scenario}_{n}_{temperature}.json"
 
 
 def get_output_path(model_repr:str, args) -> str:
@@ -38,3 +47,7 @@ def get_eval_all_output_path(model_repr:str, args) -> str:
     cot_suffix = "_cot" if args.cot_code_execution else ""
     path = f"output/{model_repr}/{scenario}_{n}_{temperature}{cot_suffix}_eval_all.json"
     return path
+
+
+def get_artifact_dir(artifact_root: str, key: str) -> str:
+    return f"{artifact_root}/{key[:2]}/{key}"
@@ -0,0 +1,446 @@
+""" Rate limiting and retry with backoff shared by all the workers of a run. """
+import os
+import json
+import time
+import uuid
+import fcntl
+import random
+import asyncio
+import argparse
+import threading
+import email.utils
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple, Type, Any
+
+from lcb_runner.utils.telemetry import record_attempt, record_retry, record_throttled
+
+STATE_FILE_SUFFIX = ".json"
+LOCK_FILE_SUFFIX = ".lock"
+## state older than a full refill of the buckets is left by an earlier run and dropped
+STATE_TTL = 60.0
+## the wake up after a block is spread over this fraction of the remaining block
+BLOCK_JITTER_FRACTION = 0.25
+## counters of runs that did not update them for this long are dropped from the state
+RUN_STATS_TTL = 24 * 3600.0
+
+
+def get_retry_after(exception: Exception) -> Optional[float]:
+    """
+    Returns the delay in seconds requested by the provider through the
+    `retry-after-ms` / `retry-after` headers of the failed response, if any
+    """
+    headers = None
+    response = getattr(exception, "response", None)
+    if response is not None:
+        headers = getattr(response, "headers", None)
+    if headers is None:
+        headers = getattr(exception, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    ## http-date format
+    try:
+        retry_date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_date.timestamp() - time.time(), 0.0)
+
+
+class RateLimiter:
+    """
+    Token buckets (requests per minute and tokens per minute) for a provider.
+    The shared state lives in a file guarded by `fcntl.flock`, so the limits, the
+    backoff after a rate limit error and the throttling counters are shared
+    by every process of the run. Blocking callers (`call`) reserve in the file
+    directly, coroutines (`acall`) reserve from in process buckets that are merged
+    with the file every `sync_interval` seconds in a thread, off the event loop.
+    The buckets and the backoff are shared by every run of the provider, the counters
+    are kept per run (`run_id`, inherited by the worker processes of the run).
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        state_dir: str = "cache/ratelimit",
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 10,
+        base_delay: float = 1.0,
+        max_delay: float = 120.0,
+        sync_interval: float = 1.0,
+    ):
+        self.provider = provider
+        self.state_path = os.path.join(state_dir, provider + STATE_FILE_SUFFIX)
+        self.lock_path = os.path.join(state_dir, provider + LOCK_FILE_SUFFIX)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sync_interval = sync_interval
+        self.run_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(state_dir, exist_ok=True)
+        self._reset_local()
+
+    def _reset_local(self):
+        ## in process view of the shared state: the buckets as of the last sync minus
+        ## what was consumed since (`_consumed`), the block and the counters to merge
+        self._lock = threading.Lock()
+        self._async_lock = None
+        self._local = {}
+        self._consumed = {}
+        self._last_sync = None
+        self._syncing = False
+
+    def __getstate__(self):
+        ## the runner (and its limiter) is pickled into the worker processes
+        state = self.__dict__.copy()
+        for name in ["_lock", "_async_lock", "_local", "_consumed", "_last_sync", "_syncing"]:
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset_local()
+
+    @contextmanager
+    def _locked_state(self):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.state_path) as f:
+                        state = json.load(f)
+                except (FileNotFoundError, json.JSONDecodeError):
+                    state = {}
+                yield state
+                with open(self.state_path + ".tmp", "w") as f:
+                    json.dump(state, f)
+                os.replace(self.state_path + ".tmp", self.state_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reset_stats(self):
+        """Drops the counters of every run of the provider (`--reset_stats` of the command line)"""
+        with self._lock:
+            self._local.pop("stats", None)
+        with self._locked_state() as state:
+            state.pop("runs", None)
+
+    def get_all_stats(self) -> dict:
+        """{run id: counters} of the runs of the provider"""
+        with self._locked_state() as state:
+            return {
+                run_id: {name: value for name, value in stats.items() if name != "updated_at"}
+                for run_id, stats in state.get("runs", {}).items()
+            }
+
+    def get_stats(self) -> dict:
+        """Counters of this run, summed over its workers"""
+        self._sync()
+        return self.get_all_stats().get(self.run_id, {})
+
+    def _add_stats(self, state: dict, **increments):
+        stats = state.setdefault("stats", {})
+        for name, increment in increments.items():
+            stats[name] = stats.get(name, 0) + increment
+
+    def _get_run_state(self, state: dict, now: float) -> dict:
+        """Entry of this run in the shared state, the entries of stale runs are dropped"""
+        runs = state.setdefault("runs", {})
+        for run_id in list(runs):
+            if now - runs[run_id].get("updated_at", 0) > RUN_STATS_TTL:
+                del runs[run_id]
+        run_state = {"stats": runs.setdefault(self.run_id, {})}
+        run_state["stats"]["updated_at"] = now
+        return run_state
+
+    @staticmethod
+    def _refill(state: dict, name: str, rate: float, now: float) -> float:
+        ## a bucket holds at most one minute of quota and refills continuously
+        level, updated_at = state.get(name, (rate, now))
+        level = min(rate, level + (now - updated_at) * rate / 60)
+        state[name] = (level, now)
+        return level
+
+    def _get_buckets(self, num_tokens: int) -> list:
+        buckets = []
+        if self.requests_per_minute:
+            buckets.append(("requests", self.requests_per_minute, 1))
+        if self.tokens_per_minute:
+            ## a request larger than the bucket could never be admitted
+            buckets.append(
+                (
+                    "tokens",
+                    self.tokens_per_minute,
+                    min(num_tokens, self.tokens_per_minute),
+                )
+            )
+        return buckets
+
+    def _reserve(self, state: dict, num_tokens: int, now: float) -> float:
+        """
+        Takes one request and `num_tokens` tokens from the buckets of `state` and
+        returns 0, or returns how long to wait before trying again
+        """
+        blocked_until = state.get("blocked_until", 0)
+        if blocked_until > now:
+            ## jittered so that the waiters of a block do not all retry at once
+            remaining = blocked_until - now
+            return remaining + random.uniform(
+                0, self.base_delay + BLOCK_JITTER_FRACTION * remaining
+            )
+
+        buckets = self._get_buckets(num_tokens)
+        wait = 0.0
+        levels = {}
+        for name, rate, amount in buckets:
+            levels[name] = self._refill(state, name, rate, now)
+            if levels[name] < amount:
+                wait = max(wait, (amount - levels[name]) * 60 / rate)
+        if wait > 0:
+            return wait
+
+        for name, rate, amount in buckets:
+            state[name] = (levels[name] - amount, now)
+        return 0.0
+
+    def _reserve_local(self, num_tokens: int) -> float:
+        with self._lock:
+            wait = self._reserve(self._local, num_tokens, time.time())
+            if wait == 0:
+                self._add_stats(self._local, num_requests=1)
+                for name, _, amount in self._get_buckets(num_tokens):
+                    self._consumed[name] = self._consumed.get(name, 0) + amount
+            return wait
+
+    def _sync(self, num_tokens: Optional[int] = None) -> float:
+        """
+        Merges the in process consumption, block and counters into the file and
+        reloads the shared buckets. With `num_tokens`, also reserves them in the file
+        (blocking callers) and returns the wait as `_reserve`
+        """
+        with self._lock:
+            consumed, self._consumed = self._consumed, {}
+            stats = self._local.pop("stats", {})
+            blocked_until = self._local.get("blocked_until", 0)
+
+        wait = 0.0
+        now = time.time()
+        with self._locked_state() as state:
+            if now - state.get("updated_at", 0) > STATE_TTL:
+                ## left by an earlier run, the buckets would have refilled since
+                for name in ["requests", "tokens", "blocked_until"]:
+                    state.pop(name, None)
+            state["updated_at"] = now
+            state["blocked_until"] = max(state.get("blocked_until", 0), blocked_until)
+            for name, rate, _ in self._get_buckets(0):
+                level = self._refill(state, name, rate, now)
+                state[name] = (min(rate, level - consumed.get(name, 0)), now)
+            ## counters of the shared state before they were kept per run
+            state.pop("stats", None)
+            run_state = self._get_run_state(state, now)
+            self._add_stats(run_state, **stats)
+            if num_tokens is not None:
+                wait = self._reserve(state, num_tokens, now)
+                if wait == 0:
+                    self._add_stats(run_state, num_requests=1)
+            shared = {name: state[name] for name, _, _ in self._get_buckets(0)}
+            shared_blocked_until = state["blocked_until"]
+
+        with self._lock:
+            ## what was consumed during the sync stays pending for the next one
+            for name, (level, updated_at) in shared.items():
+                self._local[name] = (level - self._consumed.get(name, 0), updated_at)
+            self._local["blocked_until"] = max(
+                self._local.get("blocked_until", 0), shared_blocked_until
+            )
+            self._last_sync = now
+        return wait
+
+    def _get_async_lock(self) -> asyncio.Lock:
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        return self._async_lock
+
+    async def _maybe_sync(self):
+        if self._last_sync is None:
+            ## every coroutine waits for the first sync, the buckets start from the file
+            async with self._get_async_lock():
+                if self._last_sync is None:
+                    await asyncio.to_thread(self._sync)
+            return
+        if self._syncing or time.time() - self._last_sync < self.sync_interval:
+            return
+        self._syncing = True
+        try:
+            await asyncio.to_thread(self._sync)
+        finally:
+            self._syncing = False
+
+    def _add_local_stats(self, **increments):
+        with self._lock:
+            self._add_stats(self._local, **increments)
+
+    def _refund_local(self, estimated_tokens: int, used_tokens: Optional[int]):
+        """Gives back the tokens reserved for a request that used fewer"""
+        if not self.tokens_per_minute or used_tokens is None:
+            return
+        refund = estimated_tokens - used_tokens
+        with self._lock:
+            now = time.time()
+            level = self._refill(self._local, "tokens", self.tokens_per_minute, now)
+            self._local["tokens"] = (min(self.tokens_per_minute, level + refund), now)
+            self._consumed["tokens"] = self._consumed.get("tokens", 0) - refund
+
+    def refund(self, estimated_tokens: int, used_tokens: Optional[int]):
+        self._refund_local(estimated_tokens, used_tokens)
+        self._sync()
+
+    def acquire(self, num_tokens: int = 0):
+        throttled = 0.0
+        while True:
+            wait = self._sync(num_tokens)
+            if wait == 0:
+                break
+            time.sleep(wait)
+            throttled += wait
+        if throttled:
+            self._add_local_stats(num_throttled=1, throttled_seconds=throttled)
+            self._sync()
+            record_throttled(throttled)
+
+    async def aacquire(self, num_tokens: int = 0):
+        throttled = 0.0
+        while True:
+            await self._maybe_sync()
+            async with self._get_async_lock():
+                wait = self._reserve_local(num_tokens)
+            if wait == 0:
+                break
+            await asyncio.sleep(wait)
+            throttled += wait
+        if throttled:
+            self._add_local_stats(num_throttled=1, throttled_seconds=throttled)
+            record_throttled(throttled)
+
+    def get_backoff(self, attempt: int, exception: Exception) -> float:
+        """
+        Retry-After from the provider if present, jittered exponential backoff
+        otherwise. The delay blocks every worker, not only the one that failed
+        (the other processes see it at their next sync).
+        """
+        delay = get_retry_after(exception)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * 2**attempt)
+            delay = random.uniform(delay / 2, delay)
+        with self._lock:
+            self._local["blocked_until"] = max(
+                self._local.get("blocked_until", 0), time.time() + delay
+            )
+            self._add_stats(self._local, num_retries=1, backoff_seconds=delay)
+            if self._last_sync is not None:
+                ## shared with the other processes at the next sync
+                self._last_sync = 0.0
+        return delay
+
+    def call(
+        self,
+        func: Callable[[], Any],
+        num_tokens: int = 0,
+        retry_on: Tuple[Type[Exception], ...] = (Exception,),
+        get_used_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """Calls `func` within the limits, retrying the `retry_on` exceptions"""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(num_tokens)
+            record_attempt()
+            try:
+                result = func()
+            except retry_on as e:
+                if attempt == self.max_retries:
+                    raise e
+                delay = self.get_backoff(attempt, e)
+                self._sync()
+                record_retry(delay)
+                print(f"Exception: {repr(e)}, retrying in {delay:.1f} seconds")
+                time.sleep(delay)
+                continue
+            if get_used_tokens is not None:
+                self.refund(num_tokens, get_used_tokens(result))
+            return result
+
+    async def acall(
+        self,
+        func: Callable[[], Any],
+        num_tokens: int = 0,
+        retry_on: Tuple[Type[Exception], ...] = (Exception,),
+        get_used_tokens: Optional[Callable[[Any], Optional[int]]] = None,
+    ) -> Any:
+        """Coroutine counterpart of `call`, `func` returns an awaitable"""
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(num_tokens)
+            record_attempt()
+            try:
+                result = await func()
+            except retry_on as e:
+                if attempt == self.max_retries:
+                    raise e
+                delay = self.get_backoff(attempt, e)
+                record_retry(delay)
+                print(f"Exception: {repr(e)}, retrying in {delay:.1f} seconds")
+                await asyncio.sleep(delay)
+                continue
+            if get_used_tokens is not None:
+                self._refund_local(num_tokens, get_used_tokens(result))
+            return result
+
+
+def format_rate_limit_stats(provider: str, stats: dict) -> str:
+    return (
+        f"Rate limiter ({provider}): {stats.get('num_requests', 0)} requests, "
+        f"{stats.get('num_retries', 0)} retries, "
+        f"{stats.get('num_throttled', 0)} throttled waits, "
+        f"{stats.get('throttled_seconds', 0.0):.1f}s throttled, "
+        f"{stats.get('backoff_seconds', 0.0):.1f}s backoff"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Show or reset the counters of the shared rate limiter of a provider"
+    )
+    parser.add_argument("--provider", type=str, required=True)
+    parser.add_argument("--rate_limit_dir", type=str, default="cache/ratelimit")
+    parser.add_argument(
+        "--reset_stats",
+        action="store_true",
+        help="Drop the counters of every run of the provider, runs still in flight start again from 0",
+    )
+    args = parser.parse_args()
+
+    limiter = RateLimiter(args.provider, state_dir=args.rate_limit_dir)
+    if args.reset_stats:
+        limiter.reset_stats()
+        print(f"Reset the rate limiter counters of {args.provider}")
+        return
+    for run_id, stats in limiter.get_all_stats().items():
+        print(f"{run_id}: {format_rate_limit_stats(args.provider, stats)}")
+
+
+if __name__ == "__main__":
+    main()
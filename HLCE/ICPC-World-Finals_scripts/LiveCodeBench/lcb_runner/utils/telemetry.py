@@ -0,0 +1,209 @@
+""" Per-request telemetry of the runners: latency, tokens, retries and backoff. """
+import json
+import time
+import traceback
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+
+import numpy as np
+
+## trace of the request being run in the current thread / coroutine, if any
+_current_trace: ContextVar[Optional["RequestTrace"]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+@dataclass
+class RequestTrace:
+    start: float = 0.0
+    end: float = 0.0
+    num_samples: int = 0
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    ## True when the token counts come from the prompt length instead of the provider usage
+    tokens_estimated: bool = False
+    num_attempts: int = 0
+    num_retries: int = 0
+    backoff_seconds: float = 0.0
+    throttled_seconds: float = 0.0
+    error: Optional[str] = None
+    ## not written to the trace file, printed by the parent process on failure
+    exception_tb: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def latency(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> dict:
+        trace = asdict(self)
+        del trace["exception_tb"]
+        trace["latency"] = self.latency
+        return trace
+
+
+def record_usage(input_tokens: Optional[int], output_tokens: Optional[int]):
+    """Called by the runners with the usage fields of the provider response"""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    if input_tokens is not None:
+        trace.input_tokens = (trace.input_tokens or 0) + input_tokens
+    if output_tokens is not None:
+        trace.output_tokens = (trace.output_tokens or 0) + output_tokens
+
+
+def record_attempt():
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.num_attempts += 1
+
+
+def record_retry(backoff_seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.num_retries += 1
+        trace.backoff_seconds += backoff_seconds
+
+
+def record_throttled(seconds: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.throttled_seconds += seconds
+
+
+def _finish_trace(trace: RequestTrace, result, estimated_input_tokens: Optional[int]):
+    trace.end = time.time()
+    if result is None:
+        return
+    if trace.output_tokens is None:
+        ## providers without usage report the completion tokens of the samples (if any)
+        sample_tokens = [
+            sample[1] for sample in result if isinstance(sample, tuple)
+        ]
+        if sample_tokens and all(t is not None for t in sample_tokens):
+            trace.output_tokens = sum(sample_tokens)
+    if trace.input_tokens is None and estimated_input_tokens is not None:
+        trace.input_tokens = estimated_input_tokens
+        trace.tokens_estimated = True
+
+
+def run_traced(combined_args):
+    """
+    Runs `run_func(argument)` under a new trace and returns (result, trace),
+    the result is None if the request failed. Static to be used in multiprocessing.
+    """
+    run_func, argument, num_samples, estimated_input_tokens = combined_args
+    trace = RequestTrace(start=time.time(), num_samples=num_samples)
+    token = _current_trace.set(trace)
+    result = None
+    try:
+        result = run_func(argument)
+    except Exception as e:
+        trace.error = repr(e)
+        trace.exception_tb = traceback.format_exc()
+    finally:
+        _current_trace.reset(token)
+    _finish_trace(trace, result, estimated_input_tokens)
+    return result, trace
+
+
+async def arun_traced(
+    arun_func, task, num_samples: int, estimated_input_tokens: Optional[int]
+):
+    """Coroutine counterpart of `run_traced`, every asyncio task has its own trace"""
+    trace = RequestTrace(start=time.time(), num_samples=num_samples)
+    token = _current_trace.set(trace)
+    result = None
+    try:
+        result = await arun_func(task)
+    except Exception as e:
+        trace.error = repr(e)
+        trace.exception_tb = traceback.format_exc()
+    finally:
+        _current_trace.reset(token)
+    _finish_trace(trace, result, estimated_input_tokens)
+    return result, trace
+
+
+class Telemetry:
+    """Traces of the requests of a run, collected in the parent process"""
+
+    def __init__(self):
+        self.traces: List[RequestTrace] = []
+
+    def add(self, trace: RequestTrace):
+        self.traces.append(trace)
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for trace in self.traces:
+                f.write(json.dumps(trace.to_dict()) + "\n")
+
+    def summary(
+        self,
+        price_per_million_input: Optional[float] = None,
+        price_per_million_output: Optional[float] = None,
+    ) -> dict:
+        if not self.traces:
+            return {}
+        latencies = np.array([trace.latency for trace in self.traces])
+        wall_time = max(trace.end for trace in self.traces) - min(
+            trace.start for trace in self.traces
+        )
+        wall_time = max(wall_time, 1e-9)
+        input_tokens = sum(trace.input_tokens or 0 for trace in self.traces)
+        output_tokens = sum(trace.output_tokens or 0 for trace in self.traces)
+        summary = {
+            "num_requests": len(self.traces),
+            "num_failed": sum(trace.error is not None for trace in self.traces),
+            "num_samples": sum(trace.num_samples for trace in self.traces),
+            "wall_time": wall_time,
+            "requests_per_second": len(self.traces) / wall_time,
+            "output_tokens_per_second": output_tokens / wall_time,
+            "latency_p50": float(np.percentile(latencies, 50)),
+            "latency_p95": float(np.percentile(latencies, 95)),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "input_tokens_estimated": any(trace.tokens_estimated for trace in self.traces),
+            "num_retries": sum(trace.num_retries for trace in self.traces),
+            "backoff_seconds": sum(trace.backoff_seconds for trace in self.traces),
+            "throttled_seconds": sum(trace.throttled_seconds for trace in self.traces),
+            "cost": None,
+        }
+        if price_per_million_input is not None or price_per_million_output is not None:
+            summary["cost"] = (
+                input_tokens * (price_per_million_input or 0)
+                + output_tokens * (price_per_million_output or 0)
+            ) / 1e6
+        return summary
+
+
+def format_telemetry_summary(summary: dict) -> str:
+    if not summary:
+        return "Telemetry: no requests were sent"
+    rows = [
+        ("requests", f"{summary['num_requests']} ({summary['num_failed']} failed)"),
+        ("samples", f"{summary['num_samples']}"),
+        ("wall time", f"{summary['wall_time']:.1f}s"),
+        ("throughput", f"{summary['requests_per_second']:.2f} req/s"),
+        ("output tokens/s", f"{summary['output_tokens_per_second']:.1f}"),
+        ("latency p50 / p95", f"{summary['latency_p50']:.2f}s / {summary['latency_p95']:.2f}s"),
+        (
+            "input / output tokens",
+            f"{summary['input_tokens']}{' (estimated)' if summary['input_tokens_estimated'] else ''}"
+            f" / {summary['output_tokens']}",
+        ),
+        ("retries", f"{summary['num_retries']} ({summary['backoff_seconds']:.1f}s backoff)"),
+        ("throttled", f"{summary['throttled_seconds']:.1f}s"),
+        (
+            "cost estimate",
+            "n/a (set --price_per_million_input/output)"
+            if summary["cost"] is None
+            else f"${summary['cost']:.2f}",
+        ),
+    ]
+    width = max(len(name) for name, _ in rows)
+    lines = ["Telemetry", "-" * (width + 30)]
+    lines += [f"{name:<{width}}  {value}" for name, value in rows]
+    return "\n".join(lines)
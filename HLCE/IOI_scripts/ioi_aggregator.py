@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import importlib.util
+
+# pass@k engine shared with the LiveCodeBench scoring (loaded by path, lcb_runner is not installed)
+LCB_EVALUATION_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)),
+    "..",
+    "ICPC-World-Finals_scripts",
+    "LiveCodeBench",
+    "lcb_runner",
+    "evaluation",
+)
+
+DEFAULT_COMPOSITE_CONFIG = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "composite_problems.json"
+)
+
+FULL_POINTS = 100.0
+READ_CHUNK_SIZE = 1 << 20
+
+
+def load_lcb_evaluation_module(name):
+    spec = importlib.util.spec_from_file_location(
+        name, os.path.join(LCB_EVALUATION_DIR, f"{name}.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+pass_k_utils = load_lcb_evaluation_module("pass_k_utils")
+
+
+def iter_score_records(path):
+    """
+    Yields the score records of a JSON array or JSONL file one at a time
+    (the merged score files are JSON arrays despite their .jsonl extension)
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(READ_CHUNK_SIZE)
+        position = len(buffer) - len(buffer.lstrip())
+        is_array = buffer[position:position + 1] == "["
+        if is_array:
+            position += 1
+        eof = len(buffer) == 0
+        while True:
+            # Skip separators between records
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+                position += 1
+            if position < len(buffer) and buffer[position] == "]" and is_array:
+                return
+            if position == len(buffer):
+                if eof:
+                    return
+                buffer = f.read(READ_CHUNK_SIZE)
+                position = 0
+                eof = len(buffer) == 0
+                continue
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The record continues in the next chunk
+                if eof:
+                    raise
+                chunk = f.read(READ_CHUNK_SIZE)
+                eof = len(chunk) == 0
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield record
+            position = end
+
+
+def load_composite_config(path=DEFAULT_COMPOSITE_CONFIG):
+    """
+    Composite problems are scored as the sum of the points of their subtasks, each
+    definition matches the submissions of a date whose problem index starts with a prefix:
+    {"composite_problems": [{"name", "date", "problem_index_prefix", "subtasks"}]}
+    """
+    if path is None:
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    composite_problems = config.get("composite_problems", [])
+    for composite in composite_problems:
+        missing = {"name", "date", "problem_index_prefix", "subtasks"} - set(composite)
+        if missing:
+            raise ValueError(f"Composite problem {composite} in {path} misses {sorted(missing)}")
+    return composite_problems
+
+
+def get_points(submission):
+    # Compilation errors and missing scores count as attempts with score 0
+    if submission.get('verdict') == "Compilation error" or submission.get('points') is None:
+        return 0.0
+    return float(submission['points'])
+
+
+class ProblemAccumulator:
+    """Running statistics of a regular problem, every submission is one attempt"""
+
+    def __init__(self):
+        self.submissions = 0
+        self.attempts = 0
+        self.correct_attempts = 0
+        self.total_points = 0.0
+
+    def add(self, submission):
+        self.submissions += 1
+        self.add_attempt(get_points(submission))
+
+    def add_attempt(self, points):
+        self.attempts += 1
+        self.correct_attempts += points == FULL_POINTS
+        self.total_points += points
+
+    def finalize(self):
+        pass
+
+
+class CompositeAccumulator(ProblemAccumulator):
+    """
+    An attempt of a composite problem is complete once every subtask has been scored,
+    sweeping the subtask submissions in original_record_id order. Only the
+    (original_record_id, arrival, subtask, points) of the subtask submissions are kept
+    until the end of the stream, since records arrive out of that order (merged parts)
+    """
+
+    def __init__(self, subtasks):
+        super().__init__()
+        self.subtasks = set(subtasks)
+        self.pending = []
+        self.attempt_points = []
+
+    def add(self, submission):
+        self.submissions += 1
+        subtask = submission['problem_index']
+        if subtask not in self.subtasks:
+            return  # Skip non-target subtasks
+        self.pending.append(
+            (submission.get('original_record_id', 0), len(self.pending), subtask, get_points(submission))
+        )
+
+    def finalize(self):
+        current_attempt = {}
+        for _, _, subtask, points in sorted(self.pending):
+            current_attempt[subtask] = points
+            if set(current_attempt) == self.subtasks:
+                # Complete one attempt
+                total_points = sum(current_attempt.values())
+                self.attempt_points.append(total_points)
+                self.add_attempt(total_points)
+                current_attempt = {}
+        self.pending = []
+
+
+class IOIScoreAggregator:
+    """
+    Accumulates the score records one at a time into per problem statistics,
+    pass@k of every problem is computed at once by `finalize`
+    """
+
+    def __init__(self, composite_problems=(), k_list=(1, 5)):
+        self.composite_problems = list(composite_problems)
+        self.k_list = list(k_list)
+        # Problems in order of first submission
+        self.problems = {}
+
+    def get_problem_key(self, submission):
+        date = submission['date']
+        problem_index = submission['problem_index']
+        for composite in self.composite_problems:
+            if date == composite["date"] and problem_index.startswith(composite["problem_index_prefix"]):
+                return composite["name"], composite
+        return f"{submission['problem_title']} ({date})", None
+
+    def add(self, submission):
+        problem_key, composite = self.get_problem_key(submission)
+        if problem_key not in self.problems:
+            self.problems[problem_key] = (
+                CompositeAccumulator(composite["subtasks"]) if composite is not None else ProblemAccumulator()
+            )
+        self.problems[problem_key].add(submission)
+
+    def add_all(self, submissions):
+        for submission in submissions:
+            self.add(submission)
+        return self
+
+    def finalize(self):
+        """Returns (final_stats, problem_stats) in the format of `analyze_submissions`"""
+        for accumulator in self.problems.values():
+            accumulator.finalize()
+
+        problem_keys = list(self.problems)
+        pass_at_k_matrix = pass_k_utils.estimate_pass_at_k_matrix(
+            [self.problems[key].attempts for key in problem_keys],
+            [self.problems[key].correct_attempts for key in problem_keys],
+            self.k_list,
+        )
+        # pass@k of every k of every problem, the details of composite problems only keep pass@1
+        self.problem_pass_at_k = {
+            key: dict(zip(self.k_list, pass_at_k)) for key, pass_at_k in zip(problem_keys, pass_at_k_matrix.tolist())
+        }
+
+        problem_details = {}
+        problem_stats = {}
+        pass_at_k_sums = [0.0] * len(self.k_list)
+        avg_points_sum = 0.0
+        solved_problems = 0
+        for problem_key, pass_at_k in zip(problem_keys, pass_at_k_matrix.tolist()):
+            accumulator = self.problems[problem_key]
+            n = accumulator.attempts
+            c = accumulator.correct_attempts
+            avg_points_p = accumulator.total_points / n if n > 0 else 0.0
+            is_composite = isinstance(accumulator, CompositeAccumulator)
+
+            details = {"pass@1": pass_at_k[0]}
+            if not is_composite:
+                details.update({f"pass@{k}": p for k, p in zip(self.k_list[1:], pass_at_k[1:])})
+            details.update({
+                "avg_points": avg_points_p,
+                "total_attempts": n,
+                "correct_attempts": c,
+                "is_solved": c > 0,
+            })
+            if is_composite:
+                details["attempts"] = accumulator.attempt_points
+            problem_details[problem_key] = details
+
+            problem_stats[problem_key] = {
+                "submissions": accumulator.submissions,
+                "passes": c,
+                "total_points": accumulator.total_points,
+                "pass_rate": pass_at_k[0],
+                "valid_submissions": n,
+            }
+
+            pass_at_k_sums = [total + p for total, p in zip(pass_at_k_sums, pass_at_k)]
+            avg_points_sum += avg_points_p
+            solved_problems += c > 0
+
+        problem_count = len(problem_keys)
+        final_stats = {
+            f"pass@{k}": total / problem_count if problem_count > 0 else 0.0
+            for k, total in zip(self.k_list, pass_at_k_sums)
+        }
+        final_stats.update({
+            "avg_points": avg_points_sum / problem_count if problem_count > 0 else 0.0,
+            "total_problems": problem_count,
+            "solved_problems": solved_problems,
+            "problem_details": problem_details,
+        })
+        return final_stats, problem_stats